@@ -9,6 +9,7 @@ from django.contrib.auth import authenticate, update_session_auth_hash
 from django.db import connection
 from accounts.models import CustomUser
 from mypage.models import UserProfile
+from destinations.tag_vocabulary import tag_vocabulary
 from django.shortcuts import get_object_or_404
 
 class CustomTokenObtainPairView(TokenObtainPairView):
@@ -64,16 +65,9 @@ def get_subcategory_tags(request):
     Returns:
         Response with list of subcategory tags
     """
-    with connection.cursor() as cursor:
-        # Query to extract only the exact subcategory0 list
-        cursor.execute("""
-            SELECT DISTINCT json_extract(subcategories, '$[0]') AS first_subcategory
-            FROM destinations_location
-            WHERE json_extract(subcategories, '$[0]') IS NOT NULL
-            ORDER BY first_subcategory;
-        """)
-        subcategories = [row[0] for row in cursor.fetchall() if row[0]]
-        
+    # Exact subcategory0 list (cached tag vocabulary)
+    subcategories = tag_vocabulary.tags()
+    
     return Response({"tags": subcategories}, status=status.HTTP_200_OK)
 
 # This is spare codes that used to get user profile, but now it is replaced. 
@@ -110,6 +110,26 @@ def activate_foreign_keys(sender, connection, **kwargs):
 connection_created.connect(activate_foreign_keys)
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The 'search' cache holds NLP search results and is shared by all worker processes.
+# Point it at Redis (django.core.cache.backends.redis.RedisCache) when one is available.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'models', 'search_cache'),
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -150,6 +170,64 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# NLP search settings
+# Directory for downloaded model caches and precomputed search indexes
+NLP_MODELS_DIR = os.path.join(BASE_DIR, 'models')
+# Local NLTK data (punkt, stopwords) and spaCy model (package name or local path); never downloaded at runtime
+NLP_NLTK_DATA_DIR = os.path.join(NLP_MODELS_DIR, 'nltk_data')
+NLP_SPACY_MODEL = 'en_core_web_sm'
+# Nearest-neighbour index used by semantic search: 'exact', 'ivf' or 'hnsw' (requires hnswlib)
+NLP_ANN_BACKEND = 'ivf'
+# Recall/latency knob: IVF lists probed or HNSW ef per query (None = backend default)
+NLP_ANN_PROBE = None
+# Below this many locations exact search is fast enough and always used
+NLP_ANN_MIN_ROWS = 20000
+# Retrain the index once the matrix has grown by this fraction of the rows it was trained on
+NLP_ANN_RETRAIN_GROWTH = 0.25
+# Maximum number of candidates re-ranked with embeddings per search query
+NLP_SEARCH_CANDIDATE_BUDGET = 300
+# How lexical and semantic scores are combined: 'weighted' or 'rrf' (reciprocal rank fusion)
+NLP_SEARCH_FUSION = 'weighted'
+# Texts per sentence-transformer forward pass when encoding in batches
+NLP_EMBEDDING_BATCH_SIZE = 64
+# Cache alias (see CACHES) holding search results, and their lifetime in seconds
+NLP_SEARCH_CACHE_ALIAS = 'search'
+NLP_SEARCH_CACHE_TTL = 3600
+# In-process LRU cache limits (per worker)
+NLP_EMBEDDING_CACHE_SIZE = 20000
+NLP_EMBEDDING_CACHE_MAX_BYTES = 64 * 1024 * 1024
+NLP_SENTIMENT_CACHE_SIZE = 10000
+# Persistent float16 embedding cache (models/embedding_cache.sqlite3), compacted in the background
+NLP_EMBEDDING_STORE_ENABLED = True
+NLP_EMBEDDING_STORE_MAX_ENTRIES = 200000
+NLP_EMBEDDING_STORE_MAX_BYTES = 256 * 1024 * 1024
+# Load models, build indexes and pre-compute popular queries when a server process starts
+NLP_WARMUP_ON_STARTUP = False
+# Number of most frequent historical queries pre-computed during warm-up
+NLP_WARMUP_TOP_QUERIES = 50
+# Seconds between writes of the buffered search query counts
+NLP_SEARCH_QUERY_FLUSH_INTERVAL = 30
+# Analyze reviews in a background worker after saving (False = analyze inside the request)
+NLP_REVIEW_ANALYSIS_ASYNC = True
+# Number of reviews analyzed together by the background worker
+NLP_REVIEW_BATCH_SIZE = 32
+# Seconds after which reviews claimed by a worker that never finished are queued again
+NLP_REVIEW_CLAIM_TIMEOUT = 600
+# spaCy processes used for batched meaning-unit extraction (1 = in-process)
+NLP_SPACY_N_PROCESS = 1
+
+# Recommendation lists precomputed by precompute_recommendations: candidates per list,
+# and how long (seconds) they are served while the user's likes/reviews are unchanged
+RECOMMENDATION_PRECOMPUTE_SIZE = 30
+RECOMMENDATION_PRECOMPUTE_MAX_AGE = 24 * 3600
+# Item-to-item similarity graph (build_item_neighbors): neighbours kept per location,
+# weights of the similarity components, and the distance (km) at which proximity drops to 1/e
+ITEM_NEIGHBORS_K = 50
+ITEM_NEIGHBORS_WEIGHTS = {'embedding': 0.5, 'tags': 0.3, 'distance': 0.2}
+ITEM_NEIGHBORS_DISTANCE_SCALE_KM = 50.0
+# Locations scored together in one block of the neighbour computation
+ITEM_NEIGHBORS_BLOCK_SIZE = 256
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,410 @@
+import os
+import pickle
+import time
+
+# NumPy is required for all index backends
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# hnswlib is an optional local library for the HNSW backend
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+
+def top_k_rows(scores, k):
+    """
+    Return the row positions of the k highest scores, best first.
+
+    Parameters:
+        scores: 1-D array of scores
+        k: Number of rows to return
+
+    Returns:
+        numpy.ndarray: Row positions sorted by descending score
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    rows = np.argpartition(-scores, k - 1)[:k]
+    return rows[np.argsort(-scores[rows])]
+
+
+class ExactIndex:
+    """
+    Brute-force cosine search over the whole embedding matrix.
+    Always exact; also used as the fallback for the approximate backends.
+    """
+    name = 'exact'
+
+    def is_trained(self):
+        return True
+
+    def build(self, matrix, ids):
+        pass
+
+    def update(self, matrix, ids, changed_rows=None, kept_rows=None, removed_ids=None):
+        pass
+
+    def copy(self):
+        return self
+
+    def save(self, directory):
+        pass
+
+    def load(self, directory, matrix, ids):
+        return True
+
+    def search(self, matrix, ids, query_vector, top_k, allowed_mask=None, probe=None):
+        """
+        Score every row against the query.
+
+        Parameters:
+            matrix: (n, dim) normalized embedding matrix
+            ids: (n,) Location ids aligned with matrix rows
+            query_vector: Normalized query embedding
+            top_k: Number of results to return
+            allowed_mask: Optional boolean mask of rows that may be returned
+            probe: Unused (exact search has no recall knob)
+
+        Returns:
+            List of tuples: [(location_id, similarity), ...] sorted by similarity
+        """
+        scores = matrix @ query_vector
+        if allowed_mask is not None:
+            scores = np.where(allowed_mask, scores, -np.inf)
+        rows = top_k_rows(scores, top_k)
+        return [(int(ids[row]), float(scores[row])) for row in rows if np.isfinite(scores[row])]
+
+
+class IVFIndex:
+    """
+    Inverted file index (IVF) implemented with NumPy.
+
+    Rows are clustered with spherical k-means; a query only scores the rows in the
+    `nprobe` clusters whose centroids are closest to it. Raising nprobe trades
+    latency for recall, and probing every cluster is equivalent to exact search.
+    """
+    name = 'ivf'
+    CENTROIDS_FILE = 'ivf_centroids.npy'
+    ASSIGNMENTS_FILE = 'ivf_assignments.npy'
+
+    def __init__(self, nprobe=16, kmeans_iterations=10):
+        """
+        Initialize an untrained IVF index.
+
+        Parameters:
+            nprobe: Default number of clusters probed per query
+            kmeans_iterations: Number of k-means iterations during training
+        """
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self.centroids = None  # (n_lists, dim) normalized cluster centers
+        self.assignments = None  # (n,) cluster of each matrix row
+        self.list_rows = None  # Matrix rows sorted by cluster
+        self.list_offsets = None  # Start offset of each cluster in list_rows
+
+    def is_trained(self):
+        return self.centroids is not None and self.assignments is not None
+
+    def assign(self, vectors, chunk_size=65536):
+        """
+        Assign vectors to their nearest centroid (chunked to bound memory).
+
+        Parameters:
+            vectors: (n, dim) normalized vectors
+
+        Returns:
+            numpy.ndarray: Cluster index of each vector
+        """
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk_size):
+            block = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+            assignments[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def rebuild_lists(self):
+        """
+        Rebuild the cluster -> rows lists from the row assignments.
+        """
+        self.list_rows = np.argsort(self.assignments, kind='stable')
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def build(self, matrix, ids):
+        """
+        Train cluster centroids with spherical k-means and assign every row.
+
+        Parameters:
+            matrix: (n, dim) normalized embedding matrix
+            ids: (n,) Location ids aligned with matrix rows
+        """
+        start_time = time.time()
+        n_rows = len(matrix)
+        n_lists = int(max(1, min(4096, 4 * np.sqrt(n_rows))))
+
+        # Train on a sample to keep the build time bounded for large catalogues
+        rng = np.random.default_rng(42)
+        sample_size = min(n_rows, n_lists * 64)
+        sample = np.asarray(matrix[np.sort(rng.choice(n_rows, sample_size, replace=False))], dtype=np.float32)
+
+        self.centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmax(sample @ self.centroids.T, axis=1)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+
+            # Re-seed empty clusters with random sample rows
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            self.centroids = sums / np.maximum(norms, 1e-12)
+
+        self.assignments = self.assign(matrix)
+        self.rebuild_lists()
+        print(f"IVF index built: {n_rows} rows in {n_lists} lists ({time.time() - start_time:.2f} seconds)")
+
+    def update(self, matrix, ids, changed_rows=None, kept_rows=None, removed_ids=None):
+        """
+        Keep row assignments aligned with the matrix after incremental changes.
+        Centroids are reused; only changed or appended rows are reassigned.
+
+        Parameters:
+            matrix: Updated (n, dim) embedding matrix
+            ids: Updated (n,) Location ids
+            changed_rows: Rows (in the updated matrix) whose vectors changed or were appended
+            kept_rows: Boolean mask of old rows kept after a removal, if rows were removed
+            removed_ids: Location ids of the removed rows (unused, rows are tracked by kept_rows)
+        """
+        if not self.is_trained():
+            return
+
+        if kept_rows is not None:
+            self.assignments = self.assignments[kept_rows]
+
+        # Appended rows get a placeholder assignment before being reassigned below
+        if len(self.assignments) < len(matrix):
+            self.assignments = np.concatenate([
+                self.assignments,
+                np.zeros(len(matrix) - len(self.assignments), dtype=np.int32)
+            ])
+
+        if changed_rows is not None and len(changed_rows):
+            changed_rows = np.asarray(changed_rows, dtype=np.int64)
+            self.assignments[changed_rows] = self.assign(matrix[changed_rows])
+
+        self.rebuild_lists()
+
+    def copy(self):
+        """
+        Copy the index so it can be updated while searches keep reading this one.
+        Centroids are shared because they are never modified after training.
+
+        Returns:
+            IVFIndex: Independent copy of the row assignments
+        """
+        index = IVFIndex(nprobe=self.nprobe, kmeans_iterations=self.kmeans_iterations)
+        index.centroids = self.centroids
+        if self.assignments is not None:
+            index.assignments = self.assignments.copy()
+            index.list_rows = self.list_rows
+            index.list_offsets = self.list_offsets
+        return index
+
+    def save(self, directory):
+        if not self.is_trained():
+            return
+        for filename, array in ((self.CENTROIDS_FILE, self.centroids), (self.ASSIGNMENTS_FILE, self.assignments)):
+            path = os.path.join(directory, filename)
+            np.save(f"{path}.tmp.npy", array)
+            os.replace(f"{path}.tmp.npy", path)
+
+    def load(self, directory, matrix, ids):
+        """
+        Load a trained index from disk if it matches the matrix.
+
+        Returns:
+            bool: True if a usable index was loaded
+        """
+        centroids_path = os.path.join(directory, self.CENTROIDS_FILE)
+        assignments_path = os.path.join(directory, self.ASSIGNMENTS_FILE)
+        if not os.path.exists(centroids_path) or not os.path.exists(assignments_path):
+            return False
+
+        centroids = np.load(centroids_path)
+        assignments = np.load(assignments_path)
+        if (len(assignments) != len(matrix) or centroids.ndim != 2 or centroids.shape[1] != matrix.shape[1]
+                or (len(assignments) and (assignments.min() < 0 or assignments.max() >= len(centroids)))):
+            print("IVF index does not match the embedding matrix, using exact search until rebuilt")
+            return False
+
+        self.centroids = centroids
+        self.assignments = assignments
+        self.rebuild_lists()
+        return True
+
+    def search(self, matrix, ids, query_vector, top_k, allowed_mask=None, probe=None):
+        """
+        Score only the rows of the clusters closest to the query.
+        Probes more clusters when too few allowed rows are found.
+
+        Parameters:
+            matrix: (n, dim) normalized embedding matrix
+            ids: (n,) Location ids aligned with matrix rows
+            query_vector: Normalized query embedding
+            top_k: Number of results to return
+            allowed_mask: Optional boolean mask of rows that may be returned
+            probe: Number of clusters to probe (default: self.nprobe)
+
+        Returns:
+            List of tuples: [(location_id, similarity), ...] sorted by similarity
+        """
+        n_lists = len(self.centroids)
+        nprobe = min(probe or self.nprobe, n_lists)
+        centroid_order = np.argsort(-(self.centroids @ query_vector))
+
+        while True:
+            probed = centroid_order[:nprobe]
+            rows = np.concatenate([
+                self.list_rows[self.list_offsets[cluster]:self.list_offsets[cluster + 1]] for cluster in probed
+            ])
+            if allowed_mask is not None:
+                rows = rows[allowed_mask[rows]]
+
+            # Widen the search until enough candidates are found (all lists = exact search)
+            if len(rows) >= top_k or nprobe >= n_lists:
+                break
+            nprobe = min(nprobe * 2, n_lists)
+
+        # Read candidate rows in storage order (friendlier to the memory-mapped matrix)
+        rows = np.sort(rows)
+        scores = np.asarray(matrix[rows], dtype=np.float32) @ query_vector
+        best = top_k_rows(scores, top_k)
+        return [(int(ids[rows[i]]), float(scores[i])) for i in best]
+
+
+class HNSWIndex:
+    """
+    Hierarchical navigable small world graph index backed by the optional hnswlib library.
+    The `ef` search parameter is the recall/latency knob.
+    """
+    name = 'hnsw'
+    INDEX_FILE = 'hnsw.bin'
+
+    def __init__(self, ef=64, m=16, ef_construction=200):
+        """
+        Initialize an empty HNSW index.
+
+        Parameters:
+            ef: Default size of the dynamic candidate list during search
+            m: Number of graph links per node
+            ef_construction: Candidate list size during construction
+        """
+        self.ef = ef
+        self.m = m
+        self.ef_construction = ef_construction
+        self.index = None
+
+    def is_trained(self):
+        return self.index is not None
+
+    def build(self, matrix, ids):
+        start_time = time.time()
+        self.index = hnswlib.Index(space='ip', dim=matrix.shape[1])
+        self.index.init_index(max_elements=max(len(matrix), 1), ef_construction=self.ef_construction, M=self.m)
+        self.index.add_items(np.asarray(matrix, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+        print(f"HNSW index built: {len(matrix)} rows ({time.time() - start_time:.2f} seconds)")
+
+    def update(self, matrix, ids, changed_rows=None, kept_rows=None, removed_ids=None):
+        """
+        Add or replace changed rows and mark removed ids as deleted.
+        Graph labels are Location ids, so row shifts do not affect the index,
+        and the cost only depends on the number of changed and removed rows.
+        """
+        if not self.is_trained():
+            return
+
+        for label in removed_ids or ():
+            try:
+                self.index.mark_deleted(int(label))
+            except RuntimeError:
+                pass  # Not in the graph or already deleted
+
+        if changed_rows is not None and len(changed_rows):
+            changed_rows = np.asarray(changed_rows, dtype=np.int64)
+            needed = self.index.get_current_count() + len(changed_rows)
+            if needed > self.index.get_max_elements():
+                self.index.resize_index(needed)
+            self.index.add_items(np.asarray(matrix[changed_rows], dtype=np.float32), np.asarray(ids[changed_rows], dtype=np.int64))
+
+    def copy(self):
+        """
+        Copy the graph so it can be updated while searches keep reading this one
+        (hnswlib does not support resizing or deleting during queries).
+
+        Returns:
+            HNSWIndex: Independent copy of the graph
+        """
+        index = HNSWIndex(ef=self.ef, m=self.m, ef_construction=self.ef_construction)
+        if self.index is not None:
+            index.index = pickle.loads(pickle.dumps(self.index))
+        return index
+
+    def save(self, directory):
+        if self.is_trained():
+            self.index.save_index(os.path.join(directory, self.INDEX_FILE))
+
+    def load(self, directory, matrix, ids):
+        path = os.path.join(directory, self.INDEX_FILE)
+        if not os.path.exists(path):
+            return False
+        self.index = hnswlib.Index(space='ip', dim=matrix.shape[1])
+        self.index.load_index(path, max_elements=len(matrix))
+        return True
+
+    def search(self, matrix, ids, query_vector, top_k, allowed_mask=None, probe=None):
+        """
+        Query the graph, pushing the allowed-row filter into the traversal.
+
+        Returns:
+            List of tuples: [(location_id, similarity), ...] sorted by similarity
+        """
+        top_k = min(top_k, self.index.get_current_count())
+        self.index.set_ef(max(probe or self.ef, top_k))
+
+        id_filter = None
+        if allowed_mask is not None:
+            allowed_ids = set(int(location_id) for location_id in ids[allowed_mask])
+            id_filter = lambda label: label in allowed_ids
+
+        labels, distances = self.index.knn_query(query_vector, k=top_k, filter=id_filter)
+        # Inner-product distance is 1 - similarity
+        return [(int(label), float(1.0 - distance)) for label, distance in zip(labels[0], distances[0])]
+
+
+def create_ann_index(backend, probe=None):
+    """
+    Create an index for the configured backend, falling back to exact search.
+
+    Parameters:
+        backend: 'exact', 'ivf' or 'hnsw'
+        probe: Default recall/latency knob (IVF nprobe or HNSW ef)
+
+    Returns:
+        Index instance
+    """
+    if backend == 'ivf':
+        return IVFIndex(nprobe=probe or 16)
+    if backend == 'hnsw':
+        if HNSWLIB_AVAILABLE:
+            return HNSWIndex(ef=probe or 64)
+        print("hnswlib is not installed, falling back to exact search")
+    return ExactIndex()
@@ -1,6 +1,28 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class DestinationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'destinations'
+
+    def ready(self):
+        import destinations.signals
+
+        if getattr(settings, 'NLP_WARMUP_ON_STARTUP', False) and self.is_server_process():
+            from .warmup import start_background_warm_up
+            start_background_warm_up()
+
+    @staticmethod
+    def is_server_process():
+        """
+        Check whether this process serves requests (not a management command
+        such as migrate, and not the runserver autoreloader parent).
+        """
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+        if os.path.basename(sys.argv[0]) == 'manage.py':
+            return command == 'runserver' and os.environ.get('RUN_MAIN') == 'true'
+        return True
@@ -0,0 +1,524 @@
+"""
+Compressed bitmap index over Location attributes.
+
+Candidate sets for recommendations and tag lookups (locations in a country,
+with a category, subcategory or subtype) are kept as compressed bitmaps of
+location ids, so combining filters and excluding liked or already shown
+locations are set operations (AND, OR, ANDNOT) instead of database queries
+or list membership checks inside loops.
+
+The bitmaps follow the layout of Roaring bitmaps: ids are split into chunks
+of 65536 by their high 16 bits, and each chunk is stored as a set of the low
+16 bits while it is sparse (array container) or as a 65536-bit integer once
+it holds more than ARRAY_CONTAINER_MAX values (bitmap container). Both
+container types are immutable and combined with built-in set and integer
+operations, which run in C.
+"""
+import random
+import threading
+import time
+from itertools import islice
+
+# Containers with more values than this are stored as bitmaps (as in Roaring)
+ARRAY_CONTAINER_MAX = 4096
+CHUNK_BITS = 16
+LOW_MASK = (1 << CHUNK_BITS) - 1
+
+# Positions of the set bits of every byte value
+BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def bits_to_values(bits):
+    """
+    Get the positions of the set bits of an integer, in ascending order.
+
+    Parameters:
+        bits: Non-negative integer
+
+    Returns:
+        list: Bit positions
+    """
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    return [offset * 8 + bit for offset, byte in enumerate(data) if byte for bit in BYTE_BITS[byte]]
+
+
+def values_to_bits(values):
+    """
+    Set the bits at the given positions of an integer.
+
+    Parameters:
+        values: Bit positions
+
+    Returns:
+        int: Integer with those bits set
+    """
+    bits = 0
+    for value in values:
+        bits |= 1 << value
+    return bits
+
+
+def normalize_container(container):
+    """
+    Pick the container type for the number of values it holds.
+
+    Parameters:
+        container: frozenset (array container) or int (bitmap container)
+
+    Returns:
+        frozenset or int, or None if the container is empty
+    """
+    if isinstance(container, int):
+        if not container:
+            return None
+        return frozenset(bits_to_values(container)) if container.bit_count() <= ARRAY_CONTAINER_MAX else container
+    if not container:
+        return None
+    return values_to_bits(container) if len(container) > ARRAY_CONTAINER_MAX else container
+
+
+def container_contains(container, low):
+    if isinstance(container, int):
+        return bool(container >> low & 1)
+    return low in container
+
+
+def filter_array(values, bits, keep_set):
+    """
+    Keep the values of an array container whose bit is set (or not set) in a bitmap container.
+    """
+    if not bits:
+        return frozenset() if keep_set else values
+    data = bits.to_bytes(8192, 'little')
+    return frozenset(value for value in values if bool(data[value >> 3] >> (value & 7) & 1) == keep_set)
+
+
+def container_and(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return normalize_container(a & b)
+    if isinstance(a, int):
+        return normalize_container(filter_array(b, a, True))
+    if isinstance(b, int):
+        return normalize_container(filter_array(a, b, True))
+    return normalize_container(a & b)
+
+
+def container_or(a, b):
+    if isinstance(a, int) or isinstance(b, int):
+        a = a if isinstance(a, int) else values_to_bits(a)
+        b = b if isinstance(b, int) else values_to_bits(b)
+        return normalize_container(a | b)
+    return normalize_container(a | b)
+
+
+def container_andnot(a, b):
+    if isinstance(a, int):
+        return normalize_container(a & ~(b if isinstance(b, int) else values_to_bits(b)))
+    if isinstance(b, int):
+        return normalize_container(filter_array(a, b, False))
+    return normalize_container(a - b)
+
+
+class Bitmap:
+    """
+    Compressed set of non-negative integer ids (Roaring-style containers).
+
+    Supports `&` (AND), `|` (OR) and `-` (ANDNOT), which return new bitmaps,
+    membership tests and iteration in ascending order.
+    """
+    __slots__ = ('containers',)
+
+    def __init__(self, values=()):
+        """
+        Create a bitmap from ids.
+
+        Parameters:
+            values: Iterable of non-negative integers
+        """
+        chunks = {}
+        for value in values:
+            chunks.setdefault(value >> CHUNK_BITS, []).append(value & LOW_MASK)
+        self.containers = {}
+        for key, lows in chunks.items():
+            self.containers[key] = normalize_container(frozenset(lows))
+
+    @classmethod
+    def from_containers(cls, containers):
+        bitmap = cls()
+        bitmap.containers = containers
+        return bitmap
+
+    @classmethod
+    def union(cls, bitmaps):
+        """
+        OR of several bitmaps.
+
+        Parameters:
+            bitmaps: Iterable of Bitmap
+
+        Returns:
+            Bitmap: New bitmap
+        """
+        result = cls()
+        for bitmap in bitmaps:
+            result |= bitmap
+        return result
+
+    def copy(self):
+        # Containers are immutable, so a shallow copy is independent
+        return Bitmap.from_containers(dict(self.containers))
+
+    def add(self, value):
+        key, low = value >> CHUNK_BITS, value & LOW_MASK
+        container = self.containers.get(key)
+        if container is None:
+            self.containers[key] = frozenset((low,))
+        elif isinstance(container, int):
+            self.containers[key] = container | (1 << low)
+        else:
+            self.containers[key] = normalize_container(container | {low})
+
+    def discard(self, value):
+        key, low = value >> CHUNK_BITS, value & LOW_MASK
+        container = self.containers.get(key)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container = normalize_container(container & ~(1 << low))
+        else:
+            container = normalize_container(container - {low})
+        if container is None:
+            del self.containers[key]
+        else:
+            self.containers[key] = container
+
+    def __contains__(self, value):
+        if not isinstance(value, int) or value < 0:
+            return False
+        container = self.containers.get(value >> CHUNK_BITS)
+        return container is not None and container_contains(container, value & LOW_MASK)
+
+    def __len__(self):
+        return sum(container.bit_count() if isinstance(container, int) else len(container) for container in self.containers.values())
+
+    def __bool__(self):
+        return bool(self.containers)
+
+    def __iter__(self):
+        for key in sorted(self.containers):
+            container = self.containers[key]
+            lows = bits_to_values(container) if isinstance(container, int) else sorted(container)
+            base = key << CHUNK_BITS
+            for low in lows:
+                yield base + low
+
+    def __and__(self, other):
+        containers = {}
+        small, large = (self, other) if len(self.containers) <= len(other.containers) else (other, self)
+        for key, container in small.containers.items():
+            if key in large.containers:
+                result = container_and(container, large.containers[key])
+                if result is not None:
+                    containers[key] = result
+        return Bitmap.from_containers(containers)
+
+    def __or__(self, other):
+        containers = dict(self.containers)
+        for key, container in other.containers.items():
+            containers[key] = container_or(containers[key], container) if key in containers else container
+        return Bitmap.from_containers(containers)
+
+    def __sub__(self, other):
+        containers = {}
+        for key, container in self.containers.items():
+            if key in other.containers:
+                container = container_andnot(container, other.containers[key])
+            if container is not None:
+                containers[key] = container
+        return Bitmap.from_containers(containers)
+
+    def __repr__(self):
+        return f"Bitmap({len(self)} ids)"
+
+    def first(self, n):
+        """
+        Get the n smallest ids.
+
+        Parameters:
+            n: Number of ids
+
+        Returns:
+            list: Ids in ascending order
+        """
+        return list(islice(iter(self), n))
+
+    def sample(self, k, rng=random):
+        """
+        Get k distinct ids chosen uniformly at random, without listing the whole bitmap.
+        Only the containers holding a sampled position are expanded.
+
+        Parameters:
+            k: Number of ids (capped at the bitmap size)
+            rng: random.Random instance (default: the random module)
+
+        Returns:
+            list: Ids in random order
+        """
+        positions = sorted(rng.sample(range(len(self)), min(k, len(self))))
+        values = []
+        offset = 0
+        index = 0
+        for key in sorted(self.containers):
+            if index == len(positions):
+                break
+            container = self.containers[key]
+            size = container.bit_count() if isinstance(container, int) else len(container)
+            if positions[index] < offset + size:
+                lows = bits_to_values(container) if isinstance(container, int) else sorted(container)
+                base = key << CHUNK_BITS
+                while index < len(positions) and positions[index] < offset + size:
+                    values.append(base + lows[positions[index] - offset])
+                    index += 1
+            offset += size
+        rng.shuffle(values)
+        return values
+
+
+class AttributeIndex:
+    """
+    Bitmaps of location ids per attribute value.
+
+    Fields: country, category, subcategory (any position), primary_subcategory
+    (subcategories[0]) and subtype. The index is built lazily from the
+    database, rebuilt when another process changes the catalogue (shared
+    catalogue version), and updated in place for the locations reported
+    through the catalogue hooks of this process.
+    """
+    FIELDS = ('country', 'category', 'subcategory', 'primary_subcategory', 'subtype')
+
+    def __init__(self, version_check_interval=30):
+        """
+        Initialize an empty index (built lazily on first use).
+
+        Parameters:
+            version_check_interval: Seconds between checks of the shared catalogue version
+        """
+        self.version_check_interval = version_check_interval
+        self.bitmaps = {field: {} for field in self.FIELDS}  # field -> value -> Bitmap
+        self.all_ids = Bitmap()
+        self.attributes = {}  # location id -> {field: values}, to remove a location's old values
+
+        self.pending = set()  # Ids changed since the last update
+        self.built = False
+        self.version = None
+        self.version_checked_at = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.attributes)
+
+    @staticmethod
+    def row_attributes(country, category, subcategories, subtypes):
+        """
+        Get the indexed values of a location.
+
+        Parameters:
+            country: Country
+            category: Category
+            subcategories: Subcategories JSON value
+            subtypes: Subtypes JSON value
+
+        Returns:
+            dict: {field: tuple of values}
+        """
+        from .models import Location
+
+        def tags(values):
+            if not isinstance(values, list):
+                return ()
+            return tuple(dict.fromkeys(value for value in values if isinstance(value, str) and value))
+
+        primary_subcategory = Location.first_subcategory(subcategories)
+        return {
+            'country': (country,) if country else (),
+            'category': (category,) if category else (),
+            'subcategory': tags(subcategories),
+            'primary_subcategory': (primary_subcategory,) if primary_subcategory else (),
+            'subtype': tags(subtypes),
+        }
+
+    def build(self):
+        """
+        Build all bitmaps from the Location table.
+        """
+        from .models import Location
+        from . import search_cache
+
+        start_time = time.time()
+        with self.lock:
+            version = search_cache.catalogue_version()
+            # Changes reported while loading are covered by the full build
+            self.pending = set()
+            rows = Location.objects.values_list('id', 'country', 'category', 'subcategories', 'subtypes').iterator(chunk_size=5000)
+            self.build_from_rows(rows)
+            self.version = version
+            self.version_checked_at = time.time()
+        print(f"Attribute bitmap index built: {len(self)} locations ({time.time() - start_time:.2f} seconds)")
+
+    def build_from_rows(self, rows):
+        """
+        Build all bitmaps from (id, country, category, subcategories, subtypes) rows.
+
+        Parameters:
+            rows: Iterable of rows
+        """
+        ids = {field: {} for field in self.FIELDS}
+        attributes = {}
+        for location_id, country, category, subcategories, subtypes in rows:
+            values = self.row_attributes(country, category, subcategories, subtypes)
+            attributes[location_id] = values
+            for field, field_values in values.items():
+                for value in field_values:
+                    ids[field].setdefault(value, []).append(location_id)
+
+        self.bitmaps = {field: {value: Bitmap(value_ids) for value, value_ids in ids[field].items()} for field in self.FIELDS}
+        self.all_ids = Bitmap(attributes)
+        self.attributes = attributes
+        self.built = True
+
+    def add_location(self, location_id, values):
+        self.attributes[location_id] = values
+        self.all_ids.add(location_id)
+        for field, field_values in values.items():
+            for value in field_values:
+                bitmap = self.bitmaps[field].get(value)
+                if bitmap is None:
+                    bitmap = self.bitmaps[field][value] = Bitmap()
+                bitmap.add(location_id)
+
+    def remove_location(self, location_id):
+        values = self.attributes.pop(location_id, None)
+        if values is None:
+            return
+        self.all_ids.discard(location_id)
+        for field, field_values in values.items():
+            for value in field_values:
+                bitmap = self.bitmaps[field].get(value)
+                if bitmap is None:
+                    continue
+                bitmap.discard(location_id)
+                if not bitmap:
+                    del self.bitmaps[field][value]
+
+    def mark_dirty(self, location_ids):
+        with self.lock:
+            self.pending.update(location_ids)
+
+    def mark_deleted(self, location_ids):
+        # Deleted ids are not found when the pending ids are re-read, and are removed then
+        self.mark_dirty(location_ids)
+
+    def apply_pending(self):
+        """
+        Re-read the locations changed in this process and update their bits.
+        """
+        from .models import Location
+
+        location_ids = list(self.pending)
+        self.pending = set()
+        rows = {}
+        for i in range(0, len(location_ids), 500):
+            for row in Location.objects.filter(id__in=location_ids[i:i + 500]).values_list('id', 'country', 'category', 'subcategories', 'subtypes'):
+                rows[row[0]] = row[1:]
+        for location_id in location_ids:
+            self.remove_location(location_id)
+            if location_id in rows:
+                self.add_location(location_id, self.row_attributes(*rows[location_id]))
+
+    def ensure_ready(self):
+        """
+        Build the index on first use, rebuild it when another process changed
+        the catalogue, and apply the changes reported in this process.
+        """
+        from . import search_cache
+
+        with self.lock:
+            if not self.built:
+                self.build()
+                return
+            if self.pending:
+                self.apply_pending()
+                # Local changes bump the shared version too
+                self.version = search_cache.catalogue_version()
+                self.version_checked_at = time.time()
+                return
+            if time.time() - self.version_checked_at >= self.version_check_interval:
+                self.version_checked_at = time.time()
+                if search_cache.catalogue_version() != self.version:
+                    self.build()
+
+    def lookup(self, field, value):
+        """
+        Get the locations with a value.
+
+        Parameters:
+            field: One of FIELDS
+            value: Exact value
+
+        Returns:
+            Bitmap: Location ids (a copy, safe to modify)
+        """
+        self.ensure_ready()
+        bitmap = self.bitmaps[field].get(value)
+        return bitmap.copy() if bitmap is not None else Bitmap()
+
+    def any_of(self, field, values):
+        """
+        Get the locations with any of the values (OR).
+
+        Parameters:
+            field: One of FIELDS
+            values: Exact values
+
+        Returns:
+            Bitmap: Location ids
+        """
+        self.ensure_ready()
+        bitmaps = self.bitmaps[field]
+        return Bitmap.union(bitmaps[value] for value in set(values) if value in bitmaps)
+
+    def containing(self, field, fragments):
+        """
+        Get the locations with a value containing any of the fragments (case-insensitive).
+        Compares against the distinct values of the field, not against every location.
+
+        Parameters:
+            field: One of FIELDS
+            fragments: Text fragments
+
+        Returns:
+            Bitmap: Location ids
+        """
+        self.ensure_ready()
+        fragments = {fragment.lower() for fragment in fragments if isinstance(fragment, str) and fragment}
+        if not fragments:
+            return Bitmap()
+        bitmaps = self.bitmaps[field]
+        return Bitmap.union(
+            bitmap for value, bitmap in bitmaps.items()
+            if isinstance(value, str) and any(fragment in value.lower() for fragment in fragments)
+        )
+
+    def all(self):
+        """
+        Get all indexed locations.
+
+        Returns:
+            Bitmap: Location ids
+        """
+        self.ensure_ready()
+        return self.all_ids.copy()
+
+
+# Shared index instance
+attribute_index = AttributeIndex()
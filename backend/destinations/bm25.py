@@ -0,0 +1,481 @@
+import heapq
+import math
+import re
+import threading
+import time
+
+# Searchable Location fields with their BM25F weights and length normalization (b)
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'city': 2.5,
+    'country': 2.0,
+    'subcategories': 1.5,
+    'subtypes': 1.2,
+    'description': 1.0,
+}
+FIELD_B = {
+    'name': 0.5,
+    'city': 0.3,
+    'country': 0.3,
+    'subcategories': 0.3,
+    'subtypes': 0.3,
+    'description': 0.75,
+}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+# Common words ignored by the lexical ranker
+STOP_WORDS = {
+    'a', 'an', 'the', 'and', 'or', 'but', 'if', 'because', 'as', 'what', 'when', 'where', 'how',
+    'all', 'with', 'for', 'in', 'to', 'at', 'by', 'from', 'on', 'off', 'of', 'is', 'are', 'it', 'i', 'me', 'my'
+}
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def analyze(text):
+    """
+    Tokenize text for lexical ranking (lowercase word tokens without stopwords).
+
+    Parameters:
+        text: Text to tokenize
+
+    Returns:
+        list: Tokens
+    """
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 and token not in STOP_WORDS]
+
+
+def location_field_texts(name, description, city, country, subcategories, subtypes):
+    """
+    Collect the text of each BM25F field of a location.
+
+    Returns:
+        tuple: Field texts in FIELDS order
+    """
+    def join(value):
+        if isinstance(value, list):
+            return " ".join(str(v) for v in value)
+        return value or ""
+
+    values = {
+        'name': name or "",
+        'city': city or "",
+        'country': country or "",
+        'subcategories': join(subcategories),
+        'subtypes': join(subtypes),
+        'description': description or "",
+    }
+    return tuple(values[field] for field in FIELDS)
+
+
+# Location columns read when indexing
+INDEXED_COLUMNS = ('id', 'name', 'description', 'city', 'country', 'subcategories', 'subtypes')
+
+
+class BM25FPostings:
+    """
+    One version of the BM25F index: posting lists, document lengths and
+    per-document field normalization factors.
+
+    A version is never changed once BM25FRanker publishes it; updates are
+    applied to a copy (see copy), so scoring reads it without a lock.
+    IDF is computed per query term from the posting list size, and the
+    normalization factors of unchanged documents are only recomputed when
+    the average field lengths drift by more than a tolerance, so an update
+    costs O(changed documents) instead of a pass over the whole catalogue.
+    """
+    def __init__(self, field_weights, field_b):
+        """
+        Initialize an empty version.
+
+        Parameters:
+            field_weights: Weights in FIELDS order
+            field_b: Length normalization in FIELDS order
+        """
+        self.field_weights = field_weights
+        self.field_b = field_b
+
+        self.postings = {}  # token -> {location_id: per-field term frequencies}
+        self.doc_lengths = {}  # location_id -> per-field token counts
+        self.doc_terms = {}  # location_id -> set of terms (used for updates)
+        self.total_lengths = [0] * len(FIELDS)
+
+        # Average field lengths the factors were computed with
+        self.average_lengths = None
+        self.doc_factors = {}  # location_id -> per-field weight / length normalization
+
+        # Posting lists already copied by this version (safe to modify)
+        self.owned_postings = set()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def copy(self):
+        """
+        Shallow copy for applying updates; posting lists are copied the first time they are modified.
+
+        Returns:
+            BM25FPostings: New version
+        """
+        data = BM25FPostings(self.field_weights, self.field_b)
+        data.postings = dict(self.postings)
+        data.doc_lengths = dict(self.doc_lengths)
+        data.doc_terms = dict(self.doc_terms)
+        data.total_lengths = list(self.total_lengths)
+        data.average_lengths = self.average_lengths
+        data.doc_factors = dict(self.doc_factors)
+        return data
+
+    def document_factors(self, lengths):
+        return tuple(
+            weight / (1 - b + b * length / average)
+            for weight, b, length, average in zip(self.field_weights, self.field_b, lengths, self.average_lengths)
+        )
+
+    def add_document(self, location_id, field_texts):
+        """
+        Add one location to the index.
+
+        Parameters:
+            location_id: Location id
+            field_texts: Field texts in FIELDS order
+        """
+        lengths = []
+        frequencies = {}
+        for position, text in enumerate(field_texts):
+            tokens = analyze(text)
+            lengths.append(len(tokens))
+            for token in tokens:
+                tf = frequencies.setdefault(token, [0] * len(FIELDS))
+                tf[position] += 1
+
+        for token, tf in frequencies.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                self.owned_postings.add(token)
+            elif token not in self.owned_postings:
+                postings = self.postings[token] = dict(postings)
+                self.owned_postings.add(token)
+            postings[location_id] = tuple(tf)
+
+        self.doc_lengths[location_id] = tuple(lengths)
+        self.doc_terms[location_id] = set(frequencies)
+        for position, length in enumerate(lengths):
+            self.total_lengths[position] += length
+        if self.average_lengths is not None:
+            self.doc_factors[location_id] = self.document_factors(lengths)
+
+    def remove_document(self, location_id):
+        """
+        Remove one location from the index.
+
+        Parameters:
+            location_id: Location id
+        """
+        lengths = self.doc_lengths.pop(location_id, None)
+        if lengths is None:
+            return
+
+        for position, length in enumerate(lengths):
+            self.total_lengths[position] -= length
+        self.doc_factors.pop(location_id, None)
+
+        for token in self.doc_terms.pop(location_id, ()):
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            if token not in self.owned_postings:
+                postings = self.postings[token] = dict(postings)
+                self.owned_postings.add(token)
+            postings.pop(location_id, None)
+            if not postings:
+                del self.postings[token]
+
+    def index_rows(self, rows):
+        """
+        (Re)index locations from value rows.
+
+        Parameters:
+            rows: Iterable of tuples in INDEXED_COLUMNS order
+        """
+        for location_id, *fields in rows:
+            self.remove_document(location_id)
+            self.add_document(location_id, location_field_texts(*fields))
+
+    def refresh_statistics(self, tolerance=0.0):
+        """
+        Recompute the normalization factors of every document if the average
+        field lengths moved by more than a relative tolerance since they were computed.
+
+        Parameters:
+            tolerance: Allowed relative drift of the average lengths (0 = always recompute)
+
+        Returns:
+            bool: True if the factors were recomputed
+        """
+        doc_count = len(self.doc_lengths)
+        averages = [max(total / doc_count, 1e-9) if doc_count else 1e-9 for total in self.total_lengths]
+        if self.average_lengths is not None and all(
+            abs(average - previous) <= tolerance * previous for average, previous in zip(averages, self.average_lengths)
+        ):
+            return False
+
+        self.average_lengths = averages
+        self.doc_factors = {location_id: self.document_factors(lengths) for location_id, lengths in self.doc_lengths.items()}
+        return True
+
+    def idf(self, token):
+        postings = self.postings.get(token)
+        if not postings:
+            return 0.0
+        return math.log(1 + (len(self.doc_lengths) - len(postings) + 0.5) / (len(postings) + 0.5))
+
+    def score(self, query, k1, positions=None):
+        """
+        Compute BM25F scores for every location matching at least one query term.
+
+        Parameters:
+            query: Search query text
+            k1: Term frequency saturation parameter
+            positions: Optional FIELDS positions to match against (default: all fields)
+
+        Returns:
+            dict: {location_id: score}
+        """
+        scores = {}
+        for token in set(analyze(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self.idf(token)
+            for location_id, tf in postings.items():
+                factors = self.doc_factors[location_id]
+                # Weighted, length-normalized term frequency across fields
+                if positions is None:
+                    pseudo_tf = sum(f * factor for f, factor in zip(tf, factors) if f)
+                else:
+                    pseudo_tf = sum(tf[position] * factors[position] for position in positions)
+                if pseudo_tf:
+                    scores[location_id] = scores.get(location_id, 0.0) + idf * pseudo_tf / (k1 + pseudo_tf)
+        return scores
+
+
+class BM25FRanker:
+    """
+    BM25F lexical ranker over destination fields.
+
+    Term frequencies are combined across fields with per-field weights and
+    length normalization, then saturated once with k1 (BM25F). Used
+    standalone for lexical search and as the candidate generator for
+    embedding-based re-ranking.
+
+    Searches read the current BM25FPostings version without a lock. Builds
+    and updates run in a background thread on a new version, which then
+    replaces the current one in a single assignment; until the first build
+    finishes, searches return no lexical matches. Changes made by other
+    processes are detected through the shared catalogue version.
+    """
+    def __init__(self, k1=1.2, field_weights=None, field_b=None, version_check_interval=30, statistics_tolerance=0.05):
+        """
+        Initialize an empty ranker (built in the background on first search).
+
+        Parameters:
+            k1: Term frequency saturation parameter
+            field_weights: Optional override of FIELD_WEIGHTS
+            field_b: Optional override of FIELD_B
+            version_check_interval: Seconds between checks of the shared catalogue version
+            statistics_tolerance: Relative drift of the average field lengths tolerated before
+                every document's normalization factors are recomputed
+        """
+        self.k1 = k1
+        self.field_weights = tuple((field_weights or FIELD_WEIGHTS)[field] for field in FIELDS)
+        self.field_b = tuple((field_b or FIELD_B)[field] for field in FIELDS)
+        self.version_check_interval = version_check_interval
+        self.statistics_tolerance = statistics_tolerance
+
+        self.data = BM25FPostings(self.field_weights, self.field_b)
+        self.built = False
+
+        self.dirty_ids = set()
+        self.deleted_ids = set()
+        self.outdated = False  # Another process changed the catalogue: rebuild
+        self.version = None
+        self.version_checked_at = 0
+
+        self.refresh_thread = None
+        self.lock = threading.RLock()  # Held while a new version is built
+        self.pending_lock = threading.Lock()  # Pending ids and the background thread
+
+    def __len__(self):
+        return len(self.data)
+
+    def build(self):
+        """
+        Build a new version from all locations in the database and swap it in.
+        """
+        from .models import Location
+        from . import search_cache
+
+        start_time = time.time()
+        with self.lock:
+            # Changes reported while loading are covered by the full build
+            with self.pending_lock:
+                self.dirty_ids.clear()
+                self.deleted_ids.clear()
+                self.outdated = False
+            version = search_cache.catalogue_version()
+            data = BM25FPostings(self.field_weights, self.field_b)
+            data.index_rows(Location.objects.values_list(*INDEXED_COLUMNS).iterator(chunk_size=2000))
+            data.refresh_statistics()
+            self.data = data
+            self.version = version
+            self.version_checked_at = time.time()
+            self.built = True
+        print(f"BM25F index built: {len(data)} destinations, {len(data.postings)} terms ({time.time() - start_time:.2f} seconds)")
+
+    def mark_dirty(self, location_ids):
+        with self.pending_lock:
+            self.dirty_ids.update(location_ids)
+            self.deleted_ids.difference_update(location_ids)
+
+    def mark_deleted(self, location_ids):
+        with self.pending_lock:
+            self.deleted_ids.update(location_ids)
+            self.dirty_ids.difference_update(location_ids)
+
+    def catalogue_changed(self):
+        """
+        Check the shared catalogue version, at most every version_check_interval seconds.
+
+        Returns:
+            bool: True if another process changed the catalogue since the last build
+        """
+        from . import search_cache
+
+        if time.time() - self.version_checked_at < self.version_check_interval:
+            return False
+        self.version_checked_at = time.time()
+        return search_cache.catalogue_version() != self.version
+
+    def refresh(self):
+        """
+        Bring the index up to date: build it on first use or after changes
+        in another process, otherwise apply the changes reported in this process.
+        """
+        from .models import Location
+        from . import search_cache
+
+        with self.lock:
+            with self.pending_lock:
+                pending = self.dirty_ids | self.deleted_ids
+                dirty_ids = list(self.dirty_ids)
+            # Large imports are cheaper to rebuild than to patch
+            if not self.built or self.outdated or len(pending) > max(1000, len(self.data) // 10):
+                self.build()
+                return
+            if not pending:
+                return
+
+            with self.pending_lock:
+                self.dirty_ids.difference_update(pending)
+                self.deleted_ids.difference_update(pending)
+            data = self.data.copy()
+            for location_id in pending:
+                data.remove_document(location_id)
+            for i in range(0, len(dirty_ids), 1000):
+                data.index_rows(Location.objects.filter(id__in=dirty_ids[i:i + 1000]).values_list(*INDEXED_COLUMNS))
+            data.refresh_statistics(self.statistics_tolerance)
+            self.data = data
+            # Local changes bump the shared version too
+            self.version = search_cache.catalogue_version()
+            self.version_checked_at = time.time()
+
+    def background_refresh(self):
+        """
+        Refresh the index in a background thread (see schedule_refresh).
+        """
+        from django.db import connection
+
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error refreshing BM25F index: {str(e)}")
+        finally:
+            connection.close()
+
+    def schedule_refresh(self):
+        """
+        Refresh the index in a background thread, unless one is already running.
+        """
+        with self.pending_lock:
+            if self.refresh_thread is not None and self.refresh_thread.is_alive():
+                return
+            self.refresh_thread = threading.Thread(target=self.background_refresh, name='bm25-refresh', daemon=True)
+            self.refresh_thread.start()
+
+    def ensure_ready(self):
+        """
+        Return the current version, scheduling a background refresh when it is
+        missing or outdated (called on every search, never waits for a build).
+
+        Returns:
+            BM25FPostings: Version to score against
+        """
+        if not self.built:
+            self.schedule_refresh()
+        elif self.catalogue_changed():
+            self.outdated = True
+            self.schedule_refresh()
+        elif self.outdated or self.dirty_ids or self.deleted_ids:
+            self.schedule_refresh()
+        return self.data
+
+    def sync(self):
+        """
+        Bring the index up to date in the calling thread (warm-up and offline jobs).
+        """
+        if self.built and self.catalogue_changed():
+            self.outdated = True
+        self.refresh()
+
+    def score(self, query, fields=None):
+        """
+        Compute BM25F scores for every location matching at least one query term.
+
+        Parameters:
+            query: Search query text
+            fields: Optional subset of FIELDS to match against (default: all fields)
+
+        Returns:
+            dict: {location_id: score}
+        """
+        data = self.ensure_ready()
+        positions = None
+        if fields is not None:
+            positions = [FIELDS.index(field) for field in fields]
+        return data.score(query, self.k1, positions)
+
+    def search(self, query, top_n=10, allowed_ids=None, fields=None):
+        """
+        Rank locations lexically.
+
+        Parameters:
+            query: Search query text
+            top_n: Number of results to return
+            allowed_ids: Optional set of Location ids to restrict results to
+            fields: Optional subset of FIELDS to match against (default: all fields)
+
+        Returns:
+            List of tuples: [(location_id, bm25_score), ...] sorted by score
+        """
+        scores = self.score(query, fields)
+        if allowed_ids is not None:
+            scores = {location_id: score for location_id, score in scores.items() if location_id in allowed_ids}
+        return heapq.nlargest(top_n, scores.items(), key=lambda x: x[1])
+
+
+# Shared lexical ranker instance
+bm25_ranker = BM25FRanker()
@@ -0,0 +1,98 @@
+"""
+Keeps precomputed search structures in sync with the Location catalogue.
+
+Every index derived from Location rows is notified here when locations are
+created, edited or deleted, whether the change comes from model signals
+(admin, API) or from bulk import scripts.
+"""
+
+
+def locations_changed(location_ids):
+    """
+    Notify derived indexes that locations were inserted or edited.
+
+    Parameters:
+        location_ids: Iterable of changed Location ids
+    """
+    from .location_embeddings import location_embeddings
+    from .keyword_index import keyword_index
+    from .bm25 import bm25_ranker
+    from .spatial_index import spatial_index
+    from .bitmap_index import attribute_index
+    from .tag_vocabulary import tag_vocabulary
+    from . import search_cache, user_features
+
+    location_ids = set(location_ids)
+    if not location_ids:
+        return
+
+    location_embeddings.mark_dirty(location_ids)
+    keyword_index.mark_dirty(location_ids)
+    bm25_ranker.mark_dirty(location_ids)
+    spatial_index.mark_dirty(location_ids)
+    attribute_index.mark_dirty(location_ids)
+    tag_vocabulary.invalidate()
+    search_cache.bump_catalogue_version()
+
+    # Recommendation features of users who liked or reviewed the edited locations
+    user_features.locations_changed(location_ids)
+
+
+def locations_deleted(location_ids):
+    """
+    Notify derived indexes that locations were deleted.
+
+    Parameters:
+        location_ids: Iterable of deleted Location ids
+    """
+    from .location_embeddings import location_embeddings
+    from .keyword_index import keyword_index
+    from .bm25 import bm25_ranker
+    from .spatial_index import spatial_index
+    from .bitmap_index import attribute_index
+    from .tag_vocabulary import tag_vocabulary
+    from . import search_cache
+
+    location_ids = set(location_ids)
+    if not location_ids:
+        return
+
+    location_embeddings.mark_deleted(location_ids)
+    keyword_index.mark_deleted(location_ids)
+    bm25_ranker.mark_deleted(location_ids)
+    spatial_index.mark_deleted(location_ids)
+    attribute_index.mark_deleted(location_ids)
+    tag_vocabulary.invalidate()
+    search_cache.bump_catalogue_version()
+
+
+def apply_change_set(change_set):
+    """
+    Notify derived indexes of a catalogue change set, as written by import_locations.
+    Only the listed ids are invalidated; an empty change set leaves all indexes and caches untouched.
+
+    Parameters:
+        change_set: Dictionary with 'created', 'updated' and optionally 'deleted' id lists
+    """
+    locations_changed(list(change_set.get('created', [])) + list(change_set.get('updated', [])))
+    locations_deleted(change_set.get('deleted', []))
+
+
+def refresh_indexes():
+    """
+    Apply pending catalogue changes to the persisted indexes.
+    Called at the end of import scripts so that running servers pick up the new files.
+    """
+    from .location_embeddings import location_embeddings
+    from .nlp_utils import nlp_processor, NLP_ADVANCED
+    from .item_neighbors import refresh_neighbors, NUMPY_AVAILABLE
+    from .models import LocationNeighbors
+
+    if NLP_ADVANCED:
+        location_embeddings.reload_if_changed()
+        location_embeddings.flush(nlp_processor.encode_texts)
+
+    # Similarity graph: once built, keep it current (only affected lists are recomputed)
+    if NUMPY_AVAILABLE and LocationNeighbors.objects.exists():
+        stats = refresh_neighbors()
+        print(f"Item neighbours refreshed: {stats['recomputed']} lists recomputed, {stats['merged']} merged")
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# NumPy is required to store vectors
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+def content_key(model_name, text):
+    """
+    Content-addressed key of an embedding: hash of the model name and the text.
+
+    Parameters:
+        model_name: Name of the sentence embedding model
+        text: Embedded text
+
+    Returns:
+        bytes: SHA-1 digest
+    """
+    return hashlib.sha1(f"{model_name}\0{text}".encode('utf-8')).digest()
+
+
+class EmbeddingStore:
+    """
+    Persistent embedding cache backed by SQLite.
+
+    Vectors are stored as float16 under a hash of (model name, text), so
+    embeddings survive restarts and are shared by all worker processes.
+    A background thread compacts the store, removing the least recently used
+    entries once it exceeds its entry or size limit.
+    """
+    # Approximate SQLite overhead per row (key, columns, index entry)
+    ROW_OVERHEAD = 64
+
+    def __init__(self, path, max_entries=200000, max_bytes=256 * 1024 * 1024, compaction_interval=600):
+        """
+        Initialize the store (the database is opened lazily).
+
+        Parameters:
+            path: SQLite database file
+            max_entries: Maximum number of stored embeddings
+            max_bytes: Approximate maximum size of stored embeddings
+            compaction_interval: Seconds between background compactions
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compaction_interval = compaction_interval
+
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.initialized = False
+
+        self.compaction_thread = None
+        self.compaction_requested = threading.Event()
+        self.writes_since_compaction = 0
+
+    def connection(self):
+        """
+        Get this thread's SQLite connection, creating the schema on first use.
+
+        Returns:
+            sqlite3.Connection: Database connection
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            return connection
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=20)
+        connection.execute('PRAGMA journal_mode = WAL;')
+        connection.execute('PRAGMA synchronous = NORMAL;')
+
+        with self.lock:
+            if not self.initialized:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS embeddings ('
+                    'key BLOB PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)'
+                )
+                connection.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+                connection.commit()
+                self.initialized = True
+
+        self.local.connection = connection
+        return connection
+
+    def get_many(self, model_name, texts):
+        """
+        Look up stored embeddings.
+
+        Parameters:
+            model_name: Name of the sentence embedding model
+            texts: Texts to look up
+
+        Returns:
+            dict: {text: float32 vector} for texts found in the store
+        """
+        keys = {content_key(model_name, text): text for text in texts}
+        if not keys:
+            return {}
+
+        connection = self.connection()
+        found = {}
+        key_list = list(keys)
+        # Stay below SQLite's bound parameter limit
+        for i in range(0, len(key_list), 500):
+            chunk = key_list[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = connection.execute(
+                f'SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})', chunk
+            ).fetchall()
+            for key, dim, vector in rows:
+                found[keys[key]] = np.frombuffer(vector, dtype=np.float16, count=dim).astype(np.float32)
+
+            if rows:
+                # Track recency for compaction
+                connection.executemany(
+                    'UPDATE embeddings SET last_used = ? WHERE key = ?',
+                    [(time.time(), key) for key, _, _ in rows]
+                )
+        connection.commit()
+        return found
+
+    def put_many(self, model_name, vectors):
+        """
+        Store embeddings.
+
+        Parameters:
+            model_name: Name of the sentence embedding model
+            vectors: {text: vector}
+        """
+        if not vectors:
+            return
+
+        now = time.time()
+        rows = []
+        for text, vector in vectors.items():
+            vector = np.asarray(vector, dtype=np.float16)
+            rows.append((content_key(model_name, text), int(vector.shape[0]), vector.tobytes(), now))
+
+        connection = self.connection()
+        connection.executemany('INSERT OR REPLACE INTO embeddings (key, dim, vector, last_used) VALUES (?, ?, ?, ?)', rows)
+        connection.commit()
+
+        self.writes_since_compaction += len(rows)
+        self.start_compaction_thread()
+        if self.writes_since_compaction >= max(1000, self.max_entries // 20):
+            self.compaction_requested.set()
+
+    def stats(self):
+        """
+        Get store size information.
+
+        Returns:
+            dict: Number of entries and approximate size in bytes
+        """
+        entries, vector_bytes = self.connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings'
+        ).fetchone()
+        return {
+            'entries': entries,
+            'bytes': vector_bytes + entries * self.ROW_OVERHEAD,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+        }
+
+    def compact(self):
+        """
+        Remove least recently used entries until the store is within its limits.
+
+        Returns:
+            int: Number of removed entries
+        """
+        stats = self.stats()
+        entries = stats['entries']
+        if entries == 0:
+            return 0
+
+        limit = self.max_entries
+        if self.max_bytes:
+            bytes_per_entry = stats['bytes'] / entries
+            limit = min(limit, int(self.max_bytes / bytes_per_entry))
+
+        removed = 0
+        if entries > limit:
+            # Trim to 90% of the limit so compaction does not run on every write
+            removed = entries - int(limit * 0.9)
+            connection = self.connection()
+            connection.execute(
+                'DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)',
+                (removed,)
+            )
+            connection.commit()
+            connection.execute('PRAGMA wal_checkpoint(TRUNCATE);')
+            print(f"Embedding store compacted: removed {removed} of {entries} entries")
+
+        self.writes_since_compaction = 0
+        return removed
+
+    def start_compaction_thread(self):
+        """
+        Start the background compaction thread if it is not running yet.
+        """
+        if self.compaction_thread is not None:
+            return
+
+        with self.lock:
+            if self.compaction_thread is not None:
+                return
+            self.compaction_thread = threading.Thread(target=self.compaction_loop, name='embedding-store-compaction', daemon=True)
+            self.compaction_thread.start()
+
+    def compaction_loop(self):
+        while True:
+            # Compact periodically, or sooner after many writes
+            self.compaction_requested.wait(self.compaction_interval)
+            self.compaction_requested.clear()
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error compacting embedding store: {str(e)}")
@@ -0,0 +1,382 @@
+"""
+Item-to-item similarity graph of destinations.
+
+The build_item_neighbors command stores the ITEM_NEIGHBORS_K most similar
+locations of every location in LocationNeighbors. Similarity is a weighted
+sum (ITEM_NEIGHBORS_WEIGHTS) of:
+
+- embedding: cosine similarity of the location embeddings used by semantic search
+- tags: Jaccard similarity of the subcategory and subtype sets
+- distance: geographic proximity, exp(-distance / ITEM_NEIGHBORS_DISTANCE_SCALE_KM)
+
+Scores are computed with matrix products, one block of locations against
+the whole catalogue at a time, so memory stays bounded.
+
+Refreshes are incremental. Only new locations and locations whose content
+hash changed are scored against the catalogue. A stored list is recomputed
+if it contains a changed or deleted location; any other list just merges
+the changed locations that now score above its weakest neighbour (the score
+is symmetric, so the changed block provides those scores as well).
+
+Recommendations read the stored lists (one query for several locations) to
+find destinations similar to liked or recently viewed ones.
+"""
+import time
+from collections import Counter
+
+from django.conf import settings
+
+# NumPy is required to compute the graph (reading it is plain Python)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from .spatial_index import EARTH_RADIUS_KM, unit_vectors
+
+DEFAULT_WEIGHTS = {'embedding': 0.5, 'tags': 0.3, 'distance': 0.2}
+
+
+def tag_keys(subcategories, subtypes):
+    """
+    Get the tags of a location, keeping subcategories and subtypes apart.
+
+    Parameters:
+        subcategories: Subcategory list (or a single string)
+        subtypes: Subtype list (or a single string)
+
+    Returns:
+        set: Tags such as 'subcategory:Beaches' and 'subtype:Parks'
+    """
+    keys = set()
+    for prefix, values in (('subcategory', subcategories), ('subtype', subtypes)):
+        if isinstance(values, str):
+            values = [values] if values else []
+        for value in values or []:
+            keys.add(f"{prefix}:{value}")
+    return keys
+
+
+class NeighborFeatures:
+    """
+    Feature matrices of the catalogue, one row per location:
+    normalized embeddings, a binary tag matrix and coordinates as unit vectors.
+    """
+    def __init__(self, rows, embedding_matrix=None, embedding_rows=None, weights=None, distance_scale_km=50.0):
+        """
+        Build the matrices.
+
+        Parameters:
+            rows: (id, subcategories, subtypes, latitude, longitude) tuples
+            embedding_matrix: Normalized location embeddings (None to score without embeddings)
+            embedding_rows: {location id: row of embedding_matrix}
+            weights: Weights of the 'embedding', 'tags' and 'distance' components
+            distance_scale_km: Distance at which proximity drops to 1/e
+        """
+        self.ids = np.asarray([row[0] for row in rows], dtype=np.int64)
+        self.row_of = {int(location_id): row for row, location_id in enumerate(self.ids)}
+        self.distance_scale_km = distance_scale_km
+        n = len(rows)
+
+        # Tags as a binary (locations x tags) matrix
+        vocabulary = {}
+        tag_rows, tag_columns = [], []
+        for row, (_, subcategories, subtypes, _, _) in enumerate(rows):
+            for key in tag_keys(subcategories, subtypes):
+                tag_rows.append(row)
+                tag_columns.append(vocabulary.setdefault(key, len(vocabulary)))
+        self.tags = np.zeros((n, max(1, len(vocabulary))), dtype=np.float32)
+        self.tags[tag_rows, tag_columns] = 1.0
+        self.tag_counts = self.tags.sum(axis=1)
+
+        # Coordinates on the unit sphere (zero vectors where missing)
+        latitudes = np.asarray([np.nan if row[3] is None else row[3] for row in rows], dtype=np.float64)
+        longitudes = np.asarray([np.nan if row[4] is None else row[4] for row in rows], dtype=np.float64)
+        self.has_point = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        self.points = np.zeros((n, 3), dtype=np.float64)
+        if self.has_point.any():
+            self.points[self.has_point] = unit_vectors(latitudes[self.has_point], longitudes[self.has_point])
+
+        # Embeddings in catalogue order (zero vectors for locations not encoded yet)
+        self.embeddings = None
+        if embedding_matrix is not None and embedding_rows:
+            source_rows = np.asarray([embedding_rows.get(int(location_id), -1) for location_id in self.ids], dtype=np.int64)
+            present = source_rows >= 0
+            self.embeddings = np.zeros((n, embedding_matrix.shape[1]), dtype=np.float32)
+            self.embeddings[present] = np.asarray(embedding_matrix[source_rows[present]], dtype=np.float32)
+
+        # Without embeddings the other components share the full weight
+        weights = dict(weights or DEFAULT_WEIGHTS)
+        if self.embeddings is None:
+            weights['embedding'] = 0.0
+        total = sum(weights.values()) or 1.0
+        self.weights = {name: weights.get(name, 0.0) / total for name in DEFAULT_WEIGHTS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, rows):
+        """
+        Similarity of some locations to every location in the catalogue.
+
+        Parameters:
+            rows: Array of row numbers
+
+        Returns:
+            ndarray: (len(rows), n) float32 scores; the score of a location to itself is -inf
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = np.zeros((len(rows), len(self.ids)), dtype=np.float32)
+
+        if self.weights['embedding']:
+            cosine = self.embeddings[rows] @ self.embeddings.T
+            scores += self.weights['embedding'] * np.clip(cosine, 0.0, 1.0)
+
+        if self.weights['tags']:
+            shared = self.tags[rows] @ self.tags.T
+            union = self.tag_counts[rows, None] + self.tag_counts[None, :] - shared
+            scores += self.weights['tags'] * np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+        if self.weights['distance']:
+            distance = EARTH_RADIUS_KM * np.arccos(np.clip(self.points[rows] @ self.points.T, -1.0, 1.0))
+            proximity = np.exp(-distance / self.distance_scale_km)
+            proximity[~self.has_point[rows]] = 0.0
+            proximity[:, ~self.has_point] = 0.0
+            scores += (self.weights['distance'] * proximity).astype(np.float32)
+
+        scores[np.arange(len(rows)), rows] = -np.inf
+        return scores
+
+    def top_neighbors(self, scores, k):
+        """
+        Get the k best scored locations of each row of a score block.
+
+        Parameters:
+            scores: (rows, n) score block
+            k: Number of neighbours per row
+
+        Returns:
+            list: One [[location id, similarity], ...] list per row, most similar first
+            (locations with no similarity at all are left out)
+        """
+        k = min(k, len(self.ids) - 1)
+        if k <= 0:
+            return [[] for _ in range(len(scores))]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            [[int(self.ids[column]), round(float(score), 4)] for column, score in zip(columns, row_scores) if score > 0]
+            for columns, row_scores in zip(top, top_scores)
+        ]
+
+
+class ColumnBest:
+    """
+    The k highest scores seen in each column across score blocks, with their rows.
+    Collects, for every location, its best matches among the changed locations.
+    """
+    def __init__(self, k, n):
+        self.k = k
+        self.scores = np.full((0, n), -np.inf, dtype=np.float32)
+        self.rows = np.zeros((0, n), dtype=np.int64)
+
+    def update(self, scores, rows):
+        """
+        Merge a score block.
+
+        Parameters:
+            scores: (len(rows), n) score block
+            rows: Row numbers of the block
+        """
+        block_rows = np.broadcast_to(np.asarray(rows, dtype=np.int64)[:, None], scores.shape)
+        scores = np.vstack([self.scores, scores])
+        rows = np.vstack([self.rows, block_rows])
+        if len(scores) > self.k:
+            keep = np.argpartition(-scores, self.k - 1, axis=0)[:self.k]
+            scores = np.take_along_axis(scores, keep, axis=0)
+            rows = np.take_along_axis(rows, keep, axis=0)
+        self.scores = scores
+        self.rows = rows
+
+
+def embedding_source():
+    """
+    Get the location embedding matrix, refreshed for pending catalogue changes.
+
+    Returns:
+        tuple: (matrix, {location id: row}), or (None, {}) if no embeddings are available
+    """
+    from .location_embeddings import location_embeddings
+    from .nlp_utils import nlp_processor, NLP_ADVANCED
+
+    if NLP_ADVANCED:
+        location_embeddings.sync(nlp_processor.encode_texts)
+    elif not location_embeddings.is_loaded():
+        location_embeddings.load()
+
+    # Read one snapshot so the matrix and the row map always match
+    snapshot = location_embeddings.snapshot
+    if snapshot is None:
+        return None, {}
+    return snapshot.matrix, snapshot.id_to_row
+
+
+def refresh_neighbors(full=False, k=None, block_size=None, log=print):
+    """
+    Bring the stored neighbour lists up to date with the catalogue.
+
+    Parameters:
+        full: Recompute every list (needed after changing k, the weights or the embedding model)
+        k: Neighbours per location (default: ITEM_NEIGHBORS_K)
+        block_size: Locations scored per block (default: ITEM_NEIGHBORS_BLOCK_SIZE)
+        log: Function used to report progress
+
+    Returns:
+        dict: Refresh statistics
+    """
+    from django.db import transaction
+    from .models import Location, LocationNeighbors
+
+    k = max(1, k or getattr(settings, 'ITEM_NEIGHBORS_K', 50))
+    block_size = max(1, block_size or getattr(settings, 'ITEM_NEIGHBORS_BLOCK_SIZE', 256))
+    start_time = time.time()
+
+    rows = list(
+        Location.objects.order_by('id')
+        .values_list('id', 'content_hash', 'subcategories', 'subtypes', 'latitude', 'longitude')
+        .iterator(chunk_size=5000)
+    )
+    content_hashes = {row[0]: row[1] for row in rows}
+    stored = {
+        location_id: (content_hash, neighbors)
+        for location_id, content_hash, neighbors in LocationNeighbors.objects.values_list('location_id', 'content_hash', 'neighbors')
+    }
+
+    # New and edited locations; deleted ones only remain inside other lists
+    if full:
+        changed_ids = set(content_hashes)
+    else:
+        changed_ids = {
+            location_id for location_id, content_hash in content_hashes.items()
+            if location_id not in stored or stored[location_id][0] != content_hash
+        }
+    deleted_ids = {neighbor_id for _, neighbors in stored.values() for neighbor_id, _ in neighbors} - set(content_hashes)
+
+    # Lists holding a changed or deleted location are recomputed completely
+    outdated_ids = changed_ids | deleted_ids
+    recompute_ids = set(changed_ids)
+    for location_id, (_, neighbors) in stored.items():
+        if location_id in content_hashes and any(neighbor_id in outdated_ids for neighbor_id, _ in neighbors):
+            recompute_ids.add(location_id)
+
+    stats = {'locations': len(rows), 'changed': len(changed_ids), 'deleted': len(deleted_ids), 'recomputed': len(recompute_ids), 'merged': 0}
+    if not recompute_ids:
+        stats['seconds'] = time.time() - start_time
+        return stats
+
+    embedding_matrix, embedding_rows = embedding_source()
+    features = NeighborFeatures(
+        [(location_id, subcategories, subtypes, latitude, longitude) for location_id, _, subcategories, subtypes, latitude, longitude in rows],
+        embedding_matrix,
+        embedding_rows,
+        getattr(settings, 'ITEM_NEIGHBORS_WEIGHTS', DEFAULT_WEIGHTS),
+        getattr(settings, 'ITEM_NEIGHBORS_DISTANCE_SCALE_KM', 50.0),
+    )
+    log(f"Scoring {len(recompute_ids)} of {len(features)} locations in blocks of {block_size} "
+        f"(embeddings: {'yes' if features.embeddings is not None else 'no'})")
+
+    lists = {}
+    recompute_rows = np.asarray(sorted(features.row_of[location_id] for location_id in recompute_ids), dtype=np.int64)
+    changed_mask = np.zeros(len(features), dtype=bool)
+    changed_mask[[features.row_of[location_id] for location_id in changed_ids]] = True
+    column_best = ColumnBest(k, len(features)) if not full else None
+
+    for start in range(0, len(recompute_rows), block_size):
+        block = recompute_rows[start:start + block_size]
+        scores = features.scores(block)
+        for row, neighbors in zip(block, features.top_neighbors(scores, k)):
+            lists[int(features.ids[row])] = neighbors
+        if column_best is not None and changed_mask[block].any():
+            column_best.update(scores[changed_mask[block]], block[changed_mask[block]])
+        log(f"{min(start + block_size, len(recompute_rows))}/{len(recompute_rows)} locations scored")
+
+    # Remaining lists only gain changed locations that beat their weakest neighbour
+    if column_best is not None and len(column_best.scores):
+        best_scores = column_best.scores.max(axis=0)
+        for location_id, (_, neighbors) in stored.items():
+            if location_id not in content_hashes or location_id in recompute_ids:
+                continue
+            row = features.row_of[location_id]
+            threshold = neighbors[-1][1] if len(neighbors) >= k else 0.0
+            if best_scores[row] <= threshold:
+                continue
+            candidates = [
+                [int(features.ids[candidate_row]), round(float(score), 4)]
+                for score, candidate_row in zip(column_best.scores[:, row], column_best.rows[:, row])
+                if score > threshold
+            ]
+            lists[location_id] = sorted(neighbors + candidates, key=lambda pair: -pair[1])[:k]
+            stats['merged'] += 1
+
+    objects = [
+        LocationNeighbors(location_id=location_id, content_hash=content_hashes[location_id], neighbors=neighbors)
+        for location_id, neighbors in lists.items()
+    ]
+    for start in range(0, len(objects), 1000):
+        with transaction.atomic():
+            LocationNeighbors.objects.bulk_create(
+                objects[start:start + 1000],
+                update_conflicts=True,
+                unique_fields=['location'],
+                update_fields=['content_hash', 'neighbors', 'computed_at'],
+            )
+
+    stats['seconds'] = time.time() - start_time
+    return stats
+
+
+def neighbor_lists(location_ids):
+    """
+    Get the stored neighbour lists of several locations.
+
+    Parameters:
+        location_ids: Iterable of Location ids
+
+    Returns:
+        dict: {location id: [[neighbour id, similarity], ...]} for locations with a stored list
+    """
+    from .models import LocationNeighbors
+
+    return dict(LocationNeighbors.objects.filter(location_id__in=list(location_ids)).values_list('location_id', 'neighbors'))
+
+
+def similar_to(location_ids, exclude=None):
+    """
+    Rank the neighbours of one or more locations.
+    A neighbour of several of them is ranked by its highest similarity,
+    then by the number of locations it is similar to.
+
+    Parameters:
+        location_ids: Source Location ids (never returned)
+        exclude: Optional collection of Location ids to leave out (e.g. a Bitmap of liked ids)
+
+    Returns:
+        list: (location id, similarity) tuples, most similar first
+    """
+    location_ids = set(location_ids)
+    if not location_ids:
+        return []
+
+    best = {}
+    counts = Counter()
+    for neighbors in neighbor_lists(location_ids).values():
+        for neighbor_id, similarity in neighbors:
+            if neighbor_id in location_ids or (exclude is not None and neighbor_id in exclude):
+                continue
+            best[neighbor_id] = max(similarity, best.get(neighbor_id, similarity))
+            counts[neighbor_id] += 1
+    return sorted(best.items(), key=lambda item: (-item[1], -counts[item[0]], item[0]))
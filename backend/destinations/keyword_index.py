@@ -0,0 +1,391 @@
+import threading
+import time
+
+# Field flags stored in posting lists (a token can occur in several fields)
+FIELD_NAME = 1
+FIELD_DESCRIPTION = 2
+FIELD_CATEGORY = 4
+FIELD_CITY = 8
+FIELD_COUNTRY = 16
+FIELD_SUBCATEGORIES = 32
+
+# Location columns read when indexing
+INDEXED_COLUMNS = ('id', 'name', 'description', 'category', 'city', 'country', 'subcategories')
+
+
+def tokenize(text):
+    """
+    Split text into lowercase whitespace-delimited tokens.
+    Matches how keyword search compares query words against destination text.
+
+    Parameters:
+        text: Text to tokenize
+
+    Returns:
+        list: Tokens
+    """
+    return text.lower().split() if text else []
+
+
+def trigrams(token):
+    """
+    Return the set of character trigrams of a token.
+
+    Parameters:
+        token: Token string
+
+    Returns:
+        set: Trigrams of the token
+    """
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def location_field_tokens(name, description, category, city, country, subcategories):
+    """
+    Tokenize the searchable fields of a location.
+
+    Returns:
+        dict: Mapping of token -> field flags
+    """
+    tokens = {}
+
+    def add(text, field):
+        for token in tokenize(text):
+            tokens[token] = tokens.get(token, 0) | field
+
+    add(name, FIELD_NAME)
+    add(description, FIELD_DESCRIPTION)
+    add(category, FIELD_CATEGORY)
+    add(city, FIELD_CITY)
+    add(country, FIELD_COUNTRY)
+
+    if subcategories:
+        if isinstance(subcategories, list):
+            add(" ".join(str(s) for s in subcategories), FIELD_SUBCATEGORIES)
+        elif isinstance(subcategories, str):
+            add(subcategories, FIELD_SUBCATEGORIES)
+
+    return tokens
+
+
+class KeywordPostings:
+    """
+    Posting lists, vocabulary trigrams and per-document tokens of one index version.
+
+    A version is never changed once it is published by KeywordIndex: updates
+    are applied to a copy (see copy), so searches can read it without a lock.
+    """
+    def __init__(self):
+        self.postings = {}  # token -> {location_id: field_flags}
+        self.doc_tokens = {}  # location_id -> set of tokens (used for updates)
+        self.trigram_index = {}  # trigram -> set of tokens containing it
+
+        # Inner posting lists and trigram sets already copied by this version (safe to modify)
+        self.owned_postings = set()
+        self.owned_trigrams = set()
+
+    def __len__(self):
+        return len(self.doc_tokens)
+
+    def copy(self):
+        """
+        Shallow copy for applying updates. Inner posting lists and trigram sets
+        are shared with this version and copied the first time they are modified.
+
+        Returns:
+            KeywordPostings: New version
+        """
+        data = KeywordPostings()
+        data.postings = dict(self.postings)
+        data.doc_tokens = dict(self.doc_tokens)
+        data.trigram_index = dict(self.trigram_index)
+        return data
+
+    def own_postings(self, token):
+        postings = self.postings.get(token)
+        if postings is not None and token not in self.owned_postings:
+            postings = self.postings[token] = dict(postings)
+            self.owned_postings.add(token)
+        return postings
+
+    def own_trigram(self, trigram):
+        tokens = self.trigram_index.get(trigram)
+        if tokens is not None and trigram not in self.owned_trigrams:
+            tokens = self.trigram_index[trigram] = set(tokens)
+            self.owned_trigrams.add(trigram)
+        return tokens
+
+    def add_document(self, location_id, field_tokens):
+        """
+        Add one location's tokens to the posting lists.
+
+        Parameters:
+            location_id: Location id
+            field_tokens: Mapping of token -> field flags
+        """
+        for token, fields in field_tokens.items():
+            postings = self.own_postings(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                self.owned_postings.add(token)
+                for trigram in trigrams(token):
+                    tokens = self.own_trigram(trigram)
+                    if tokens is None:
+                        tokens = self.trigram_index[trigram] = set()
+                        self.owned_trigrams.add(trigram)
+                    tokens.add(token)
+            postings[location_id] = fields
+        self.doc_tokens[location_id] = set(field_tokens)
+
+    def remove_document(self, location_id):
+        """
+        Remove one location from all posting lists.
+
+        Parameters:
+            location_id: Location id
+        """
+        for token in self.doc_tokens.pop(location_id, ()):
+            postings = self.own_postings(token)
+            if postings is None:
+                continue
+            postings.pop(location_id, None)
+            if not postings:
+                # Drop tokens that no longer occur anywhere
+                del self.postings[token]
+                for trigram in trigrams(token):
+                    tokens = self.own_trigram(trigram)
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self.trigram_index[trigram]
+
+    def index_rows(self, rows):
+        """
+        (Re)index locations from value rows.
+
+        Parameters:
+            rows: Iterable of tuples in INDEXED_COLUMNS order
+        """
+        for location_id, *fields in rows:
+            self.remove_document(location_id)
+            self.add_document(location_id, location_field_tokens(*fields))
+
+    def matching_tokens(self, word):
+        """
+        Find all indexed tokens that contain a word as a substring.
+
+        Parameters:
+            word: Query word
+
+        Returns:
+            list: Matching tokens
+        """
+        if len(word) < 3:
+            # Too short for trigrams, scan the vocabulary
+            return [token for token in self.postings if word in token]
+
+        candidates = None
+        for trigram in trigrams(word):
+            tokens = self.trigram_index.get(trigram)
+            if not tokens:
+                return []
+            candidates = set(tokens) if candidates is None else candidates & tokens
+        return [token for token in candidates if word in token]
+
+    def exact_matches(self, word):
+        """
+        Get the posting list for an exact token match.
+
+        Parameters:
+            word: Query word
+
+        Returns:
+            dict: {location_id: field_flags} (read-only)
+        """
+        return self.postings.get(word, {})
+
+    def partial_matches(self, word):
+        """
+        Get all locations containing a word as a substring of any token.
+
+        Parameters:
+            word: Query word
+
+        Returns:
+            dict: {location_id: combined field_flags of matching tokens}
+        """
+        matches = {}
+        for token in self.matching_tokens(word):
+            for location_id, fields in self.postings[token].items():
+                matches[location_id] = matches.get(location_id, 0) | fields
+        return matches
+
+
+class KeywordIndex:
+    """
+    Tokenized inverted index over destination text fields.
+
+    Maps each token to a posting list of {location_id: field_flags}. Substring
+    (partial) matches are resolved through a trigram index over the vocabulary,
+    so a query only touches the postings of matching tokens instead of scanning
+    every destination.
+
+    Updates are copy-on-write: pending changes are applied to a copy of the
+    current KeywordPostings, which then replaces it in one assignment.
+    Searches take the current version from ensure_ready and never see a
+    partially applied update. Changes made by other processes are detected
+    through the shared catalogue version and rebuilt in the background.
+    """
+    def __init__(self, version_check_interval=30):
+        """
+        Initialize an empty index (built lazily on first search).
+
+        Parameters:
+            version_check_interval: Seconds between checks of the shared catalogue version
+        """
+        self.version_check_interval = version_check_interval
+        self.data = KeywordPostings()
+        self.built = False
+
+        # Locations changed or deleted since the index was last updated
+        self.dirty_ids = set()
+        self.deleted_ids = set()
+
+        self.version = None
+        self.version_checked_at = 0
+        self.rebuild_thread = None
+        self.lock = threading.RLock()  # Held while a new version is built
+        self.pending_lock = threading.Lock()  # Pending ids and the background thread
+
+    def __len__(self):
+        return len(self.data)
+
+    def build(self):
+        """
+        Build the index from all locations in the database.
+        """
+        from .models import Location
+        from . import search_cache
+
+        start_time = time.time()
+        with self.lock:
+            # Changes reported while loading are covered by the full build
+            with self.pending_lock:
+                self.dirty_ids.clear()
+                self.deleted_ids.clear()
+            version = search_cache.catalogue_version()
+            data = KeywordPostings()
+            data.index_rows(Location.objects.values_list(*INDEXED_COLUMNS).iterator(chunk_size=2000))
+            self.data = data
+            self.version = version
+            self.version_checked_at = time.time()
+            self.built = True
+        print(f"Keyword index built: {len(data.doc_tokens)} destinations, {len(data.postings)} tokens ({time.time() - start_time:.2f} seconds)")
+
+    def mark_dirty(self, location_ids):
+        with self.pending_lock:
+            self.dirty_ids.update(location_ids)
+            self.deleted_ids.difference_update(location_ids)
+
+    def mark_deleted(self, location_ids):
+        with self.pending_lock:
+            self.deleted_ids.update(location_ids)
+            self.dirty_ids.difference_update(location_ids)
+
+    def catalogue_changed(self):
+        """
+        Check the shared catalogue version, at most every version_check_interval seconds.
+
+        Returns:
+            bool: True if another process changed the catalogue since the last build
+        """
+        from . import search_cache
+
+        if time.time() - self.version_checked_at < self.version_check_interval:
+            return False
+        self.version_checked_at = time.time()
+        return search_cache.catalogue_version() != self.version
+
+    def background_build(self):
+        """
+        Rebuild the index in a background thread (see schedule_build).
+        """
+        from django.db import connection
+
+        try:
+            self.build()
+        except Exception as e:
+            print(f"Error rebuilding keyword index: {str(e)}")
+        finally:
+            connection.close()
+
+    def schedule_build(self):
+        """
+        Rebuild the index in a background thread, unless one is already running.
+        Searches keep using the current version meanwhile.
+        """
+        with self.pending_lock:
+            if self.rebuild_thread is not None and self.rebuild_thread.is_alive():
+                return
+            self.rebuild_thread = threading.Thread(target=self.background_build, name='keyword-index-build', daemon=True)
+            self.rebuild_thread.start()
+
+    def ensure_ready(self):
+        """
+        Build the index on first use, apply pending location changes and
+        rebuild it in the background when another process changed the catalogue.
+        While another thread applies changes, the current version is returned
+        without waiting.
+
+        Returns:
+            KeywordPostings: Version to search
+        """
+        from .models import Location
+        from . import search_cache
+
+        if self.built and self.catalogue_changed():
+            self.schedule_build()
+            return self.data
+        if self.built and not (self.dirty_ids or self.deleted_ids):
+            return self.data
+        if not self.built:
+            self.lock.acquire()
+        elif not self.lock.acquire(blocking=False):
+            return self.data
+
+        try:
+            if not self.built:
+                self.build()
+                return self.data
+
+            with self.pending_lock:
+                dirty_list = list(self.dirty_ids)
+                deleted_list = list(self.deleted_ids)
+                self.dirty_ids.clear()
+                self.deleted_ids.clear()
+            if not dirty_list and not deleted_list:
+                return self.data
+
+            data = self.data.copy()
+            for i in range(0, len(dirty_list), 1000):
+                chunk = dirty_list[i:i + 1000]
+                # Ids missing from the database were deleted in the meantime
+                for location_id in chunk:
+                    data.remove_document(location_id)
+                data.index_rows(Location.objects.filter(id__in=chunk).values_list(*INDEXED_COLUMNS))
+            for location_id in deleted_list:
+                data.remove_document(location_id)
+            self.data = data
+            return data
+        finally:
+            self.lock.release()
+
+    def exact_matches(self, word):
+        return self.data.exact_matches(word)
+
+    def partial_matches(self, word):
+        return self.data.partial_matches(word)
+
+
+# Shared keyword index instance
+keyword_index = KeywordIndex()
@@ -0,0 +1,642 @@
+import os
+import threading
+import time
+
+# NumPy is required for the precomputed embedding matrix
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from django.conf import settings
+from .ann_index import create_ann_index, ExactIndex
+
+
+def build_location_text(location):
+    """
+    Build the text that represents a destination for embedding.
+    City and country are repeated to increase their weight in the embedding.
+
+    Parameters:
+        location: Location object
+
+    Returns:
+        str: Combined destination text
+    """
+    dest_text = f"{location.name} {location.description or ''}"
+
+    # Add city and country information (repeated for increased weight)
+    if location.city:
+        dest_text += f" {location.city} {location.city} {location.city}"
+    if location.country:
+        dest_text += f" {location.country} {location.country} {location.country}"
+
+    # Add subcategory and subtype (only first 5 of each)
+    if location.subcategories:
+        if isinstance(location.subcategories, list):
+            dest_text += " " + " ".join(location.subcategories[:5])
+        elif isinstance(location.subcategories, str):
+            dest_text += " " + location.subcategories
+
+    if location.subtypes:
+        if isinstance(location.subtypes, list):
+            dest_text += " " + " ".join(location.subtypes[:5])
+        elif isinstance(location.subtypes, str):
+            dest_text += " " + location.subtypes
+
+    return dest_text
+
+
+class EmbeddingSnapshot:
+    """
+    One published version of the matrix: the rows, their Location ids and the
+    nearest-neighbour index trained over them (None until trained).
+    A snapshot is never modified once published. Writers build a new one and
+    swap it in with a single assignment, so searches read it without locking.
+    """
+    def __init__(self, matrix, ids, ann_index=None, id_to_row=None):
+        """
+        Parameters:
+            matrix: (n, dim) float32 array, rows are normalized embeddings
+            ids: (n,) int64 array of Location ids
+            ann_index: Trained nearest-neighbour index over the rows, if any
+            id_to_row: {location id: row} (computed from ids if not given)
+        """
+        self.matrix = matrix
+        self.ids = ids
+        self.id_to_row = id_to_row if id_to_row is not None else {int(location_id): row for row, location_id in enumerate(ids)}
+        self.ann_index = ann_index
+
+
+class LocationEmbeddingMatrix:
+    """
+    Precomputed embedding matrix of all destinations, keyed by Location id.
+
+    Rows are L2-normalized float32 vectors stored as .npy files so they can be
+    memory-mapped at startup. A query then only needs one encode and one
+    matrix-vector product. The matrix is built offline (build_location_embeddings);
+    searches never encode the catalogue. Changed locations are tracked as dirty
+    ids and re-encoded in one batch by the import command or, for edits made
+    through signals, by a background thread.
+    Large catalogues are searched through an approximate nearest-neighbour index
+    (see ann_index.py) with exact search as the fallback. The index is trained
+    once the matrix reaches NLP_ANN_MIN_ROWS and retrained when it has grown by
+    NLP_ANN_RETRAIN_GROWTH since the last training.
+    Searches read the current EmbeddingSnapshot; flushes build the next one off
+    the request path and publish it when it is complete.
+    """
+    MATRIX_FILE = 'matrix.npy'
+    IDS_FILE = 'ids.npy'
+
+    def __init__(self, directory=None, consistency_check_interval=300):
+        """
+        Initialize the embedding matrix (files are loaded lazily).
+
+        Parameters:
+            directory: Directory holding the matrix files (default: NLP_MODELS_DIR/location_embeddings)
+            consistency_check_interval: Seconds between checks for locations added or deleted without signals
+        """
+        self.directory = directory or os.path.join(settings.NLP_MODELS_DIR, 'location_embeddings')
+        self.snapshot = None  # Current EmbeddingSnapshot, replaced (never modified) by writers
+        self.loaded_mtime = None
+
+        # Locations changed or deleted since the matrix was last written
+        self.dirty_ids = set()
+        self.deleted_ids = set()
+
+        # Training policy of the approximate nearest-neighbour index
+        self.ann_min_rows = settings.NLP_ANN_MIN_ROWS
+        self.ann_retrain_growth = getattr(settings, 'NLP_ANN_RETRAIN_GROWTH', 0.25)
+        self.ann_trained_rows = 0  # Matrix rows when the index was trained
+        self.ann_rows_added = 0  # Rows appended since then
+
+        self.consistency_check_interval = consistency_check_interval
+        self.consistency_checked_at = 0
+        self.missing_reported = False
+
+        # self.lock guards the pending sets and the flush thread; flush_lock serializes
+        # writers. Searches take neither, they read self.snapshot.
+        self.lock = threading.RLock()
+        self.flush_lock = threading.RLock()
+        self.flush_thread = None
+
+    @property
+    def matrix_path(self):
+        return os.path.join(self.directory, self.MATRIX_FILE)
+
+    @property
+    def ids_path(self):
+        return os.path.join(self.directory, self.IDS_FILE)
+
+    @property
+    def matrix(self):
+        return None if self.snapshot is None else self.snapshot.matrix
+
+    @property
+    def ids(self):
+        return None if self.snapshot is None else self.snapshot.ids
+
+    @property
+    def id_to_row(self):
+        return {} if self.snapshot is None else self.snapshot.id_to_row
+
+    @property
+    def ann_index(self):
+        return None if self.snapshot is None else self.snapshot.ann_index
+
+    @property
+    def ann_ready(self):
+        return self.ann_index is not None
+
+    def __len__(self):
+        return 0 if self.snapshot is None else len(self.snapshot.ids)
+
+    def is_loaded(self):
+        """
+        Check whether a matrix is currently available in memory.
+
+        Returns:
+            bool: True if the matrix is loaded
+        """
+        return self.snapshot is not None
+
+    def load(self):
+        """
+        Memory-map the matrix files from disk.
+
+        Returns:
+            bool: True if the matrix was loaded, False if no usable files exist
+        """
+        if not NUMPY_AVAILABLE or not os.path.exists(self.ids_path) or not os.path.exists(self.matrix_path):
+            return False
+
+        with self.flush_lock:
+            try:
+                mtime = os.path.getmtime(self.ids_path)
+                matrix = np.load(self.matrix_path, mmap_mode='r')
+                ids = np.load(self.ids_path)
+            except (OSError, ValueError) as e:
+                print(f"Error loading location embedding matrix: {str(e)}")
+                return False
+
+            # Files are replaced one at a time, skip a half-written pair
+            if matrix.shape[0] != ids.shape[0]:
+                print("Location embedding files are out of sync, keeping the current matrix")
+                return self.is_loaded()
+
+            # A missing or unreadable index is retrained by the next flush (exact search meanwhile)
+            ann_index = create_ann_index(settings.NLP_ANN_BACKEND, settings.NLP_ANN_PROBE)
+            try:
+                if not ann_index.load(self.directory, matrix, ids):
+                    ann_index = None
+            except Exception as e:
+                print(f"Error loading nearest-neighbour index, using exact search until rebuilt: {str(e)}")
+                ann_index = None
+            self.snapshot = EmbeddingSnapshot(matrix, ids, ann_index)
+            self.loaded_mtime = mtime
+            self.ann_trained_rows = len(ids) if ann_index is not None else 0
+            self.ann_rows_added = 0
+            print(f"Location embedding matrix loaded: {matrix.shape[0]} rows (ANN index: {ann_index.name if ann_index is not None else 'not built'})")
+            return True
+
+    def reload_if_changed(self):
+        """
+        Reload the matrix if another process (e.g. insert.py) has written a newer version.
+        Skipped while this process is writing; the flush reloads first anyway.
+        """
+        try:
+            mtime = os.path.getmtime(self.ids_path)
+        except OSError:
+            return
+        if self.loaded_mtime is not None and mtime <= self.loaded_mtime:
+            return
+        if not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            self.load()
+        finally:
+            self.flush_lock.release()
+
+    def save(self):
+        """
+        Write the matrix to disk atomically (temporary file + rename).
+        """
+        if not self.is_loaded():
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Writers hold flush_lock; searches keep reading the snapshot during the disk writes
+        with self.flush_lock:
+            snapshot = self.snapshot
+            for path, array in ((self.matrix_path, snapshot.matrix), (self.ids_path, snapshot.ids)):
+                tmp_path = f"{path}.tmp.npy"
+                np.save(tmp_path, np.ascontiguousarray(array))
+                os.replace(tmp_path, path)
+            if snapshot.ann_index is not None:
+                snapshot.ann_index.save(self.directory)
+            self.loaded_mtime = os.path.getmtime(self.ids_path)
+
+    def build(self, locations, encode_texts, batch_size=256):
+        """
+        Build the full matrix from scratch (offline job).
+
+        Parameters:
+            locations: Iterable of Location objects
+            encode_texts: Callable that turns a list of texts into a normalized (n, dim) array
+            batch_size: Number of locations encoded per batch
+
+        Returns:
+            int: Number of rows in the new matrix
+        """
+        start_time = time.time()
+        ids = []
+        blocks = []
+        batch = []
+
+        for location in locations:
+            batch.append(location)
+            if len(batch) >= batch_size:
+                ids.extend(location.id for location in batch)
+                blocks.append(encode_texts([build_location_text(location) for location in batch]))
+                batch = []
+                print(f"Encoded {len(ids)} locations ({time.time() - start_time:.2f} seconds)")
+
+        if batch:
+            ids.extend(location.id for location in batch)
+            blocks.append(encode_texts([build_location_text(location) for location in batch]))
+
+        if not blocks:
+            return 0
+
+        with self.flush_lock:
+            self.snapshot = EmbeddingSnapshot(np.vstack(blocks).astype(np.float32), np.asarray(ids, dtype=np.int64))
+            with self.lock:
+                self.dirty_ids.clear()
+                self.deleted_ids.clear()
+            self.build_ann_index(save=False)
+            self.save()
+
+        print(f"Location embedding matrix built: {len(ids)} rows ({time.time() - start_time:.2f} seconds)")
+        return len(ids)
+
+    def build_ann_index(self, save=True):
+        """
+        Train the approximate nearest-neighbour index over the current matrix.
+        Small catalogues skip training because exact search is already fast.
+        A new index is trained and then published with the rows it was trained on,
+        so searches keep using the previous one (or exact search) meanwhile.
+
+        Parameters:
+            save: Persist the trained index to disk
+
+        Returns:
+            bool: True if an index was built
+        """
+        with self.flush_lock:
+            snapshot = self.snapshot
+            if snapshot is None:
+                return False
+            if len(snapshot.ids) < self.ann_min_rows:
+                if snapshot.ann_index is not None:
+                    self.snapshot = EmbeddingSnapshot(snapshot.matrix, snapshot.ids, id_to_row=snapshot.id_to_row)
+                return False
+
+            ann_index = create_ann_index(settings.NLP_ANN_BACKEND, settings.NLP_ANN_PROBE)
+            ann_index.build(snapshot.matrix, snapshot.ids)
+            self.snapshot = EmbeddingSnapshot(snapshot.matrix, snapshot.ids, ann_index, snapshot.id_to_row)
+            self.ann_trained_rows = len(snapshot.ids)
+            self.ann_rows_added = 0
+            if save:
+                ann_index.save(self.directory)
+        return True
+
+    def needs_ann_training(self):
+        """
+        Check whether the nearest-neighbour index should be (re)trained: the matrix
+        reached NLP_ANN_MIN_ROWS without an index, or grew by NLP_ANN_RETRAIN_GROWTH
+        since the last training.
+
+        Returns:
+            bool: True if build_ann_index should run
+        """
+        if not self.is_loaded() or len(self) < self.ann_min_rows:
+            return False
+        if not self.ann_ready:
+            return True
+        return self.ann_rows_added >= self.ann_retrain_growth * max(self.ann_trained_rows, 1)
+
+    def encode(self, locations, encode_texts):
+        """
+        Encode locations without touching the matrix.
+
+        Parameters:
+            locations: Iterable of Location objects
+            encode_texts: Callable that turns a list of texts into a normalized (n, dim) array
+
+        Returns:
+            tuple: (list of Location ids, (n, dim) float32 array of their vectors)
+        """
+        locations = list(locations)
+        if not locations:
+            return [], None
+        vectors = encode_texts([build_location_text(location) for location in locations]).astype(np.float32)
+        return [location.id for location in locations], vectors
+
+    def apply_changes(self, updated_ids=(), vectors=None, removed_ids=()):
+        """
+        Publish a new snapshot with rows replaced, appended and removed.
+        The matrix is copied once however many rows change, and the nearest-neighbour
+        index is copied and updated once.
+
+        Parameters:
+            updated_ids: Location ids whose rows are replaced or appended
+            vectors: (len(updated_ids), dim) vectors aligned with updated_ids
+            removed_ids: Location ids whose rows are dropped
+        """
+        with self.flush_lock:
+            snapshot = self.snapshot
+            if snapshot is None:
+                if vectors is None or not len(updated_ids):
+                    return
+                snapshot = EmbeddingSnapshot(np.empty((0, vectors.shape[1]), dtype=np.float32), np.empty(0, dtype=np.int64))
+
+            removed_ids = [location_id for location_id in removed_ids if location_id in snapshot.id_to_row]
+            keep = None
+            kept_ids = snapshot.ids
+            if removed_ids:
+                keep = np.ones(len(snapshot.ids), dtype=bool)
+                keep[[snapshot.id_to_row[location_id] for location_id in removed_ids]] = False
+                kept_ids = snapshot.ids[keep]
+            id_to_row = snapshot.id_to_row if keep is None else {int(location_id): row for row, location_id in enumerate(kept_ids)}
+
+            updated_rows = []
+            new_ids = []
+            for location_id in updated_ids:
+                row = id_to_row.get(location_id)
+                if row is None:
+                    row = len(kept_ids) + len(new_ids)
+                    new_ids.append(location_id)
+                updated_rows.append(row)
+            if not updated_rows and not removed_ids:
+                return
+
+            # Single copy into a new array: the published matrix is read by searches (and may be memory-mapped)
+            dim = snapshot.matrix.shape[1] if vectors is None else vectors.shape[1]
+            matrix = np.empty((len(kept_ids) + len(new_ids), dim), dtype=np.float32)
+            matrix[:len(kept_ids)] = snapshot.matrix if keep is None else snapshot.matrix[keep]
+            ids = kept_ids
+            if new_ids:
+                ids = np.concatenate([kept_ids, np.asarray(new_ids, dtype=np.int64)])
+                id_to_row = None
+                self.ann_rows_added += len(new_ids)
+            if updated_rows:
+                matrix[updated_rows] = vectors
+
+            ann_index = None
+            if snapshot.ann_index is not None:
+                ann_index = snapshot.ann_index.copy()
+                ann_index.update(matrix, ids, changed_rows=updated_rows, kept_rows=keep, removed_ids=removed_ids)
+            self.snapshot = EmbeddingSnapshot(matrix, ids, ann_index, id_to_row)
+
+    def upsert(self, locations, encode_texts):
+        """
+        Re-encode the given locations and replace or append their rows.
+
+        Parameters:
+            locations: List of Location objects
+            encode_texts: Callable that turns a list of texts into a normalized (n, dim) array
+        """
+        updated_ids, vectors = self.encode(locations, encode_texts)
+        if updated_ids:
+            self.apply_changes(updated_ids, vectors)
+
+    def remove(self, location_ids):
+        """
+        Remove rows for deleted locations.
+
+        Parameters:
+            location_ids: Iterable of Location ids
+        """
+        self.apply_changes(removed_ids=location_ids)
+
+    def mark_dirty(self, location_ids):
+        """
+        Record locations whose embeddings need to be recomputed.
+
+        Parameters:
+            location_ids: Iterable of changed Location ids
+        """
+        with self.lock:
+            self.dirty_ids.update(location_ids)
+            self.deleted_ids.difference_update(location_ids)
+
+    def mark_deleted(self, location_ids):
+        """
+        Record locations whose rows should be dropped.
+
+        Parameters:
+            location_ids: Iterable of deleted Location ids
+        """
+        with self.lock:
+            self.deleted_ids.update(location_ids)
+            self.dirty_ids.difference_update(location_ids)
+
+    def flush(self, encode_texts):
+        """
+        Apply pending changes: re-encode dirty locations, drop deleted ones, retrain the
+        nearest-neighbour index if the matrix outgrew it, and persist.
+
+        Parameters:
+            encode_texts: Callable that turns a list of texts into a normalized (n, dim) array
+
+        Returns:
+            int: Number of rows updated or removed
+        """
+        from .models import Location
+
+        with self.flush_lock:
+            with self.lock:
+                dirty_ids = set(self.dirty_ids)
+                deleted_ids = set(self.deleted_ids)
+            if not dirty_ids and not deleted_ids and not self.needs_ann_training():
+                return 0
+
+            self.reload_if_changed()
+
+            # Encode in chunks to keep the loaded Location objects bounded for large imports,
+            # then apply every change with one copy of the matrix
+            updated_ids = []
+            blocks = []
+            dirty_list = sorted(dirty_ids)
+            for i in range(0, len(dirty_list), 1000):
+                chunk_ids, vectors = self.encode(Location.objects.filter(id__in=dirty_list[i:i + 1000]), encode_texts)
+                if chunk_ids:
+                    updated_ids.extend(chunk_ids)
+                    blocks.append(vectors)
+            self.apply_changes(updated_ids, np.vstack(blocks) if blocks else None, deleted_ids)
+
+            with self.lock:
+                self.dirty_ids.difference_update(dirty_ids)
+                self.deleted_ids.difference_update(deleted_ids)
+            if self.needs_ann_training():
+                self.build_ann_index(save=False)
+            self.save()
+
+        print(f"Location embedding matrix refreshed: {len(dirty_ids)} updated, {len(deleted_ids)} removed")
+        return len(dirty_ids) + len(deleted_ids)
+
+    def check_consistency(self):
+        """
+        Catch locations added or deleted without signals (e.g. bulk operations)
+        by comparing the matrix with the Location table.
+        """
+        from .models import Location
+
+        self.consistency_checked_at = time.time()
+        if Location.objects.count() != len(self):
+            known_ids = set(self.id_to_row)
+            current_ids = set(Location.objects.values_list('id', flat=True))
+            self.mark_dirty(current_ids - known_ids)
+            self.mark_deleted(known_ids - current_ids)
+
+    def background_flush(self, encode_texts):
+        """
+        Apply pending changes in a background thread (see schedule_flush).
+        """
+        from django.db import connection
+
+        try:
+            self.flush(encode_texts)
+        except Exception as e:
+            print(f"Error refreshing location embedding matrix: {str(e)}")
+        finally:
+            connection.close()
+
+    def schedule_flush(self, encode_texts):
+        """
+        Apply pending changes in a background thread, unless one is already running.
+        Searches keep using the current matrix meanwhile.
+
+        Parameters:
+            encode_texts: Callable that turns a list of texts into a normalized (n, dim) array
+        """
+        with self.lock:
+            if self.flush_thread is not None and self.flush_thread.is_alive():
+                return
+            self.flush_thread = threading.Thread(target=self.background_flush, args=(encode_texts,), name='embedding-flush', daemon=True)
+            self.flush_thread.start()
+
+    def ensure_ready(self, encode_texts):
+        """
+        Make sure the precomputed matrix is loaded (called on every semantic search).
+        Never encodes locations in the calling thread: without precomputed files
+        the search uses lexical ranking, and pending changes are applied in the
+        background.
+
+        Parameters:
+            encode_texts: Callable that turns a list of texts into a normalized (n, dim) array
+
+        Returns:
+            bool: True if the matrix can be used for searching
+        """
+        if not NUMPY_AVAILABLE:
+            return False
+
+        if not self.is_loaded():
+            if not self.load():
+                if not self.missing_reported:
+                    print("No precomputed location embeddings found (run build_location_embeddings), using lexical ranking")
+                    self.missing_reported = True
+                return False
+        else:
+            self.reload_if_changed()
+
+        if time.time() - self.consistency_checked_at >= self.consistency_check_interval:
+            self.check_consistency()
+
+        if self.dirty_ids or self.deleted_ids or self.needs_ann_training():
+            self.schedule_flush(encode_texts)
+        return len(self) > 0
+
+    def sync(self, encode_texts):
+        """
+        Load the matrix and apply every pending change in the calling thread (offline jobs).
+
+        Parameters:
+            encode_texts: Callable that turns a list of texts into a normalized (n, dim) array
+
+        Returns:
+            bool: True if a matrix is available
+        """
+        if not NUMPY_AVAILABLE or (not self.is_loaded() and not self.load()):
+            return False
+        self.check_consistency()
+        self.flush(encode_texts)
+        return len(self) > 0
+
+    def search(self, query_vector, top_k, allowed_ids=None, exact=False, probe=None):
+        """
+        Find the rows most similar to a normalized query vector.
+        Uses the approximate index for large catalogues and exact search otherwise.
+
+        Parameters:
+            query_vector: Normalized query embedding
+            top_k: Number of results to return
+            allowed_ids: Optional set of Location ids to restrict the search to
+            exact: Force exact (brute-force) search
+            probe: Recall/latency knob for the approximate index (IVF nprobe or HNSW ef)
+
+        Returns:
+            List of tuples: [(location_id, cosine_similarity), ...] sorted by similarity
+        """
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+
+        # Published snapshots are never modified, so no lock is needed
+        snapshot = self.snapshot
+        if snapshot is None:
+            return []
+        matrix, ids = snapshot.matrix, snapshot.ids
+
+        allowed_mask = None
+        if allowed_ids is not None:
+            allowed_mask = np.isin(ids, np.fromiter(allowed_ids, dtype=np.int64, count=len(allowed_ids)))
+
+        if snapshot.ann_index is not None and not exact and len(ids) >= self.ann_min_rows:
+            try:
+                return snapshot.ann_index.search(matrix, ids, query_vector, top_k, allowed_mask, probe)
+            except Exception as e:
+                print(f"Error during approximate search, falling back to exact search: {str(e)}")
+
+        return exact_index.search(matrix, ids, query_vector, top_k, allowed_mask)
+
+    def score_ids(self, query_vector, location_ids):
+        """
+        Compute cosine similarity between a query vector and specific locations.
+
+        Parameters:
+            query_vector: Normalized query embedding
+            location_ids: Iterable of Location ids
+
+        Returns:
+            dict: {location_id: cosine_similarity} for ids present in the matrix
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return {}
+        matrix, id_to_row = snapshot.matrix, snapshot.id_to_row
+
+        pairs = [(location_id, id_to_row[location_id]) for location_id in location_ids if location_id in id_to_row]
+        if not pairs:
+            return {}
+
+        rows = np.fromiter((row for _, row in pairs), dtype=np.int64, count=len(pairs))
+        scores = matrix[rows] @ np.asarray(query_vector, dtype=np.float32)
+        return {location_id: float(score) for (location_id, _), score in zip(pairs, scores)}
+
+
+# Exact search is always available as the fallback
+exact_index = ExactIndex()
+
+# Shared embedding matrix instance
+location_embeddings = LocationEmbeddingMatrix()
@@ -0,0 +1,192 @@
+"""
+Streaming import of TripAdvisor location exports (CSV) into the Location table.
+
+Files are read in chunks with pandas, normalized column-wise and upserted
+with bulk_create(update_conflicts=True), one transaction per chunk. Each
+row carries a content hash (Location.compute_content_hash), so rows whose
+content did not change since the last import are not written at all and
+the import reports exactly which ids were created or updated.
+
+The import_locations management command drives this module; insert.py is
+kept as a thin wrapper around the command.
+"""
+import time
+
+import pandas as pd
+from django.db import transaction
+
+from .models import Location
+
+# CSV column -> Location field
+FIELD_COLUMNS = {
+    'name': 'name',
+    'description': 'description',
+    'category': 'category',
+    'address': 'address',
+    'addressObj/city': 'city',
+    'addressObj/state': 'state',
+    'addressObj/country': 'country',
+    'addressObj/postalcode': 'postal_code',
+    'addressObj/street1': 'street1',
+    'addressObj/street2': 'street2',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'localAddress': 'local_address',
+    'localName': 'local_name',
+    'locationString': 'location_string',
+    'image': 'image',
+    'website': 'website',
+    'email': 'email',
+    'type': 'type',
+}
+NUMERIC_COLUMNS = ['latitude', 'longitude']
+
+# Fields overwritten when a location already exists (likes_count is kept)
+UPDATE_FIELDS = list(FIELD_COLUMNS.values()) + ['subcategories', 'subtypes', 'content_hash', 'primary_subcategory']
+
+
+def list_column(df, prefix):
+    """
+    Collect the non-empty values of the prefix/0, prefix/1, ... columns of each row into a list.
+
+    Parameters:
+        df: DataFrame chunk
+        prefix: Column prefix, e.g. 'subcategories/'
+
+    Returns:
+        Series: One list per row (empty if the row has no values)
+    """
+    columns = [col for col in df.columns if col.startswith(prefix)]
+    if not columns:
+        return pd.Series([[] for _ in range(len(df))], index=df.index, dtype=object)
+
+    values = df[columns].stack()
+    values = values[values.notna() & (values != '')]
+    lists = values.groupby(level=0, sort=False).agg(list).reindex(df.index)
+    return lists.apply(lambda value: value if isinstance(value, list) else [])
+
+
+def normalize_chunk(df):
+    """
+    Turn a chunk of CSV rows into Location field values, including content_hash and primary_subcategory.
+    Rows without an id or name are dropped; duplicate ids keep the last row.
+
+    Parameters:
+        df: DataFrame chunk read with all columns as strings
+
+    Returns:
+        tuple: (list of field dictionaries, number of skipped rows)
+    """
+    ids = pd.to_numeric(df['id'], errors='coerce') if 'id' in df.columns else pd.Series(index=df.index, dtype=float)
+    valid = ids.notna()
+    if 'name' in df.columns:
+        valid &= df['name'].notna() & (df['name'] != '')
+    else:
+        valid &= False
+    skipped = int((~valid).sum())
+
+    df = df[valid]
+    records = pd.DataFrame({'id': ids[valid].astype('int64')}, index=df.index)
+    for column, field in FIELD_COLUMNS.items():
+        if column not in df.columns:
+            records[field] = None
+        elif column in NUMERIC_COLUMNS:
+            records[field] = pd.to_numeric(df[column], errors='coerce')
+        else:
+            records[field] = df[column]
+    records['subcategories'] = list_column(df, 'subcategories/')
+    records['subtypes'] = list_column(df, 'subtype/')
+
+    duplicates = records.duplicated('id', keep='last')
+    skipped += int(duplicates.sum())
+    records = records[~duplicates]
+
+    # Missing values become None (NULL)
+    records = records.astype(object).where(records.notna(), None)
+    rows = records.to_dict('records')
+    for row in rows:
+        row['content_hash'] = Location.compute_content_hash(row)
+        row['primary_subcategory'] = Location.first_subcategory(row['subcategories'])
+    return rows, skipped
+
+
+def read_chunks(path, chunk_size=1000):
+    """
+    Stream normalized rows from a CSV export.
+
+    Parameters:
+        path: CSV file path
+        chunk_size: Number of CSV rows per chunk
+
+    Yields:
+        tuple: (list of field dictionaries, number of skipped rows)
+    """
+    # Read text as strings so values such as postal codes are not turned into floats
+    reader = pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False, na_values=[''], encoding='utf-8-sig')
+    for df in reader:
+        yield normalize_chunk(df)
+
+
+def upsert_locations(rows, dry_run=False):
+    """
+    Insert new locations and update changed ones in one transaction.
+    Rows whose content hash matches the stored one are not written.
+
+    Parameters:
+        rows: List of field dictionaries (including 'id' and 'content_hash')
+        dry_run: Only classify the rows, without writing
+
+    Returns:
+        tuple: (created ids, updated ids, number of unchanged rows)
+    """
+    if not rows:
+        return [], [], 0
+
+    stored_hashes = dict(Location.objects.filter(id__in=[row['id'] for row in rows]).values_list('id', 'content_hash'))
+    created_ids, updated_ids, changed_rows = [], [], []
+    for row in rows:
+        if row['id'] not in stored_hashes:
+            created_ids.append(row['id'])
+        elif stored_hashes[row['id']] != row['content_hash']:
+            updated_ids.append(row['id'])
+        else:
+            continue
+        changed_rows.append(row)
+
+    if changed_rows and not dry_run:
+        with transaction.atomic():
+            Location.objects.bulk_create(
+                [Location(**row) for row in changed_rows],
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=UPDATE_FIELDS,
+            )
+    return created_ids, updated_ids, len(rows) - len(changed_rows)
+
+
+def import_file(path, chunk_size=1000, dry_run=False):
+    """
+    Import one CSV export.
+    Has no state outside the database, so it can run in a worker process.
+
+    Parameters:
+        path: CSV file path
+        chunk_size: Number of rows per chunk and transaction
+        dry_run: Parse and count without writing
+
+    Returns:
+        dict: Import statistics and the ids of created and updated locations
+    """
+    start_time = time.time()
+    stats = {'path': path, 'rows': 0, 'unchanged': 0, 'skipped': 0, 'created_ids': [], 'updated_ids': []}
+
+    for rows, skipped in read_chunks(path, chunk_size):
+        created_ids, updated_ids, unchanged = upsert_locations(rows, dry_run=dry_run)
+        stats['rows'] += len(rows)
+        stats['unchanged'] += unchanged
+        stats['skipped'] += skipped
+        stats['created_ids'].extend(created_ids)
+        stats['updated_ids'].extend(updated_ids)
+
+    stats['seconds'] = time.time() - start_time
+    return stats
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from destinations.item_neighbors import refresh_neighbors, NUMPY_AVAILABLE
+
+class Command(BaseCommand):
+    help = 'Build or refresh the item-to-item similarity graph (most similar locations of every location).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every list (after changing the neighbour count, weights or embedding model)')
+        parser.add_argument('--k', type=int, default=None, help='Neighbours kept per location (default: ITEM_NEIGHBORS_K)')
+        parser.add_argument('--block-size', type=int, default=None, help='Locations scored per block (default: ITEM_NEIGHBORS_BLOCK_SIZE)')
+
+    def handle(self, *args, **options):
+        if not NUMPY_AVAILABLE:
+            raise CommandError('NumPy is required to compute the similarity graph.')
+
+        stats = refresh_neighbors(full=options['full'], k=options['k'], block_size=options['block_size'], log=self.stdout.write)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Item neighbours up to date for {stats['locations']} locations: {stats['changed']} changed, {stats['deleted']} deleted, "
+            f"{stats['recomputed']} lists recomputed, {stats['merged']} merged in {stats['seconds']:.2f} seconds."
+        ))
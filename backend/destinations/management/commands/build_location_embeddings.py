@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from destinations.models import Location
+from destinations.location_embeddings import location_embeddings
+from destinations.nlp_utils import nlp_processor, NLP_ADVANCED
+
+class Command(BaseCommand):
+    help = 'Build the precomputed embedding matrix and nearest-neighbour index used by semantic destination search.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=256, help='Number of locations encoded per batch')
+        parser.add_argument('--ann-only', action='store_true', help='Only retrain the nearest-neighbour index over the existing matrix')
+
+    def handle(self, *args, **options):
+        if options['ann_only']:
+            if not location_embeddings.load():
+                self.stdout.write(self.style.ERROR('No location embedding matrix found. Run without --ann-only first.'))
+                return
+            if location_embeddings.build_ann_index():
+                self.stdout.write(self.style.SUCCESS(f"{location_embeddings.ann_index.name} index rebuilt for {len(location_embeddings)} locations."))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"Only {len(location_embeddings)} locations (minimum {location_embeddings.ann_min_rows}), exact search will be used."
+                ))
+            return
+
+        if not NLP_ADVANCED:
+            self.stdout.write(self.style.ERROR('Advanced NLP libraries are not installed. Cannot build embeddings.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Starting to build location embeddings...'))
+
+        locations = Location.objects.all().order_by('id').iterator(chunk_size=2000)
+        rows = location_embeddings.build(locations, nlp_processor.encode_texts, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Total {rows} location embeddings have been written to {location_embeddings.directory} "
+            f"(nearest-neighbour index: {location_embeddings.ann_index.name if location_embeddings.ann_ready else 'exact search'})."
+        ))
@@ -0,0 +1,111 @@
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from destinations.location_import import import_file
+from destinations.catalogue import apply_change_set, refresh_indexes
+
+
+def init_worker():
+    """
+    Prepare a worker process (Django must be set up to use the ORM).
+    """
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Import or update locations from TripAdvisor CSV exports (files or directories of .csv files).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=[os.path.join(settings.BASE_DIR, 'ds')], help='CSV files or directories (default: ds/)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of rows read and written per transaction')
+        parser.add_argument('--workers', type=int, default=1, help='Number of files processed in parallel')
+        parser.add_argument('--dry-run', action='store_true', help='Parse and count rows without writing to the database')
+        parser.add_argument('--change-set', help='Write the ids of created and updated locations to this JSON file')
+
+    def handle(self, *args, **options):
+        files = []
+        for path in options['paths']:
+            if os.path.isdir(path):
+                files.extend(sorted(glob.glob(os.path.join(path, '*.csv'))))
+            elif os.path.exists(path):
+                files.append(path)
+            else:
+                raise CommandError(f"File not found: {path}")
+        if not files:
+            raise CommandError('No CSV files to import.')
+
+        chunk_size = max(1, options['chunk_size'])
+        workers = max(1, min(options['workers'], len(files)))
+        dry_run = options['dry_run']
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Checking' if dry_run else 'Importing'} {len(files)} files ({workers} workers, chunks of {chunk_size})..."
+        ))
+
+        start_time = time.time()
+        totals = {'rows': 0, 'unchanged': 0, 'skipped': 0}
+        created_ids, updated_ids = set(), set()
+
+        if workers == 1:
+            results = (import_file(path, chunk_size, dry_run) for path in files)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+            futures = [pool.submit(import_file, path, chunk_size, dry_run) for path in files]
+            results = (future.result() for future in as_completed(futures))
+
+        try:
+            for stats in results:
+                for key in totals:
+                    totals[key] += stats[key]
+                created_ids.update(stats['created_ids'])
+                updated_ids.update(stats['updated_ids'])
+                self.stdout.write(
+                    f"{os.path.basename(stats['path'])}: {stats['rows']} rows ({len(stats['created_ids'])} new, {len(stats['updated_ids'])} updated, "
+                    f"{stats['unchanged']} unchanged, {stats['skipped']} skipped) in {stats['seconds']:.2f} seconds "
+                    f"({stats['rows'] / max(stats['seconds'], 1e-9):.1f} rows/sec)"
+                )
+        finally:
+            if workers > 1:
+                pool.shutdown()
+
+        # A location present in several files counts as created if any file created it
+        updated_ids -= created_ids
+
+        elapsed = time.time() - start_time
+        summary = (
+            f"{totals['rows']} rows ({len(created_ids)} new, {len(updated_ids)} updated, {totals['unchanged']} unchanged, "
+            f"{totals['skipped']} skipped) in {elapsed:.2f} seconds ({totals['rows'] / max(elapsed, 1e-9):.1f} rows/sec)"
+        )
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"Dry run: {summary}. Nothing was written."))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary}."))
+
+        change_set = {
+            'created': sorted(created_ids),
+            'updated': sorted(updated_ids),
+            'deleted': [],
+            'files': files,
+            'finished_at': time.time(),
+        }
+        if options['change_set']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['change_set'])), exist_ok=True)
+            with open(options['change_set'], 'w') as f:
+                json.dump(change_set, f)
+            self.stdout.write(f"Change set written to {options['change_set']}")
+
+        if not created_ids and not updated_ids:
+            self.stdout.write(self.style.SUCCESS('No locations changed; search indexes and caches are still valid.'))
+            return
+
+        # bulk_create does not send model signals, so notify the search indexes explicitly
+        apply_change_set(change_set)
+        refresh_indexes()
+        self.stdout.write(self.style.SUCCESS('Search indexes refreshed.'))
@@ -0,0 +1,85 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from destinations.models import Like, Review, UserFeatureProfile
+from destinations.recommendation_store import precompute_for_users, store_entries
+from destinations.user_features import build_profile, refresh_stale_profile
+
+
+def init_worker():
+    """
+    Prepare a worker process (Django must be set up to use the ORM).
+    """
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Precompute the recommendation lists of active users, served by the recommendation endpoint until their activity changes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=getattr(settings, 'RECOMMENDATION_PRECOMPUTE_SIZE', 30), help='Candidates computed per recommendation list')
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (1 = compute in this process)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Number of users per worker task')
+        parser.add_argument('--active-days', type=int, default=30, help='Users who logged in, liked or reviewed within this many days')
+        parser.add_argument('--all-users', action='store_true', help='Precompute for every user')
+        parser.add_argument('--user', type=int, action='append', help='Only precompute for this user id (can be repeated)')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['user']:
+            user_ids = set(User.objects.filter(id__in=options['user']).values_list('id', flat=True))
+        elif options['all_users']:
+            user_ids = set(User.objects.values_list('id', flat=True))
+        else:
+            since = timezone.now() - timedelta(days=options['active_days'])
+            user_ids = set(User.objects.filter(last_login__gte=since).values_list('id', flat=True))
+            user_ids |= set(Like.objects.filter(created_at__gte=since).values_list('user_id', flat=True))
+            user_ids |= set(Review.objects.filter(updated_at__gte=since).values_list('user_id', flat=True))
+
+        user_ids = sorted(user_ids)
+        size = max(1, options['size'])
+        batch_size = max(1, options['batch_size'])
+        workers = max(1, min(options['workers'], (len(user_ids) + batch_size - 1) // batch_size or 1))
+        batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Precomputing {size} recommendations per list for {len(user_ids)} users ({workers} workers)..."
+        ))
+
+        start_time = time.time()
+
+        # Workers only read; profiles missing so far are built here first and stale ones rebuilt
+        missing = set(user_ids) - set(UserFeatureProfile.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        for user_id in sorted(missing):
+            build_profile(user_id)
+        for profile in UserFeatureProfile.objects.filter(user_id__in=user_ids, stale=True):
+            refresh_stale_profile(profile)
+
+        processed = 0
+        if workers == 1:
+            results = (precompute_for_users(batch, size) for batch in batches)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+            futures = [pool.submit(precompute_for_users, batch, size) for batch in batches]
+            results = (future.result() for future in as_completed(futures))
+
+        try:
+            for entries in results:
+                # SQLite allows one writer, so results are written by this process only
+                store_entries(entries)
+                processed += len(entries)
+                self.stdout.write(f"{processed}/{len(user_ids)} users done")
+        finally:
+            if workers > 1:
+                pool.shutdown()
+
+        elapsed = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f"Precomputed recommendations for {processed} users in {elapsed:.2f} seconds ({processed / max(elapsed, 1e-9):.1f} users/sec)."
+        ))
@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from destinations.models import Review
+from destinations.review_analysis import analyze_pending_reviews
+
+class Command(BaseCommand):
+    help = 'Analyze reviews waiting for sentiment and keyword analysis.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Number of reviews analyzed together (default: NLP_REVIEW_BATCH_SIZE)')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of reviews to process')
+
+    def handle(self, *args, **options):
+        pending = Review.objects.filter(analysis_status='pending').count()
+        self.stdout.write(self.style.SUCCESS(f'{pending} reviews pending analysis.'))
+        if not pending:
+            return
+
+        start_time = time.time()
+        processed = analyze_pending_reviews(batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"Total {processed} reviews analyzed ({time.time() - start_time:.2f} seconds)."))
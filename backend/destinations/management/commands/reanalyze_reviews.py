@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from destinations.models import Review
+from destinations.review_analysis import analyze_review_rows, STATUS_DONE
+from destinations.user_features import rebuild_profiles
+
+
+def init_worker():
+    """
+    Prepare a worker process (Django must be set up to import the NLP modules).
+    """
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Re-run sentiment and keyword analysis for existing reviews (e.g. after changing the model or extraction rules).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=64, help='Number of reviews analyzed together')
+        parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help='Number of worker processes (1 = analyze in this process)')
+        parser.add_argument('--spacy-processes', type=int, default=None, help='spaCy processes for meaning-unit extraction when --workers is 1 (default: NLP_SPACY_N_PROCESS)')
+        parser.add_argument('--start-id', type=int, default=0, help='Only process reviews with an id greater than this')
+        parser.add_argument('--resume', action='store_true', help='Continue after the last checkpointed review id')
+        parser.add_argument('--checkpoint', default=os.path.join(settings.NLP_MODELS_DIR, 'reanalyze_reviews.checkpoint.json'), help='Checkpoint file path')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        workers = max(1, options['workers'])
+        checkpoint_path = options['checkpoint']
+
+        start_id = options['start_id']
+        if options['resume'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                start_id = max(start_id, json.load(f).get('last_id', 0))
+            self.stdout.write(f"Resuming after review id {start_id}")
+
+        queryset = Review.objects.filter(id__gt=start_id).order_by('id')
+        total = queryset.count()
+        self.stdout.write(self.style.SUCCESS(f'Re-analyzing {total} reviews ({workers} workers, batches of {batch_size})...'))
+        if not total:
+            return
+
+        rows = queryset.values_list('id', 'content').iterator(chunk_size=batch_size * workers)
+
+        self.start_time = time.time()
+        self.processed = 0
+        self.total = total
+        self.checkpoint_path = checkpoint_path
+
+        if workers == 1:
+            for batch in self.batches(rows, batch_size):
+                self.write_results(analyze_review_rows(batch, n_process=options['spacy_processes']))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                # Results are written in submission order so the checkpoint only moves past finished batches
+                pending = deque()
+                for batch in self.batches(rows, batch_size):
+                    # Pool workers cannot start spaCy processes of their own
+                    pending.append(pool.submit(analyze_review_rows, batch, 1))
+                    if len(pending) >= workers * 2:
+                        self.write_results(pending.popleft().result())
+                while pending:
+                    self.write_results(pending.popleft().result())
+
+        elapsed = time.time() - self.start_time
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Total {self.processed} reviews re-analyzed in {elapsed:.2f} seconds ({self.processed / max(elapsed, 1e-9):.1f} reviews/sec)."
+        ))
+
+    @staticmethod
+    def batches(rows, batch_size):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def write_results(self, results):
+        """
+        Write analysis results in bulk and advance the checkpoint.
+        """
+        reviews = [
+            Review(id=review_id, sentiment=sentiment, sentiment_score=sentiment_score, keywords=keywords, analysis_status=STATUS_DONE)
+            for review_id, sentiment, sentiment_score, keywords in results
+        ]
+        Review.objects.bulk_update(reviews, ['sentiment', 'sentiment_score', 'keywords', 'analysis_status'])
+        # bulk_update sends no signals, so recount the keyword features of the authors
+        rebuild_profiles(Review.objects.filter(id__in=[review.id for review in reviews]).values_list('user_id', flat=True))
+
+        self.processed += len(reviews)
+        last_id = max(review.id for review in reviews)
+        os.makedirs(os.path.dirname(self.checkpoint_path) or '.', exist_ok=True)
+        with open(self.checkpoint_path, 'w') as f:
+            json.dump({'last_id': last_id, 'processed': self.processed}, f)
+
+        elapsed = time.time() - self.start_time
+        self.stdout.write(
+            f"{self.processed}/{self.total} reviews re-analyzed (last id {last_id}, {self.processed / max(elapsed, 1e-9):.1f} reviews/sec)"
+        )
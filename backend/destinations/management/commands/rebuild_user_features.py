@@ -0,0 +1,41 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from destinations.models import Like, Review, UserFeatureProfile
+from destinations.user_features import build_profile, refresh_stale_profile
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user recommendation feature profiles from likes and reviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all-users', action='store_true', help='Build profiles for every user with likes or reviews, not only existing profiles')
+        parser.add_argument('--user', type=int, action='append', help='Only rebuild the profile of this user id (can be repeated)')
+        parser.add_argument('--stale', action='store_true', help='Only rebuild profiles flagged as stale after location edits')
+
+    def handle(self, *args, **options):
+        if options['stale']:
+            start_time = time.time()
+            profiles = list(UserFeatureProfile.objects.filter(stale=True))
+            for profile in profiles:
+                refresh_stale_profile(profile)
+            self.stdout.write(self.style.SUCCESS(
+                f"Refreshed {len(profiles)} stale user feature profiles in {time.time() - start_time:.2f} seconds."
+            ))
+            return
+
+        if options['user']:
+            user_ids = set(get_user_model().objects.filter(id__in=options['user']).values_list('id', flat=True))
+        elif options['all_users']:
+            user_ids = set(Like.objects.values_list('user_id', flat=True)) | set(Review.objects.values_list('user_id', flat=True))
+            user_ids |= set(UserFeatureProfile.objects.values_list('user_id', flat=True))
+        else:
+            user_ids = set(UserFeatureProfile.objects.values_list('user_id', flat=True))
+
+        start_time = time.time()
+        for user_id in sorted(user_ids):
+            build_profile(user_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(user_ids)} user feature profiles in {time.time() - start_time:.2f} seconds."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from destinations.warmup import warm_up
+
+class Command(BaseCommand):
+    help = 'Load NLP models, prepare search indexes and pre-compute results of popular search queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=None, help='Number of popular historical queries to pre-compute (default: NLP_WARMUP_TOP_QUERIES)')
+        parser.add_argument('--limit', type=int, default=20, help='Result limit used for pre-computed queries')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Starting NLP warm-up...'))
+
+        state = warm_up(top_queries=options['queries'], limit=options['limit'], log=self.stdout.write)
+
+        if state['status'] != 'ready':
+            self.stdout.write(self.style.ERROR(f"Warm-up failed: {state['error']}"))
+            return
+
+        total = sum(state['steps'].values())
+        self.stdout.write(self.style.SUCCESS(f"NLP warm-up complete ({total:.2f} seconds)"))
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0004_alter_review_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255, unique=True)),
+                ('search_count', models.IntegerField(db_index=True, default=0)),
+                ('last_searched_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-search_count'],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0005_searchquery'),
+    ]
+
+    operations = [
+        # Existing reviews were analyzed when they were saved
+        migrations.AddField(
+            model_name='review',
+            name='analysis_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='done', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='analysis_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10),
+        ),
+    ]
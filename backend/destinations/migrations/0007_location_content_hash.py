@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+from django.db import migrations, models
+
+# Location.CONTENT_FIELDS at the time of this migration
+CONTENT_FIELDS = [
+    'name', 'description', 'category', 'subcategories', 'subtypes', 'type',
+    'address', 'city', 'state', 'country', 'postal_code', 'street1', 'street2',
+    'latitude', 'longitude', 'local_address', 'local_name', 'location_string',
+    'image', 'website', 'email',
+]
+
+
+def fill_content_hash(apps, schema_editor):
+    """
+    Hash existing locations so the next import can skip unchanged rows.
+    """
+    Location = apps.get_model('destinations', 'Location')
+    batch = []
+    for values in Location.objects.values('id', *CONTENT_FIELDS).iterator(chunk_size=2000):
+        content = json.dumps([values[field] for field in CONTENT_FIELDS], ensure_ascii=False, separators=(',', ':'))
+        batch.append(Location(id=values['id'], content_hash=hashlib.sha1(content.encode('utf-8')).hexdigest()))
+        if len(batch) >= 2000:
+            Location.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    if batch:
+        Location.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0006_review_analysis_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
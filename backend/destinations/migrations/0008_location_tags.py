@@ -0,0 +1,64 @@
+# Generated by Django 5.1.15 on 2026-10-17 05:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_tags(apps, schema_editor):
+    """
+    Fill primary_subcategory and the LocationTag rows for existing locations.
+    """
+    Location = apps.get_model('destinations', 'Location')
+    LocationTag = apps.get_model('destinations', 'LocationTag')
+
+    locations, tags = [], []
+    for location_id, subcategories, subtypes in Location.objects.values_list('id', 'subcategories', 'subtypes').iterator(chunk_size=2000):
+        primary = None
+        if isinstance(subcategories, list) and subcategories and isinstance(subcategories[0], str) and subcategories[0]:
+            primary = subcategories[0][:255]
+        locations.append(Location(id=location_id, primary_subcategory=primary))
+
+        for kind, values in (('subcategory', subcategories), ('subtype', subtypes)):
+            if not isinstance(values, list):
+                continue
+            for position, value in enumerate(values):
+                if isinstance(value, str) and value:
+                    tags.append(LocationTag(location_id=location_id, kind=kind, tag=value[:255], position=position))
+
+        if len(locations) >= 2000:
+            Location.objects.bulk_update(locations, ['primary_subcategory'])
+            LocationTag.objects.bulk_create(tags, batch_size=1000)
+            locations, tags = [], []
+
+    Location.objects.bulk_update(locations, ['primary_subcategory'])
+    LocationTag.objects.bulk_create(tags, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0007_location_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='primary_subcategory',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.CreateModel(
+            name='LocationTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('subcategory', 'Subcategory'), ('subtype', 'Subtype')], max_length=20)),
+                ('tag', models.CharField(max_length=255)),
+                ('position', models.PositiveSmallIntegerField()),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='destinations.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'tag'], name='destinations_tag_kind_tag')],
+                'unique_together': {('location', 'kind', 'position')},
+            },
+        ),
+        migrations.RunPython(fill_tags, migrations.RunPython.noop),
+    ]
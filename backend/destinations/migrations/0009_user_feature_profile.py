@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-17 05:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0008_location_tags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserFeatureProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('likes_count', models.IntegerField(default=0)),
+                ('reviews_count', models.IntegerField(default=0)),
+                ('liked_locations', models.JSONField(default=list)),
+                ('category_counts', models.JSONField(default=dict)),
+                ('subcategory_counts', models.JSONField(default=dict)),
+                ('subtype_counts', models.JSONField(default=dict)),
+                ('country_counts', models.JSONField(default=dict)),
+                ('city_counts', models.JSONField(default=dict)),
+                ('review_country_counts', models.JSONField(default=dict)),
+                ('positive_keyword_counts', models.JSONField(default=dict)),
+                ('negative_keyword_counts', models.JSONField(default=dict)),
+                ('high_rated_locations', models.JSONField(default=dict)),
+                ('low_rated_locations', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feature_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 05:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0009_user_feature_profile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='location',
+            name='country',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+    ]
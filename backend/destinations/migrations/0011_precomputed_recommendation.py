@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-17 05:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0010_location_country_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecomputedRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.IntegerField()),
+                ('lists', models.JSONField(default=dict)),
+                ('tag_groups', models.JSONField(default=dict)),
+                ('activity_weight', models.FloatField(default=0.0)),
+                ('tag_weight', models.FloatField(default=1.0)),
+                ('selected_tags', models.JSONField(blank=True, null=True)),
+                ('profile_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='precomputed_recommendations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
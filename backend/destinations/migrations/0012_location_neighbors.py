@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-17 05:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0011_precomputed_recommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationNeighbors',
+            fields=[
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbor_list', serialize=False, to='destinations.location')),
+                ('content_hash', models.CharField(blank=True, max_length=40, null=True)),
+                ('neighbors', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0012_location_neighbors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userfeatureprofile',
+            name='stale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.1.15 on 2026-10-17 05:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0014_review_analysis_claim'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='LocationTag',
+        ),
+    ]
@@ -1,3 +1,6 @@
+import hashlib
+import json
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
@@ -22,7 +25,7 @@ class Location(models.Model):
     address = models.CharField(max_length=500, blank=True, null=True)  # Full address
     city = models.CharField(max_length=255, blank=True, null=True)  # City name
     state = models.CharField(max_length=255, blank=True, null=True)  # State/province
-    country = models.CharField(max_length=255, blank=True, null=True)  # Country
+    country = models.CharField(max_length=255, blank=True, null=True, db_index=True)  # Country
     postal_code = models.CharField(max_length=20, blank=True, null=True)  # Postal/ZIP code
     street1 = models.CharField(max_length=255, blank=True, null=True)  # Street address line 1
     street2 = models.CharField(max_length=255, blank=True, null=True)  # Street address line 2
@@ -44,9 +47,80 @@ class Location(models.Model):
     # Metrics
     likes_count = models.IntegerField(default=0)  # Counter for likes (updated by Like model)
 
+    # Change detection for catalogue imports
+    content_hash = models.CharField(max_length=40, blank=True, null=True, editable=False)  # Hash of CONTENT_FIELDS
+
+    # Denormalized for indexed tag queries (maintained on save and import)
+    primary_subcategory = models.CharField(max_length=255, blank=True, null=True, db_index=True, editable=False)  # subcategories[0]
+
+    # Fields imported from the TripAdvisor exports (covered by content_hash)
+    CONTENT_FIELDS = [
+        'name', 'description', 'category', 'subcategories', 'subtypes', 'type',
+        'address', 'city', 'state', 'country', 'postal_code', 'street1', 'street2',
+        'latitude', 'longitude', 'local_address', 'local_name', 'location_string',
+        'image', 'website', 'email',
+    ]
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def compute_content_hash(cls, values):
+        """
+        Hash the imported content of a location.
+
+        Parameters:
+            values: Dictionary with a value for each of CONTENT_FIELDS
+
+        Returns:
+            str: SHA-1 hex digest
+        """
+        content = json.dumps([values.get(field) for field in cls.CONTENT_FIELDS], ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def first_subcategory(subcategories):
+        """
+        Get the primary (first) subcategory of a subcategories value.
+
+        Parameters:
+            subcategories: Subcategories JSON value
+
+        Returns:
+            str: First subcategory, or None if there is none
+        """
+        if isinstance(subcategories, list) and subcategories and isinstance(subcategories[0], str) and subcategories[0]:
+            return subcategories[0][:255]
+        return None
+
+    @classmethod
+    def primary_subcategory_tags(cls):
+        """
+        Get the distinct primary subcategories (the tags users can browse by).
+        Served from the primary_subcategory index.
+
+        Returns:
+            list: Sorted tag names
+        """
+        return list(
+            cls.objects.filter(primary_subcategory__isnull=False)
+            .order_by('primary_subcategory')
+            .values_list('primary_subcategory', flat=True)
+            .distinct()
+        )
+
+    def save(self, *args, **kwargs):
+        """
+        Keep content_hash and primary_subcategory in sync with edits made
+        outside the importer (admin, API).
+        """
+        self.content_hash = self.compute_content_hash({field: getattr(self, field) for field in self.CONTENT_FIELDS})
+        self.primary_subcategory = self.first_subcategory(self.subcategories)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.CONTENT_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | {'content_hash', 'primary_subcategory'}
+        super().save(*args, **kwargs)
+
 # Like model
 class Like(models.Model):
     """
@@ -136,6 +210,13 @@ class Review(models.Model):
         (5, '5 - Very Satisfied'),
     )
     
+    ANALYSIS_STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reviews')  # Review author
     location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='reviews')  # Reviewed location
     content = models.TextField()  # Review text content
@@ -147,6 +228,9 @@ class Review(models.Model):
     sentiment = models.CharField(max_length=20, null=True, blank=True)  # Sentiment classification (POSITIVE, NEGATIVE, NEUTRAL)
     sentiment_score = models.FloatField(null=True, blank=True)  # Sentiment confidence score (0-1)
     keywords = models.JSONField(null=True, blank=True)  # Keywords extracted from review content
+    analysis_status = models.CharField(max_length=10, choices=ANALYSIS_STATUS_CHOICES, default='pending', db_index=True)  # Background analysis state
+    analysis_claim = models.CharField(max_length=32, null=True, blank=True, editable=False)  # Batch that claimed the review for analysis
+    analysis_claimed_at = models.DateTimeField(null=True, blank=True, editable=False)  # When the review was claimed
     
     class Meta:
         ordering = ['-created_at']  # Order by most recent first
@@ -156,52 +240,210 @@ class Review(models.Model):
     
     def save(self, *args, **kwargs):
         """
-        Custom save method to perform sentiment analysis on review content.
+        Custom save method to schedule sentiment analysis of review content.
         
-        Automatically analyzes the review text for sentiment and extracts keywords
-        when the review is created or updated.
+        New or edited reviews are saved immediately with a rating-based sentiment
+        and analysis_status 'pending'; the analysis runs in the background after
+        the transaction commits (NLP_REVIEW_ANALYSIS_ASYNC). With asynchronous
+        analysis disabled the review is analyzed before saving.
         
         Parameters:
             *args: Variable length argument list
-            **kwargs: Arbitrary keyword arguments
+            **kwargs: Arbitrary keyword arguments (no_analysis, skip_keywords)
             
         Returns:
             The saved Review instance
         """
+        no_analysis = kwargs.pop('no_analysis', False)
+        skip_keywords = kwargs.pop('skip_keywords', False)
+        
         # Skip analysis if keywords are already provided
         if hasattr(self, '_skip_analysis') and self._skip_analysis:
             return super().save(*args, **kwargs)
+        
+        if not self.content or no_analysis:
+            return super().save(*args, **kwargs)
+        
+        if getattr(settings, 'NLP_REVIEW_ANALYSIS_ASYNC', True):
+            from django.db import transaction
+            from .review_analysis import provisional_sentiment, review_analysis_worker
             
+            # Save now, analyze in the background
+            self.sentiment = provisional_sentiment(self.rating)
+            self.sentiment_score = 0.5
+            if not skip_keywords:
+                self.keywords = {'positive_keywords': [], 'negative_keywords': []}
+            self.analysis_status = 'pending'
+            super().save(*args, **kwargs)
+            transaction.on_commit(review_analysis_worker.notify)
+            return
+        
         # Perform sentiment analysis when saving the review
-        if self.content and not kwargs.get('no_analysis', False):
-            try:
-                from .review_utils import analyze_review
-                analysis_result = analyze_review(self.content)
-                
-                self.sentiment = analysis_result.get('sentiment', 'NEUTRAL')
-                self.sentiment_score = analysis_result.get('sentiment_score', 0.5)
+        try:
+            from .review_utils import analyze_review
+            analysis_result = analyze_review(self.content)
+            
+            self.sentiment = analysis_result.get('sentiment', 'NEUTRAL')
+            self.sentiment_score = analysis_result.get('sentiment_score', 0.5)
+            
+            # Safe keyword storage
+            if skip_keywords:
+                # Skip keyword analysis
+                self.keywords = self.keywords or {'positive_keywords': [], 'negative_keywords': []}
+            else:
+                # Store keywords in a safe structure format
+                self.keywords = {
+                    'positive_keywords': analysis_result.get('positive_keywords', []),
+                    'negative_keywords': analysis_result.get('negative_keywords', [])
+                }
+            self.analysis_status = 'done'
+        except Exception as e:
+            print(f"Review analysis error: {str(e)}")
+            # Use default sentiment in case of error
+            if self.rating >= 4:
+                self.sentiment = 'POSITIVE'
+            elif self.rating <= 2:
+                self.sentiment = 'NEGATIVE'
+            else:
+                self.sentiment = 'NEUTRAL'
                 
-                # Safe keyword storage
-                if kwargs.get('skip_keywords', False):
-                    # Skip keyword analysis
-                    self.keywords = self.keywords or {'positive_keywords': [], 'negative_keywords': []}
-                else:
-                    # Store keywords in a safe structure format
-                    self.keywords = {
-                        'positive_keywords': analysis_result.get('positive_keywords', []),
-                        'negative_keywords': analysis_result.get('negative_keywords', [])
-                    }
-            except Exception as e:
-                print(f"Review analysis error: {str(e)}")
-                # Use default sentiment in case of error
-                if self.rating >= 4:
-                    self.sentiment = 'POSITIVE'
-                elif self.rating <= 2:
-                    self.sentiment = 'NEGATIVE'
-                else:
-                    self.sentiment = 'NEUTRAL'
-                    
-                self.sentiment_score = 0.5
-                self.keywords = {'positive_keywords': [], 'negative_keywords': []}
+            self.sentiment_score = 0.5
+            self.keywords = {'positive_keywords': [], 'negative_keywords': []}
+            self.analysis_status = 'failed'
         
         super().save(*args, **kwargs)
+
+# Search query statistics
+class SearchQuery(models.Model):
+    """
+    Search query statistics model.
+    
+    Counts how often each (normalized) NLP search query is made, so the most
+    popular queries can be pre-computed when workers warm up.
+    """
+    query = models.CharField(max_length=255, unique=True)  # Normalized query text
+    search_count = models.IntegerField(default=0, db_index=True)  # Number of searches
+    last_searched_at = models.DateTimeField(auto_now=True)  # When the query was last searched
+    
+    class Meta:
+        ordering = ['-search_count']  # Most popular first
+    
+    def __str__(self):
+        return f"{self.query} ({self.search_count})"
+    
+    @classmethod
+    def record(cls, query):
+        """
+        Count one search for a query (searches go through search_stats.search_query_buffer).
+        
+        Parameters:
+            query: Search query text
+        """
+        from .search_cache import normalize_query
+        
+        query = normalize_query(query)[:255]
+        if query:
+            cls.record_counts({query: 1})
+    
+    @classmethod
+    def record_counts(cls, counts):
+        """
+        Add buffered search counts.
+        
+        Parameters:
+            counts: {normalized query: number of searches}
+        """
+        from django.db import IntegrityError, transaction
+        from django.db.models import F
+        
+        now = timezone.now()
+        with transaction.atomic():
+            for query, count in counts.items():
+                updated = cls.objects.filter(query=query).update(search_count=F('search_count') + count, last_searched_at=now)
+                if not updated:
+                    try:
+                        with transaction.atomic():
+                            cls.objects.create(query=query, search_count=count)
+                    except IntegrityError:
+                        # Created concurrently by another process
+                        cls.objects.filter(query=query).update(search_count=F('search_count') + count, last_searched_at=now)
+
+# Per-user recommendation features
+class UserFeatureProfile(models.Model):
+    """
+    Aggregated recommendation features of a user.
+    
+    Holds the counts derived from a user's likes (categories, subcategories,
+    subtypes, countries, cities) and reviews (country affinity, positive and
+    negative keywords, high/low rated locations), so recommendations read one
+    row instead of re-deriving the user's history. Built on first use and
+    kept up to date by the Like/Review signals (see user_features.py).
+    Edits of liked or reviewed locations only flag the profile as stale; it
+    is rebuilt on next use or by the rebuild_user_features command.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='feature_profile')  # Profile owner
+    likes_count = models.IntegerField(default=0)  # Number of likes
+    reviews_count = models.IntegerField(default=0)  # Number of reviews
+    liked_locations = models.JSONField(default=list)  # Liked location ids, most recent first
+    
+    # Like features: {value: count}
+    category_counts = models.JSONField(default=dict)
+    subcategory_counts = models.JSONField(default=dict)
+    subtype_counts = models.JSONField(default=dict)
+    country_counts = models.JSONField(default=dict)
+    city_counts = models.JSONField(default=dict)
+    
+    # Review features: {value: weight}
+    review_country_counts = models.JSONField(default=dict)  # Countries mentioned in or reviewed
+    positive_keyword_counts = models.JSONField(default=dict)
+    negative_keyword_counts = models.JSONField(default=dict)
+    high_rated_locations = models.JSONField(default=dict)  # {location id: reviews rated 4-5}
+    low_rated_locations = models.JSONField(default=dict)  # {location id: reviews rated 1-2}
+    
+    stale = models.BooleanField(default=False)  # A liked or reviewed location was edited since the profile was built
+    updated_at = models.DateTimeField(auto_now=True)  # When the profile was last updated
+    
+    def __str__(self):
+        return f"Feature profile of user {self.user_id}"
+
+# Precomputed recommendations
+class PrecomputedRecommendation(models.Model):
+    """
+    Recommendation lists precomputed offline for a user.
+    
+    Written by the precompute_recommendations command. Each list is stored as
+    [location id, similarity] pairs; the recommendation endpoint serves them
+    while the user's feature profile and selected tags are unchanged
+    (see recommendation_store.py).
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='precomputed_recommendations')  # Recommended user
+    size = models.IntegerField()  # Number of candidates computed per list
+    lists = models.JSONField(default=dict)  # {list name: [[location id, similarity], ...]}
+    tag_groups = models.JSONField(default=dict)  # {tag: [[location id, similarity], ...]}
+    activity_weight = models.FloatField(default=0.0)
+    tag_weight = models.FloatField(default=1.0)
+    selected_tags = models.JSONField(blank=True, null=True)  # User's selected tags when computed
+    profile_updated_at = models.DateTimeField(blank=True, null=True)  # UserFeatureProfile.updated_at when computed
+    computed_at = models.DateTimeField(auto_now=True)  # When the lists were computed
+    
+    def __str__(self):
+        return f"Precomputed recommendations of user {self.user_id}"
+
+# Item-to-item similarity graph
+class LocationNeighbors(models.Model):
+    """
+    Most similar locations of a location (item-to-item similarity graph).
+    
+    Written by the build_item_neighbors command (see item_neighbors.py).
+    Similarity combines embedding cosine, tag Jaccard and geographic
+    proximity. content_hash is the location's hash when its list was
+    computed, so a refresh only recomputes the lists affected by changed
+    or deleted locations.
+    """
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, primary_key=True, related_name='neighbor_list')  # Source location
+    content_hash = models.CharField(max_length=40, blank=True, null=True)  # Location.content_hash when computed
+    neighbors = models.JSONField(default=list)  # [[location id, similarity], ...], most similar first
+    computed_at = models.DateTimeField(auto_now=True)  # When the list was last written
+    
+    def __str__(self):
+        return f"Neighbours of location {self.location_id}"
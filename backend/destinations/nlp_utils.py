@@ -1,119 +1,271 @@
 import os
 import re
-from collections import Counter
+from collections import Counter, OrderedDict
 import time
 import functools
+import importlib.util
+import sys
+import threading
 
-# Check library availability
-NLP_ADVANCED = False
+from django.conf import settings
+
+from . import search_cache
+from .embedding_store import EmbeddingStore
+from .retrieval import RetrievalPipeline
+
+# Check library availability without importing anything.
+# Heavy libraries are imported on first use, so importing this module
+# (and with it every manage.py command) stays fast and offline.
+def module_available(name):
+    """
+    Check whether a module can be imported, without importing it.
+    
+    Parameters:
+        name: Module name
+        
+    Returns:
+        bool: True if the module is installed
+    """
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+NLP_ADVANCED = all(module_available(name) for name in ('numpy', 'torch', 'transformers', 'sentence_transformers'))
+SPACY_AVAILABLE = module_available('spacy')
+NLTK_AVAILABLE = module_available('nltk')
+
+# NumPy is lightweight and used for all embedding arrays
 try:
-    from transformers import pipeline
-    import torch
-    from sklearn.metrics.pairwise import cosine_similarity
     import numpy as np
-    from sentence_transformers import SentenceTransformer, util
-    NLP_ADVANCED = True
-    print("Advanced NLP features have been activated.")
 except ImportError:
-    print("Advanced NLP libraries are not installed. Only basic search functionality is available.")
+    pass
 
-# Add spaCy availability check
-SPACY_AVAILABLE = False
-try:
+# Set model caching directory
+os.environ.setdefault('TRANSFORMERS_CACHE', os.path.join(settings.NLP_MODELS_DIR, 'transformers_cache'))
+os.environ.setdefault('TORCH_HOME', os.path.join(settings.NLP_MODELS_DIR, 'torch_cache'))
+
+# Basic English stopwords used when NLTK data is not available
+BASIC_STOP_WORDS = {
+    'a', 'an', 'the', 'and', 'or', 'but', 'if', 'because', 'as', 'what',
+    'when', 'where', 'how', 'all', 'with', 'for', 'in', 'to', 'at', 'by',
+    'from', 'on', 'off'
+}
+
+@functools.lru_cache(maxsize=None)
+def load_spacy_model():
+    """
+    Load the spaCy pipeline on first use.
+    The model (NLP_SPACY_MODEL) may be an installed package name or a local directory;
+    nothing is downloaded.
+    
+    Returns:
+        spacy.Language or None if spaCy or the model is not available
+    """
+    if not SPACY_AVAILABLE:
+        print("spaCy library is not installed. Enhanced language processing will not be available.")
+        return None
+    
     import spacy
-    # Try to load English model
+    model = getattr(settings, 'NLP_SPACY_MODEL', 'en_core_web_sm')
     try:
-        nlp_spacy = spacy.load("en_core_web_sm")
-        SPACY_AVAILABLE = True
-        print("spaCy features have been activated with en_core_web_sm model.")
+        nlp = spacy.load(model)
+        print(f"spaCy features have been activated with {model} model.")
+        return nlp
     except OSError:
-        print("spaCy is installed but the English language model is not available.")
+        print(f"spaCy is installed but the language model '{model}' is not available.")
         print("To download the model, run: python -m spacy download en_core_web_sm")
-except ImportError:
-    print("spaCy library is not installed. Enhanced language processing will not be available.")
-    print("To install spaCy, run: pip install spacy")
+        return None
 
-try:
+@functools.lru_cache(maxsize=None)
+def load_nltk_resources():
+    """
+    Load the NLTK tokenizer and stopwords on first use.
+    Data is only looked up locally (NLP_NLTK_DATA_DIR and NLTK's default paths); nothing is downloaded.
+    
+    Returns:
+        tuple: (word tokenizer function or None, set of stopwords or None)
+    """
+    if not NLTK_AVAILABLE:
+        print("NLTK library is not installed. Basic tokenization will be used.")
+        return None, None
+    
     import nltk
-    from nltk.tokenize import word_tokenize
-    from nltk.corpus import stopwords
+    data_dir = getattr(settings, 'NLP_NLTK_DATA_DIR', None)
+    if data_dir and data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
     
-    # Download NLTK data (needed on first run)
-    nltk_resources = ['punkt', 'stopwords']
-    for resource in nltk_resources:
-        try:
-            nltk.data.find(f'tokenizers/{resource}')
-        except LookupError:
-            print(f"Downloading NLTK {resource}...")
-            nltk.download(resource)
+    tokenizer = None
+    try:
+        from nltk.tokenize import word_tokenize
+        word_tokenize("warm up")  # Raises LookupError if the punkt data is missing
+        tokenizer = word_tokenize
+    except LookupError:
+        print("NLTK tokenizer data not found. Basic tokenization will be used.")
     
-    # Download additional resources
+    stop_words = None
     try:
-        nltk.download('punkt')
-    except:
-        pass
+        from nltk.corpus import stopwords
+        stop_words = set(stopwords.words('english'))
+    except LookupError:
+        print("NLTK stopwords not found. Basic stopwords will be used.")
     
-    NLTK_AVAILABLE = True
-    print("NLTK features have been activated.")
-except ImportError:
-    NLTK_AVAILABLE = False
-    print("NLTK library is not installed. Basic tokenization will be used.")
-
-# Set model caching directory
-os.environ['TRANSFORMERS_CACHE'] = './models/transformers_cache'
-os.environ['TORCH_HOME'] = './models/torch_cache'
+    if tokenizer is None or stop_words is None:
+        print(f"To install NLTK data, run: python -m nltk.downloader -d {data_dir} punkt punkt_tab stopwords")
+    return tokenizer, stop_words
 
-# Simple LRU cache implementation
+# LRU cache implementation
 class LRUCache:
     """
     Least Recently Used (LRU) cache implementation.
-    Provides efficient caching mechanism with automatic eviction of oldest items.
+    Items are kept in access order in an OrderedDict, so lookups, inserts and
+    evictions are O(1). Supports an optional time-to-live, an optional memory
+    limit (NumPy arrays are counted by their buffer size) and hit/miss/eviction
+    counters. Safe to share between threads.
     """
-    def __init__(self, capacity=100):
+    def __init__(self, capacity=100, ttl=None, max_bytes=None):
         """
         Initialize LRU cache with specified capacity.
         
         Parameters:
             capacity: Maximum number of items to store in cache
+            ttl: Optional lifetime of an item in seconds
+            max_bytes: Optional limit on the estimated size of all cached values
         """
-        self.cache = {}
+        self.cache = OrderedDict()  # key -> (value, expires_at, size)
         self.capacity = capacity
-        self.timestamps = {}
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self.lock = threading.Lock()
     
-    def get(self, key):
+    def __len__(self):
+        return len(self.cache)
+    
+    @staticmethod
+    def estimate_size(value):
         """
-        Retrieve item from cache by key and update its timestamp.
+        Estimate the memory used by a cached value in bytes.
+        
+        Parameters:
+            value: Cached value
+            
+        Returns:
+            int: Estimated size in bytes
+        """
+        nbytes = getattr(value, 'nbytes', None)
+        if nbytes is not None:
+            return int(nbytes)
+        if isinstance(value, (list, tuple)):
+            return sys.getsizeof(value) + sum(LRUCache.estimate_size(item) for item in value)
+        return sys.getsizeof(value)
+    
+    def _remove(self, key):
+        _, _, size = self.cache.pop(key)
+        self.current_bytes -= size
+    
+    def get(self, key, default=None):
+        """
+        Retrieve item from cache by key and mark it as most recently used.
         
         Parameters:
             key: Cache key to look up
+            default: Value returned when the key is missing or expired
             
         Returns:
-            Cached value or None if key not found
+            Cached value or default if key not found
         """
-        if key in self.cache:
-            self.timestamps[key] = time.time()
-            return self.cache[key]
-        return None
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return value
     
     def put(self, key, value):
         """
-        Store item in cache with automatic eviction of oldest items.
+        Store item in cache, evicting least recently used items when full.
         
         Parameters:
             key: Cache key
             value: Value to store
         """
-        if len(self.cache) >= self.capacity:
-            # Remove the oldest item
-            oldest_key = min(self.timestamps, key=self.timestamps.get)
-            del self.cache[oldest_key]
-            del self.timestamps[oldest_key]
+        size = self.estimate_size(value) if self.max_bytes is not None else 0
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
         
-        self.cache[key] = value
-        self.timestamps[key] = time.time()
-
-# Search result cache
-search_cache = LRUCache(capacity=500)
+        with self.lock:
+            if key in self.cache:
+                self._remove(key)
+            
+            if self.max_bytes is not None and size > self.max_bytes:
+                # Larger than the whole cache, do not store
+                return
+            
+            self.cache[key] = (value, expires_at, size)
+            self.current_bytes += size
+            
+            while len(self.cache) > self.capacity or (self.max_bytes is not None and self.current_bytes > self.max_bytes):
+                oldest_key = next(iter(self.cache))
+                self._remove(oldest_key)
+                self.evictions += 1
+    
+    def invalidate(self, key):
+        """
+        Remove an item from the cache.
+        
+        Parameters:
+            key: Cache key
+            
+        Returns:
+            bool: True if the key was cached
+        """
+        with self.lock:
+            if key in self.cache:
+                self._remove(key)
+                return True
+            return False
+    
+    def clear(self):
+        """
+        Remove all items from the cache.
+        """
+        with self.lock:
+            self.cache.clear()
+            self.current_bytes = 0
+    
+    def stats(self):
+        """
+        Get cache usage counters.
+        
+        Returns:
+            dict: Size, memory and hit/miss/eviction counters
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'items': len(self.cache),
+                'capacity': self.capacity,
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
 
 class NLPProcessor:
     """
@@ -131,26 +283,49 @@ class NLPProcessor:
         
         # Initialize sentence embedding model
         self.sentence_model = None
-        
-        # Set up stopwords
-        self.stop_words = set(['a', 'an', 'the', 'and', 'or', 'but', 'if', 'because', 'as', 'what', 
-                              'when', 'where', 'how', 'all', 'with', 'for', 'in', 'to', 'at', 'by', 
-                              'from', 'on', 'off']) if not NLTK_AVAILABLE else set(stopwords.words('english'))
+        self.sentence_model_name = None
         
         # Model loading flag
         self.models_loaded = False
         
-        # Embedding cache
-        self.embedding_cache = {}
+        # Embedding cache (bounded by item count and memory)
+        self.embedding_cache = LRUCache(
+            capacity=getattr(settings, 'NLP_EMBEDDING_CACHE_SIZE', 20000),
+            max_bytes=getattr(settings, 'NLP_EMBEDDING_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        )
         
         # Sentiment analysis cache
-        self.sentiment_cache = {}
+        self.sentiment_cache = LRUCache(capacity=getattr(settings, 'NLP_SENTIMENT_CACHE_SIZE', 10000))
+        
+        # Persistent embedding cache shared by all processes (opened lazily)
+        self.embedding_store = None
+        if getattr(settings, 'NLP_EMBEDDING_STORE_ENABLED', True):
+            self.embedding_store = EmbeddingStore(
+                os.path.join(settings.NLP_MODELS_DIR, 'embedding_cache.sqlite3'),
+                max_entries=getattr(settings, 'NLP_EMBEDDING_STORE_MAX_ENTRIES', 200000),
+                max_bytes=getattr(settings, 'NLP_EMBEDDING_STORE_MAX_BYTES', 256 * 1024 * 1024)
+            )
         
         # Performance optimization settings
         self.use_lightweight_model = True
+        self.embedding_batch_size = getattr(settings, 'NLP_EMBEDDING_BATCH_SIZE', 64)
         
-        # Initialize spaCy processor if available
-        self.spacy_nlp = nlp_spacy if SPACY_AVAILABLE else None
+        # Two-stage hybrid retrieval (lexical candidates + embedding re-rank)
+        self.retrieval = RetrievalPipeline(self)
+    
+    @property
+    def spacy_nlp(self):
+        """
+        spaCy pipeline, loaded on first use (None if not available).
+        """
+        return load_spacy_model()
+    
+    @property
+    def stop_words(self):
+        """
+        English stopwords from NLTK when its data is available locally, basic list otherwise.
+        """
+        return load_nltk_resources()[1] or BASIC_STOP_WORDS
     
     def load_models(self):
         """
@@ -167,6 +342,9 @@ class NLPProcessor:
         print("Loading NLP models...")
         start_time = time.time()
         
+        from transformers import pipeline
+        from sentence_transformers import SentenceTransformer
+        
         # Load sentiment analysis model - explicit model specification
         self.sentiment_analyzer = pipeline(
             'sentiment-analysis',
@@ -182,6 +360,7 @@ class NLPProcessor:
             model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
             
         self.sentence_model = SentenceTransformer(model_name)
+        self.sentence_model_name = model_name
         
         self.models_loaded = True
         print(f"NLP models loaded! (Time taken: {time.time() - start_time:.2f} seconds)")
@@ -200,27 +379,16 @@ class NLPProcessor:
                    confidence score is a float between 0 and 1
         """
         # Check cache
-        if text in self.sentiment_cache:
-            return self.sentiment_cache[text]
+        cached = self.sentiment_cache.get(text)
+        if cached is not None:
+            return cached
             
         if not NLP_ADVANCED:
             # Simple sentiment analysis (keyword-based)
-            positive_words = ['good', 'great', 'excellent', 'amazing', 'wonderful', 'happy', 'love', 'enjoy', 'fun', 'beautiful']
-            negative_words = ['bad', 'terrible', 'awful', 'horrible', 'sad', 'hate', 'dislike', 'boring', 'ugly', 'disappointed']
-            
-            text_lower = text.lower()
-            positive_count = sum(1 for word in positive_words if word in text_lower)
-            negative_count = sum(1 for word in negative_words if word in text_lower)
-            
-            if positive_count > negative_count:
-                result = ("POSITIVE", 0.8)
-            elif negative_count > positive_count:
-                result = ("NEGATIVE", 0.8)
-            else:
-                result = ("NEUTRAL", 0.5)
+            result = self.lexicon_sentiment(text) or ("NEUTRAL", 0.5)
                 
             # Cache the result
-            self.sentiment_cache[text] = result
+            self.sentiment_cache.put(text, result)
             return result
         
         if not self.models_loaded:
@@ -229,18 +397,8 @@ class NLPProcessor:
         try:
             # Process short text with a simpler method
             if len(text.split()) < 5:
-                text_lower = text.lower()
-                positive_words = ['good', 'great', 'excellent', 'amazing', 'wonderful', 'happy', 'love', 'enjoy', 'fun', 'beautiful', 'clean']
-                negative_words = ['bad', 'terrible', 'awful', 'horrible', 'sad', 'hate', 'dislike', 'boring', 'ugly', 'disappointed', 'dirty']
-                
-                positive_count = sum(1 for word in positive_words if word in text_lower)
-                negative_count = sum(1 for word in negative_words if word in text_lower)
-                
-                if positive_count > negative_count:
-                    result = ("POSITIVE", 0.8)
-                elif negative_count > positive_count:
-                    result = ("NEGATIVE", 0.8)
-                else:
+                result = self.lexicon_sentiment(text, include_cleanliness=True)
+                if result is None:
                     # Use model
                     model_result = self.sentiment_analyzer(text)
                     result = (model_result[0]['label'], model_result[0]['score'])
@@ -250,14 +408,90 @@ class NLPProcessor:
                 result = (model_result[0]['label'], model_result[0]['score'])
                 
             # Cache the result
-            self.sentiment_cache[text] = result
+            self.sentiment_cache.put(text, result)
             return result
         except Exception as e:
             print(f"Error during sentiment analysis: {str(e)}")
             result = ("NEUTRAL", 0.5)
-            self.sentiment_cache[text] = result
+            self.sentiment_cache.put(text, result)
             return result
     
+    def analyze_sentiments(self, texts, batch_size=16):
+        """
+        Analyze sentiment of many texts, running the transformer model in batches.
+        Gives the same results as analyze_sentiment for each text.
+        
+        Parameters:
+            texts: List of text strings to analyze
+            batch_size: Number of texts per model forward pass
+            
+        Returns:
+            list: (sentiment label, confidence score) tuples aligned with texts
+        """
+        texts = list(texts)
+        if not NLP_ADVANCED:
+            return [self.analyze_sentiment(text) for text in texts]
+        
+        if not self.models_loaded:
+            self.load_models()
+        
+        results = {}
+        model_texts = []
+        for text in texts:
+            if text in results:
+                continue
+            cached = self.sentiment_cache.get(text)
+            if cached is not None:
+                results[text] = cached
+            elif len(text.split()) < 5 and self.lexicon_sentiment(text, include_cleanliness=True) is not None:
+                # Short texts use the word lists first, like analyze_sentiment
+                results[text] = self.analyze_sentiment(text)
+            else:
+                model_texts.append(text)
+        
+        model_texts = list(dict.fromkeys(model_texts))
+        if model_texts:
+            try:
+                # Truncate so one long text cannot fail the whole batch
+                model_results = self.sentiment_analyzer(model_texts, batch_size=batch_size, truncation=True)
+                for text, model_result in zip(model_texts, model_results):
+                    result = (model_result['label'], model_result['score'])
+                    self.sentiment_cache.put(text, result)
+                    results[text] = result
+            except Exception as e:
+                print(f"Error during batched sentiment analysis, analyzing texts one by one: {str(e)}")
+                for text in model_texts:
+                    results[text] = self.analyze_sentiment(text)
+        
+        return [results[text] for text in texts]
+    
+    def lexicon_sentiment(self, text, include_cleanliness=False):
+        """
+        Keyword-based sentiment used for short texts and when models are unavailable.
+        
+        Parameters:
+            text: Text string
+            include_cleanliness: Also count 'clean'/'dirty' (used alongside the model)
+            
+        Returns:
+            tuple: (sentiment label, 0.8), or None if positive and negative words are balanced
+        """
+        positive_words = ['good', 'great', 'excellent', 'amazing', 'wonderful', 'happy', 'love', 'enjoy', 'fun', 'beautiful']
+        negative_words = ['bad', 'terrible', 'awful', 'horrible', 'sad', 'hate', 'dislike', 'boring', 'ugly', 'disappointed']
+        if include_cleanliness:
+            positive_words.append('clean')
+            negative_words.append('dirty')
+        
+        text_lower = text.lower()
+        positive_count = sum(1 for word in positive_words if word in text_lower)
+        negative_count = sum(1 for word in negative_words if word in text_lower)
+        
+        if positive_count > negative_count:
+            return ("POSITIVE", 0.8)
+        elif negative_count > positive_count:
+            return ("NEGATIVE", 0.8)
+        return None
+    
     def get_embedding(self, text):
         """
         Generate text embedding vector for similarity calculations.
@@ -269,35 +503,129 @@ class NLPProcessor:
         Returns:
             numpy.ndarray or Counter: Embedding vector representation of the text
         """
-        # Check cache
-        if text in self.embedding_cache:
-            return self.embedding_cache[text]
-            
         if not NLP_ADVANCED:
+            # Check cache
+            cached = self.embedding_cache.get(text)
+            if cached is not None:
+                return cached
+            
             # Simple embedding alternative (based on word frequency)
             words = self.preprocess_text(text)
             word_counts = Counter(words)
             # Convert word frequencies to a vector (simple alternative)
             result = word_counts
-            self.embedding_cache[text] = result
+            self.embedding_cache.put(text, result)
             return result
         
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts, batch_size=None, use_cache=True):
+        """
+        Generate L2-normalized embeddings for a list of texts.
+        Texts already in the embedding cache are reused; duplicates and cache
+        misses are encoded together in batches.
+        
+        Parameters:
+            texts: List of text strings to embed
+            batch_size: Number of texts per model forward pass (default: NLP_EMBEDDING_BATCH_SIZE)
+            use_cache: Whether to read and fill the embedding cache
+            
+        Returns:
+            numpy.ndarray: Contiguous float32 array of shape (len(texts), dim) with unit-length rows
+        """
         if not self.models_loaded:
             self.load_models()
         
-        try:
-            # Always use Sentence-Transformers model for short text too
-            result = self.sentence_model.encode(text, convert_to_numpy=True)
-                
-            # Cache the result
-            self.embedding_cache[text] = result
-            return result
-        except Exception as e:
-            print(f"Error generating embedding: {str(e)}")
-            result = np.zeros(384)  # Default embedding dimension (MiniLM model)
-            self.embedding_cache[text] = result
-            return result
-    
+        texts = list(texts)
+        batch_size = batch_size or self.embedding_batch_size
+        
+        vectors = {}
+        if use_cache:
+            for text in texts:
+                if text not in vectors:
+                    cached = self.embedding_cache.get(text)
+                    if cached is not None:
+                        vectors[text] = cached
+        
+        # Encode each distinct missing text once
+        misses = list(dict.fromkeys(text for text in texts if text not in vectors))
+        
+        # Consult the persistent store before encoding
+        if misses and use_cache and self.embedding_store is not None:
+            try:
+                stored = self.embedding_store.get_many(self.sentence_model_name, misses)
+            except Exception as e:
+                print(f"Error reading embedding store: {str(e)}")
+                stored = {}
+            for text, vector in stored.items():
+                vectors[text] = vector
+                self.embedding_cache.put(text, vector)
+            misses = [text for text in misses if text not in stored]
+        
+        if misses:
+            encoded_ok = True
+            try:
+                encoded = self.sentence_model.encode(
+                    misses,
+                    batch_size=batch_size,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                ).astype(np.float32)
+            except Exception as e:
+                print(f"Error generating embeddings: {str(e)}")
+                dimension = self.sentence_model.get_sentence_embedding_dimension() or 384  # MiniLM default
+                encoded = np.zeros((len(misses), dimension), dtype=np.float32)
+                encoded_ok = False
+            
+            for text, vector in zip(misses, encoded):
+                vectors[text] = vector
+                if use_cache:
+                    self.embedding_cache.put(text, vector)
+            
+            if use_cache and encoded_ok and self.embedding_store is not None:
+                try:
+                    self.embedding_store.put_many(self.sentence_model_name, dict(zip(misses, encoded)))
+                except Exception as e:
+                    print(f"Error writing embedding store: {str(e)}")
+        
+        if not texts:
+            return np.zeros((0, self.sentence_model.get_sentence_embedding_dimension() or 384), dtype=np.float32)
+        return np.ascontiguousarray(np.stack([vectors[text] for text in texts]), dtype=np.float32)
+
+    def encode_texts(self, texts, batch_size=None):
+        """
+        Encode a list of texts into L2-normalized embeddings in batches, bypassing the cache.
+        Used to build the precomputed location embedding matrix.
+
+        Parameters:
+            texts: List of text strings to embed
+            batch_size: Number of texts per model forward pass
+
+        Returns:
+            numpy.ndarray: Array of shape (len(texts), dim) with unit-length rows
+        """
+        return self.get_embeddings(texts, batch_size=batch_size, use_cache=False)
+
+    def amplify_short_query_similarity(self, similarity_value):
+        """
+        Amplify similarity scores for short queries (less than 3 words).
+        Short queries produce systematically lower cosine similarities.
+
+        Parameters:
+            similarity_value: Raw cosine similarity
+
+        Returns:
+            float: Amplified similarity score
+        """
+        # Amplify scores above 0.2 (lowered threshold)
+        if similarity_value >= 0.2:
+            # Amplify up to 0.85 max, with reduced amplification ratio (2.0 -> 1.5)
+            return min(similarity_value * 1.5, 0.85)
+        # Also slightly amplify scores above 0.1
+        elif similarity_value >= 0.1:
+            return similarity_value * 1.3
+        return similarity_value
+
     def calculate_similarity(self, text1, text2):
         """
         Calculate semantic similarity between two text strings.
@@ -318,39 +646,42 @@ class NLPProcessor:
             self.load_models()
             
         try:
-            # Calculate similarity using Sentence-Transformers
-            embedding1 = self.get_embedding(text1)
-            embedding2 = self.get_embedding(text2)
-            
-            # Calculate cosine similarity
-            similarity = util.cos_sim(embedding1, embedding2)
+            # Encode both texts in one batch; rows are normalized, so the dot product is the cosine similarity
+            embeddings = self.get_embeddings([text1, text2])
+            similarity = float(embeddings[0] @ embeddings[1])
             
             # Improve similarity scores for short queries
             if len(text1.split()) < 3:
-                # Amplify similarity score for short queries
-                similarity_value = float(similarity[0][0])
-                
-                # Log output removed (performance improvement)
-                # print(f"Original similarity: {similarity_value:.4f}, Query: '{text1}', Target: '{text2[:50]}...'")
-                
-                # Amplify scores above 0.2 (lowered threshold)
-                if similarity_value >= 0.2:
-                    # Amplify up to 0.85 max, with reduced amplification ratio (2.0 -> 1.5)
-                    amplified = min(similarity_value * 1.5, 0.85)
-                    # print(f"Amplified similarity: {amplified:.4f}")
-                    return amplified
-                # Also slightly amplify scores above 0.1
-                elif similarity_value >= 0.1:
-                    amplified = similarity_value * 1.3
-                    # print(f"Amplified similarity: {amplified:.4f}")
-                    return amplified
-            
-            return float(similarity[0][0])  # Convert tensor to scalar value
+                return self.amplify_short_query_similarity(similarity)
+
+            return similarity
         except Exception as e:
             print(f"Error calculating similarity: {str(e)}")
             # Fall back to basic similarity calculation
             return self.calculate_similarity_fallback(text1, text2)
     
+    def calculate_similarities(self, query, texts):
+        """
+        Calculate semantic similarity between a query and many texts in one batch.
+        
+        Parameters:
+            query: Query text
+            texts: List of text strings to compare against
+            
+        Returns:
+            list: Similarity scores aligned with texts
+        """
+        if not NLP_ADVANCED:
+            return [self.calculate_similarity_fallback(query, text) for text in texts]
+        
+        embeddings = self.get_embeddings([query] + list(texts))
+        similarities = (embeddings[1:] @ embeddings[0]).tolist()
+        
+        # Improve similarity scores for short queries
+        if len(query.split()) < 3:
+            similarities = [self.amplify_short_query_similarity(similarity) for similarity in similarities]
+        return similarities
+    
     def calculate_similarity_fallback(self, text1, text2):
         """
         Fallback method for calculating text similarity using Jaccard similarity.
@@ -384,98 +715,131 @@ class NLPProcessor:
         
         return similarity
     
-    def extract_meaning_units(self, text):
+    def extract_meaning_units(self, text, include_entities=False):
         """
         Extract meaning units from text using spaCy's advanced NLP capabilities.
         Identifies noun phrases, adjective-noun pairs, and negation contexts.
         
         Parameters:
             text: Text to analyze
+            include_entities: Also run named entity recognition
             
         Returns:
             dict: Dictionary containing:
                 - phrases: List of meaningful phrases
                 - adj_noun_pairs: List of adjective-noun pairs
                 - negation_concepts: List of negated concepts
-                - entities: List of named entities
+                - entities: List of named entities (empty unless include_entities)
+        """
+        return self.extract_meaning_units_batch([text], include_entities=include_entities)[0]
+    
+    def extract_meaning_units_batch(self, texts, batch_size=64, n_process=1, include_entities=False):
+        """
+        Extract meaning units from many texts with spaCy's nlp.pipe.
+        Only the components needed for POS tags, lemmas and the dependency parse
+        run; named entity recognition is skipped unless requested.
+        
+        Parameters:
+            texts: List of texts to analyze
+            batch_size: Number of texts per spaCy batch
+            n_process: Number of spaCy worker processes
+            include_entities: Also run named entity recognition
+            
+        Returns:
+            list: Meaning unit dictionaries (see extract_meaning_units) aligned with texts
         """
+        texts = list(texts)
+        
         # Check if spaCy is available
-        if not SPACY_AVAILABLE or not self.spacy_nlp:
-            return {
-                'phrases': [],
-                'adj_noun_pairs': [],
-                'negation_concepts': [],
-                'entities': []
-            }
+        nlp = self.spacy_nlp
+        if not nlp:
+            return [self.empty_meaning_units() for _ in texts]
+        
+        disable = [] if include_entities else [name for name in ('ner',) if name in nlp.pipe_names]
         
         try:
-            # Process text with spaCy
-            doc = self.spacy_nlp(text)
-            
-            # Extract noun phrases
-            noun_phrases = [chunk.text.lower() for chunk in doc.noun_chunks]
+            docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable)
+            return [self.meaning_units_from_doc(doc, include_entities) for doc in docs]
+        except Exception as e:
+            print(f"Error during meaning unit extraction: {str(e)}")
+            return [self.empty_meaning_units() for _ in texts]
+    
+    @staticmethod
+    def empty_meaning_units():
+        return {
+            'phrases': [],
+            'adj_noun_pairs': [],
+            'negation_concepts': [],
+            'entities': []
+        }
+    
+    def meaning_units_from_doc(self, doc, include_entities=False):
+        """
+        Extract meaning units from a parsed spaCy document in a single pass over its tokens.
+        
+        Parameters:
+            doc: spaCy Doc
+            include_entities: Whether named entities were recognized
             
+        Returns:
+            dict: Meaning units (see extract_meaning_units)
+        """
+        # Extract noun phrases
+        noun_phrases = [chunk.text.lower() for chunk in doc.noun_chunks]
+        
+        adj_noun_pairs = []
+        negation_concepts = []
+        context_aware_phrases = []
+        doc_length = len(doc)
+        
+        for i, token in enumerate(doc):
             # Extract adjective-noun pairs
-            adj_noun_pairs = []
-            for token in doc:
-                if token.pos_ == "NOUN" or token.pos_ == "PROPN":
-                    for child in token.children:
-                        if child.pos_ == "ADJ":
-                            pair = f"{child.text.lower()}_{token.text.lower()}"
-                            adj_noun_pairs.append(pair)
-            
-            # Extract negation contexts
-            negation_concepts = []
-            for token in doc:
-                # Check for explicit negation
-                if token.dep_ == "neg":
-                    head = token.head
-                    # Get the concept being negated
-                    if head.pos_ in ["ADJ", "VERB"]:
-                        concept = f"not_{head.text.lower()}"
-                        # If the head has a noun object, include it
-                        for child in head.children:
-                            if child.dep_ in ["dobj", "attr", "pobj"] and child.pos_ == "NOUN":
-                                concept = f"not_{head.text.lower()}_{child.text.lower()}"
-                                break
-                        negation_concepts.append(concept)
-                
-                # Check for implicit negation (nothing, no one, nowhere)
-                if token.lemma_ in ["nothing", "nobody", "nowhere", "none"]:
-                    for other_token in doc:
-                        # Find related adjectives or verbs
-                        if (other_token.head == token or token.head == other_token) and other_token.pos_ in ["ADJ", "VERB"]:
-                            negation_concepts.append(f"no_{other_token.text.lower()}")
+            if token.pos_ == "NOUN" or token.pos_ == "PROPN":
+                for child in token.children:
+                    if child.pos_ == "ADJ":
+                        pair = f"{child.text.lower()}_{token.text.lower()}"
+                        adj_noun_pairs.append(pair)
             
-            # Identify named entities
-            entities = [(ent.text, ent.label_) for ent in doc.ents]
+            # Check for explicit negation
+            if token.dep_ == "neg":
+                head = token.head
+                # Get the concept being negated
+                if head.pos_ in ["ADJ", "VERB"]:
+                    concept = f"not_{head.text.lower()}"
+                    # If the head has a noun object, include it
+                    for child in head.children:
+                        if child.dep_ in ["dobj", "attr", "pobj"] and child.pos_ == "NOUN":
+                            concept = f"not_{head.text.lower()}_{child.text.lower()}"
+                            break
+                    negation_concepts.append(concept)
             
-            # Create context-aware phrases for "large but nothing" type expressions
-            context_aware_phrases = []
-            for i, token in enumerate(doc):
-                if i < len(doc) - 3 and token.pos_ == "ADJ":
-                    # Check for pattern: ADJ + but + negation
-                    if any(doc[i+j].text.lower() in ["but", "however", "yet", "although"] for j in range(1, 3)):
-                        if any(doc[i+j].lemma_ in ["nothing", "none", "empty", "no"] for j in range(2, 5)):
-                            # Found pattern like "large but nothing"
-                            inverse_concept = f"empty_{token.text.lower()}"
-                            context_aware_phrases.append(inverse_concept)
+            # Check for implicit negation (nothing, no one, nowhere).
+            # Related tokens are the head and the children in the parse tree, in document order.
+            if token.lemma_ in ["nothing", "nobody", "nowhere", "none"]:
+                related = {child.i: child for child in token.children}
+                related[token.head.i] = token.head
+                for _, other_token in sorted(related.items()):
+                    if other_token.pos_ in ["ADJ", "VERB"]:
+                        negation_concepts.append(f"no_{other_token.text.lower()}")
             
-            return {
-                'phrases': noun_phrases,
-                'adj_noun_pairs': adj_noun_pairs,
-                'negation_concepts': negation_concepts + context_aware_phrases,
-                'entities': entities
-            }
+            # Create context-aware phrases for "large but nothing" type expressions
+            if i < doc_length - 3 and token.pos_ == "ADJ":
+                # Check for pattern: ADJ + but + negation
+                if any(doc[i+j].text.lower() in ["but", "however", "yet", "although"] for j in range(1, 3)):
+                    if any(doc[i+j].lemma_ in ["nothing", "none", "empty", "no"] for j in range(2, 5) if i + j < doc_length):
+                        # Found pattern like "large but nothing"
+                        inverse_concept = f"empty_{token.text.lower()}"
+                        context_aware_phrases.append(inverse_concept)
         
-        except Exception as e:
-            print(f"Error during meaning unit extraction: {str(e)}")
-            return {
-                'phrases': [],
-                'adj_noun_pairs': [],
-                'negation_concepts': [],
-                'entities': []
-            }
+        # Identify named entities
+        entities = [(ent.text, ent.label_) for ent in doc.ents] if include_entities else []
+        
+        return {
+            'phrases': noun_phrases,
+            'adj_noun_pairs': adj_noun_pairs,
+            'negation_concepts': negation_concepts + context_aware_phrases,
+            'entities': entities
+        }
     
     def preprocess_text(self, text, filter_adverbs=False):
         """
@@ -499,7 +863,8 @@ class NLPProcessor:
         text = re.sub(r'[^\w\s]', ' ', text)
         
         # Tokenize
-        if NLTK_AVAILABLE:
+        word_tokenize = load_nltk_resources()[0]
+        if word_tokenize is not None:
             tokens = word_tokenize(text)
         else:
             tokens = text.split()
@@ -513,10 +878,11 @@ class NLPProcessor:
         }
         
         # Filter tokens
+        stop_words = self.stop_words
         filtered_tokens = []
         for token in tokens:
             if len(token) > 1:  # Skip single-character tokens
-                if token not in self.stop_words:  # Skip stopwords
+                if token not in stop_words:  # Skip stopwords
                     if not filter_adverbs or token not in common_adverbs:  # Optionally skip adverbs
                         filtered_tokens.append(token)
         
@@ -525,7 +891,8 @@ class NLPProcessor:
     def search_destinations(self, query, destinations, top_n=10):
         """
         Find destinations most similar to the query.
-        Performs semantic search with keyword matching.
+        Runs the hybrid retrieval pipeline: lexical, tag and nearest-neighbour
+        candidates are merged up to the candidate budget and re-ranked with embeddings.
         
         Parameters:
             query: Search query text
@@ -540,128 +907,25 @@ class NLPProcessor:
             print(f"NLP search query: {query}")
             print(f"NLP_ADVANCED status: {NLP_ADVANCED}")
             
-            # Create cache key (query + number of results)
-            cache_key = f"{query}:{top_n}"
-            cached_results = search_cache.get(cache_key)
-            if cached_results:
-                print(f"Returning results from cache (query: {query})")
-                return cached_results
+            # Only searches over the whole catalogue are shared through the search cache
+            cacheable = hasattr(destinations, 'query') and not destinations.query.has_filters()
+            if cacheable:
+                cached_entries = search_cache.get_results(query, top_n)
+                if cached_entries:
+                    print(f"Returning results from cache (query: {query})")
+                    return search_cache.load_results(cached_entries, destinations)
             
             # Log processing approach based on query length (simplified)
             query_words_count = len(query.split())
             if query_words_count < 3:
                 print(f"Short query detected ({query_words_count} words)")
             
-            # Preprocess query
-            query_words = set(self.preprocess_text(query))
-            
-            # Process all destinations (no limit)
-            total_destinations = len(destinations)
-            print(f"Starting to process all {total_destinations} destinations")
-            
-            # Initial keyword filtering to identify high-relevance destinations first
-            # Always enable keyword filtering for short queries
-            filtered_destinations = []
-            
-            # Try initial filtering at the database level
-            if len(query_words) > 0:
-                print("Applying keyword-based pre-filtering")
-                for dest in destinations:
-                    dest_text = f"{dest.name} {dest.description or ''}".lower()
-                    
-                    # Include city and country information in search text
-                    if dest.city:
-                        dest_text += f" {dest.city}".lower()
-                    if dest.country:
-                        dest_text += f" {dest.country}".lower()
-                    
-                    # Select only destinations containing at least one keyword
-                    if any(word in dest_text for word in query_words):
-                        filtered_destinations.append(dest)
-                
-                # Use the original list if there aren't enough results
-                if len(filtered_destinations) < max(50, top_n * 2):  # At least 50 or 2x requested results
-                    print(f"Not enough filtering results ({len(filtered_destinations)}), using original list")
-                    # Use full list
-                    filtered_destinations = destinations
-                    print(f"Processing all {len(filtered_destinations)} destinations")
-                else:
-                    print(f"Filtered to {len(filtered_destinations)} destinations by keywords")
-            else:
-                # Use full list
-                filtered_destinations = destinations
-                print(f"Processing all {len(filtered_destinations)} destinations")
-            
-            # Start measuring processing time
-            process_start_time = time.time()
-            
-            results = []
-            for i, dest in enumerate(filtered_destinations):
-                # Log progress (every 5000 items) - reduced logging frequency
-                if i > 0 and i % 5000 == 0:
-                    elapsed = time.time() - process_start_time
-                    print(f"Progress: {i}/{len(filtered_destinations)} processed ({elapsed:.2f} seconds)")
-                
-                # Combine destination information
-                dest_text = f"{dest.name} {dest.description or ''}"
-                
-                # Add city and country information (repeated for increased weight)
-                if dest.city:
-                    # Repeat city information 3 times to increase weight
-                    dest_text += f" {dest.city} {dest.city} {dest.city}"
-                if dest.country:
-                    # Repeat country information 3 times to increase weight
-                    dest_text += f" {dest.country} {dest.country} {dest.country}"
-                
-                # Add subcategory and subtype (simplified)
-                if dest.subcategories:
-                    if isinstance(dest.subcategories, list):
-                        dest_text += " " + " ".join(dest.subcategories[:5])  # Use only first 5
-                    elif isinstance(dest.subcategories, str):
-                        dest_text += " " + dest.subcategories
-                
-                if dest.subtypes:
-                    if isinstance(dest.subtypes, list):
-                        dest_text += " " + " ".join(dest.subtypes[:5])  # Use only first 5
-                    elif isinstance(dest.subtypes, str):
-                        dest_text += " " + dest.subtypes
-                
-                # Calculate similarity
-                similarity = self.calculate_similarity(query, dest_text)
-                
-                # Apply additional weight for short queries (less than 3 words)
-                if len(query.split()) < 3:
-                    # Increase weight if query words are directly in the destination name
-                    if any(word in dest.name.lower() for word in query_words):
-                        similarity *= 1.5  # 50% increased weight
-                    
-                    # Greatly increase weight if query words are in city name
-                    if dest.city and any(word in dest.city.lower() for word in query_words):
-                        similarity *= 2.0  # 100% increased weight
-                    
-                    # Greatly increase weight if query words are in country name
-                    if dest.country and any(word in dest.country.lower() for word in query_words):
-                        similarity *= 2.0  # 100% increased weight
-                    
-                    # Slightly increase weight if query words are in description
-                    elif any(word in dest_text.lower() for word in query_words):
-                        similarity *= 1.3  # 30% increased weight
-                
-                # Apply weight if query keywords are directly in the title
-                if any(word in dest.name.lower() for word in query_words):
-                    similarity *= 1.5  # 50% increased weight
-                
-                results.append((dest, similarity))
-            
-            # Sort by similarity
-            results.sort(key=lambda x: x[1], reverse=True)
-            
-            # End measuring processing time
-            process_end_time = time.time()
-            process_duration = process_end_time - process_start_time
+            # Candidate generation and re-ranking (bounded by the candidate budget)
+            results, timings = self.retrieval.run(query, destinations, top_n, use_embeddings=NLP_ADVANCED)
             
             print(f"Search complete: returning top {top_n} of {len(results)} results")
-            print(f"Processing time: total {time.time() - start_time:.2f} seconds (data processing: {process_duration:.2f} seconds)")
+            print(f"Processing time: total {time.time() - start_time:.2f} seconds")
+            print(f"Stage timings (ms): {', '.join(f'{stage}={ms}' for stage, ms in timings.items())}")
             
             # Log top 5 results (simplified)
             top_results = [dest.name for dest, _ in results[:5]]
@@ -680,8 +944,9 @@ class NLPProcessor:
             else:
                 final_results = results[:top_n]
             
-            # Cache results
-            search_cache.put(cache_key, final_results)
+            # Cache results (Location ids and scores)
+            if cacheable:
+                search_cache.set_results(query, top_n, final_results)
             
             return final_results
         except Exception as e:
@@ -690,10 +955,36 @@ class NLPProcessor:
             print("Falling back to keyword search due to error in semantic search")
             return self.keyword_search(query, destinations, top_n)
     
+    def lexical_search(self, query, destinations, top_n=10):
+        """
+        Lexical (BM25F) search without semantic re-ranking.
+        
+        Parameters:
+            query: Search query text
+            destinations: QuerySet or list of destinations to search within
+            top_n: Number of results to return
+            
+        Returns:
+            List of tuples: [(destination, score), ...] sorted by score,
+            with scores normalized to 0-1
+        """
+        allowed_ids, destinations_by_id = self.retrieval.resolve_scope(destinations)
+        ranked = self.retrieval.lexical_candidates(query, allowed_ids, top_n)
+        if not ranked:
+            return []
+        
+        if destinations_by_id is None:
+            destinations_by_id = destinations.in_bulk([location_id for location_id, _ in ranked])
+        
+        max_score = ranked[0][1]
+        return [(destinations_by_id[location_id], score / max_score)
+                for location_id, score in ranked if location_id in destinations_by_id]
+    
     def keyword_search(self, query, destinations, top_n=10):
         """
         Simple keyword-based search fallback method.
         Used when advanced search fails or is unavailable.
+        Scores only the destinations found in the inverted keyword index postings.
         
         Parameters:
             query: Search query text
@@ -703,16 +994,14 @@ class NLPProcessor:
         Returns:
             List of tuples: [(destination, similarity_score), ...] sorted by similarity score
         """
+        from .keyword_index import keyword_index, FIELD_NAME, FIELD_CITY, FIELD_COUNTRY
+        
         try:
             start_time = time.time()
             print("Using basic keyword-based search")
             query_lower = query.lower()
             query_words = set(query_lower.split())
             
-            # Process all destinations (no limit)
-            total_destinations = len(destinations)
-            print(f"Keyword search: processing all {total_destinations} destinations")
-            
             # Similar words dictionary (for search expansion)
             similar_words = {
                 'clean': ['neat', 'tidy', 'spotless', 'immaculate', 'pristine'],
@@ -742,80 +1031,66 @@ class NLPProcessor:
             # Start measuring processing time
             process_start_time = time.time()
             
-            results = []
-            raw_scores = []  # Store raw scores for normalization
+            # Build the index on first use and apply pending location changes;
+            # the whole query reads one version of the index
+            postings = keyword_index.ensure_ready()
             
-            for i, dest in enumerate(destinations):
-                # Log progress (every 1000 items)
-                if i > 0 and i % 1000 == 0:
-                    elapsed = time.time() - process_start_time
-                    print(f"Progress: {i}/{len(destinations)} processed ({elapsed:.2f} seconds)")
-                
-                # Combine destination information
-                dest_text = f"{dest.name} {dest.description or ''}".lower()
-                
-                # Add category information
-                if dest.category:
-                    dest_text += f" {dest.category}".lower()
-                
-                # Add city and country information (repeated for increased weight)
-                city_match = False
-                country_match = False
-                
-                if dest.city:
-                    city_lower = dest.city.lower()
-                    # Repeat city information 3 times to increase weight
-                    dest_text += f" {city_lower} {city_lower} {city_lower}"
-                    # Check for city match
-                    city_match = any(word in city_lower for word in query_words)
-                
-                if dest.country:
-                    country_lower = dest.country.lower()
-                    # Repeat country information 3 times to increase weight
-                    dest_text += f" {country_lower} {country_lower} {country_lower}"
-                    # Check for country match
-                    country_match = any(word in country_lower for word in query_words)
-                
-                # Add subcategory information
-                if dest.subcategories:
-                    if isinstance(dest.subcategories, list):
-                        dest_text += " " + " ".join([s.lower() for s in dest.subcategories])
-                    elif isinstance(dest.subcategories, str):
-                        dest_text += " " + dest.subcategories.lower()
-                
+            # Count matches per destination using only the matching posting lists
+            exact_match_counts = Counter()
+            partial_match_counts = Counter()
+            expanded_match_counts = Counter()
+            matched_fields = {}
+            
+            for word in query_words:
                 # 1. Exact word matching (high score)
-                exact_match_count = sum(1 for word in query_words if f" {word} " in f" {dest_text} ")
+                exact_match_counts.update(postings.exact_matches(word).keys())
                 
                 # 2. Partial substring matching (medium score)
-                partial_match_count = sum(1 for word in query_words if word in dest_text)
-                
-                # 3. Expanded word matching (low score)
-                expanded_match_count = sum(1 for word in expanded_query_words if word in dest_text)
-                
+                for location_id, fields in postings.partial_matches(word).items():
+                    partial_match_counts[location_id] += 1
+                    matched_fields[location_id] = matched_fields.get(location_id, 0) | fields
+            
+            # 3. Expanded word matching (low score)
+            for word in expanded_query_words:
+                expanded_match_counts.update(postings.partial_matches(word).keys())
+            
+            # Restrict to the given destinations when they are a subset of the catalogue
+            candidate_ids = set(partial_match_counts) | set(expanded_match_counts)
+            if hasattr(destinations, 'query'):
+                if destinations.query.has_filters():
+                    candidate_ids &= set(destinations.filter(id__in=candidate_ids).values_list('id', flat=True))
+            else:
+                candidate_ids &= {dest.id for dest in destinations}
+            
+            print(f"Keyword search: scoring {len(candidate_ids)} candidate destinations of {len(keyword_index)}")
+            
+            results = []
+            raw_scores = []  # Store raw scores for normalization
+            
+            for location_id in candidate_ids:
                 # Calculate combined score (with weights)
                 score = 0
-                if exact_match_count > 0:
-                    score += exact_match_count * 0.6  # Highest weight for exact matching
-                if partial_match_count > 0:
-                    score += partial_match_count * 0.3  # Medium weight for partial matching
-                if expanded_match_count > 0:
-                    score += expanded_match_count * 0.1  # Lowest weight for expanded word matching
+                score += exact_match_counts[location_id] * 0.6  # Highest weight for exact matching
+                score += partial_match_counts[location_id] * 0.3  # Medium weight for partial matching
+                score += expanded_match_counts[location_id] * 0.1  # Lowest weight for expanded word matching
+                
+                fields = matched_fields.get(location_id, 0)
                 
                 # Add weight if keywords are in title
-                if any(word in dest.name.lower() for word in query_words):
+                if fields & FIELD_NAME:
                     score *= 1.5  # 50% increased weight
                 
                 # Add significant weight if keywords are in city name
-                if city_match:
+                if fields & FIELD_CITY:
                     score *= 2.0  # 100% increased weight
                 
                 # Add significant weight if keywords are in country name
-                if country_match:
+                if fields & FIELD_COUNTRY:
                     score *= 2.0  # 100% increased weight
                 
                 # Add only results with a score
                 if score > 0:
-                    raw_scores.append((dest, score))
+                    raw_scores.append((location_id, score))
             
             # Normalize scores and improve distribution
             if raw_scores:
@@ -823,7 +1098,7 @@ class NLPProcessor:
                 max_score = max(score for _, score in raw_scores)
                 
                 # Normalize scores and improve distribution (log scale)
-                for dest, score in raw_scores:
+                for location_id, score in raw_scores:
                     # Apply log scale (improve score distribution)
                     normalized_score = 0.2 + (0.8 * (score / max_score))
                     
@@ -831,19 +1106,27 @@ class NLPProcessor:
                     # Center around 0.5 (range 0.2 - 1.0)
                     adjusted_score = 0.2 + (0.8 / (1 + 2.5 * (1 - normalized_score)))
                     
-                    results.append((dest, adjusted_score))
+                    results.append((location_id, adjusted_score))
             
             # Sort by score
             results.sort(key=lambda x: x[1], reverse=True)
+            results = results[:top_n]
+            
+            # Load only the returned destinations
+            if hasattr(destinations, 'query'):
+                destinations_by_id = destinations.in_bulk([location_id for location_id, _ in results])
+            else:
+                destinations_by_id = {dest.id: dest for dest in destinations}
+            results = [(destinations_by_id[location_id], score) for location_id, score in results if location_id in destinations_by_id]
             
             # End measuring processing time
             process_end_time = time.time()
             process_duration = process_end_time - process_start_time
             
-            print(f"Keyword search complete: found {len(results)} results")
+            print(f"Keyword search complete: found {len(raw_scores)} results")
             print(f"Processing time: total {time.time() - start_time:.2f} seconds (data processing: {process_duration:.2f} seconds)")
             
-            return results[:top_n]
+            return results
         except Exception as e:
             print(f"Error during keyword search: {str(e)}")
             # Last resort fallback: return random results
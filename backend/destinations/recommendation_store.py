@@ -0,0 +1,214 @@
+"""
+Precomputed per-user recommendation lists.
+
+The precompute_recommendations command runs the full recommendation
+computation (views.build_recommendations) offline for active users, with a
+larger candidate pool than a request asks for, and stores the lists compactly
+as [location id, similarity] pairs in PrecomputedRecommendation.
+
+The recommendation endpoint serves a stored entry while it is fresh: the
+user's feature profile (likes and reviews) and selected tags are unchanged
+since it was computed and it is younger than RECOMMENDATION_PRECOMPUTE_MAX_AGE.
+Each request draws from the pool with a light reshuffle, so repeated calls
+still vary. New and recently active users fall back to online computation.
+"""
+import contextlib
+import io
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+# Stored list name -> recommendation_type of its items
+LIST_TYPES = {
+    'results': 'general',
+    'keyword_recommendations': 'keyword',
+    'subcategory_recommendations': 'subcategory',
+    'subtype_recommendations': 'subtype',
+    'country_recommendations': 'country',
+}
+
+
+def location_to_dict(location, similarity, recommendation_type="general"):
+    """
+    Convert a recommended Location to a serializable dictionary.
+
+    Parameters:
+        location: Location
+        similarity: Similarity score
+        recommendation_type: Source of the recommendation
+
+    Returns:
+        dict: Recommendation entry
+    """
+    return {
+        "id": location.id,
+        "name": location.name,
+        "description": location.description,
+        "subcategories": location.subcategories,
+        "subtypes": location.subtypes,
+        "image": location.image,
+        "city": location.city,
+        "country": location.country,
+        "similarity_score": float(similarity),
+        "recommendation_type": recommendation_type
+    }
+
+
+def compact(items):
+    return [[item["id"], item["similarity_score"]] for item in items]
+
+
+def compute_entry(user, profile, size):
+    """
+    Compute the recommendation lists of a user in their stored form.
+
+    Parameters:
+        user: User
+        profile: The user's UserFeatureProfile
+        size: Candidates computed per list
+
+    Returns:
+        dict: PrecomputedRecommendation field values
+    """
+    from .views import build_recommendations
+
+    # The recommendation code reports every step; keep the job output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = build_recommendations(user, [], size, profile)
+    return {
+        'user_id': user.id,
+        'size': size,
+        'lists': {name: compact(data.get(name, [])) for name in LIST_TYPES},
+        'tag_groups': {tag: compact(items) for tag, items in data.get('tag_group_recommendations', {}).items()},
+        'activity_weight': data.get('activity_weight', 0.0),
+        'tag_weight': data.get('tag_weight', 1.0),
+        'selected_tags': getattr(user, 'selected_tags', None),
+        'profile_updated_at': profile.updated_at,
+    }
+
+
+def store_entries(entries):
+    """
+    Save computed recommendation lists, replacing the previous ones of the same users.
+
+    Parameters:
+        entries: List of compute_entry results
+    """
+    from django.db import transaction
+    from .models import PrecomputedRecommendation
+
+    if not entries:
+        return
+    with transaction.atomic():
+        PrecomputedRecommendation.objects.filter(user_id__in=[entry['user_id'] for entry in entries]).delete()
+        PrecomputedRecommendation.objects.bulk_create([PrecomputedRecommendation(**entry) for entry in entries])
+
+
+def is_fresh(entry, user, profile, limit):
+    """
+    Check whether a stored entry can be served.
+
+    Parameters:
+        entry: PrecomputedRecommendation
+        user: User
+        profile: Current UserFeatureProfile of the user
+        limit: Requested number of recommendations
+
+    Returns:
+        bool: True if the entry still reflects the user's activity and is large enough
+    """
+    max_age = getattr(settings, 'RECOMMENDATION_PRECOMPUTE_MAX_AGE', 24 * 3600)
+    return (
+        entry.size >= limit
+        and entry.profile_updated_at == profile.updated_at
+        and entry.selected_tags == getattr(user, 'selected_tags', None)
+        and timezone.now() - entry.computed_at <= timedelta(seconds=max_age)
+    )
+
+
+def reshuffle(pairs, limit):
+    """
+    Pick `limit` items from a ranked pool, mostly keeping the ranking:
+    every item moves by a random offset of up to half the limit.
+
+    Parameters:
+        pairs: Ranked [location id, similarity] pairs
+        limit: Number of items to return
+
+    Returns:
+        list: Selected pairs
+    """
+    window = max(1, limit // 2)
+    ranked = sorted(range(len(pairs)), key=lambda rank: rank + random.uniform(0, window))
+    return [pairs[rank] for rank in ranked[:limit]]
+
+
+def serve(user, profile, limit):
+    """
+    Get the precomputed recommendations of a user, if fresh.
+
+    Parameters:
+        user: User
+        profile: Current UserFeatureProfile of the user
+        limit: Maximum number of recommendations per list
+
+    Returns:
+        dict: Response data (as build_recommendations, with an empty recently viewed list), or None
+    """
+    from .models import Location, PrecomputedRecommendation
+
+    entry = PrecomputedRecommendation.objects.filter(user=user).first()
+    if entry is None or not is_fresh(entry, user, profile, limit):
+        return None
+
+    lists = {name: reshuffle(entry.lists.get(name, []), limit) for name in LIST_TYPES}
+    tag_groups = {tag: reshuffle(pairs, limit) for tag, pairs in entry.tag_groups.items()}
+
+    # One query for every location in the response
+    location_ids = {pair[0] for pairs in list(lists.values()) + list(tag_groups.values()) for pair in pairs}
+    locations = Location.objects.in_bulk(location_ids)
+
+    def expand(pairs, recommendation_type):
+        return [
+            location_to_dict(locations[location_id], similarity, recommendation_type)
+            for location_id, similarity in pairs
+            if location_id in locations
+        ]
+
+    data = {
+        "activity_weight": entry.activity_weight,
+        "tag_weight": entry.tag_weight,
+    }
+    for name, recommendation_type in LIST_TYPES.items():
+        data[name] = expand(lists[name], recommendation_type)
+    data["recently_viewed_recommendations"] = []
+    data["tag_group_recommendations"] = {tag: expand(pairs, "tag") for tag, pairs in tag_groups.items()}
+    return data
+
+
+def precompute_for_users(user_ids, size):
+    """
+    Compute the recommendation lists of several users.
+    Only reads the database (profiles must exist), so it can run in a worker
+    process while the caller writes the results with store_entries.
+
+    Parameters:
+        user_ids: User ids
+        size: Candidates computed per list
+
+    Returns:
+        list: compute_entry results
+    """
+    from django.contrib.auth import get_user_model
+    from .models import UserFeatureProfile
+
+    profiles = {profile.user_id: profile for profile in UserFeatureProfile.objects.filter(user_id__in=user_ids)}
+    entries = []
+    for user in get_user_model().objects.filter(id__in=profiles):
+        try:
+            entries.append(compute_entry(user, profiles[user.id], size))
+        except Exception as e:
+            print(f"Recommendation precomputation failed for user {user.id}: {str(e)}")
+    return entries
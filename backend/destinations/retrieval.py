@@ -0,0 +1,259 @@
+import time
+
+from django.conf import settings
+
+# Fields that hold a destination's tags
+TAG_FIELDS = ('subcategories', 'subtypes')
+
+# Supported ways of combining lexical and semantic scores
+FUSION_METHODS = ('weighted', 'rrf')
+
+
+class RetrievalPipeline:
+    """
+    Two-stage hybrid retrieval for destination search.
+
+    Stage 1 (candidate generation) collects cheap candidates from the BM25F
+    ranker, tag matches and, when the embedding matrix is available, the
+    nearest-neighbour index. The merged list is cut to the candidate budget,
+    so stage 2 (re-ranking) scores a bounded number of destinations with the
+    embedding model regardless of query length or catalogue size. Lexical and
+    semantic scores are then fused into the final ranking.
+    """
+    def __init__(self, processor, candidate_budget=None, fusion=None, lexical_weight=1.5, rrf_k=60):
+        """
+        Initialize the pipeline.
+
+        Parameters:
+            processor: NLPProcessor used for encoding and fallback similarity
+            candidate_budget: Maximum number of candidates re-ranked per query
+            fusion: Score fusion method ('weighted' or 'rrf')
+            lexical_weight: Maximum relative boost from the lexical score (weighted fusion)
+            rrf_k: Rank offset for reciprocal rank fusion
+        """
+        self.processor = processor
+        self.candidate_budget = candidate_budget or getattr(settings, 'NLP_SEARCH_CANDIDATE_BUDGET', 300)
+        self.fusion = fusion or getattr(settings, 'NLP_SEARCH_FUSION', 'weighted')
+        if self.fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method: {self.fusion}")
+        self.lexical_weight = lexical_weight
+        self.rrf_k = rrf_k
+
+    def resolve_scope(self, destinations):
+        """
+        Determine which Location ids a search may return.
+
+        Parameters:
+            destinations: QuerySet or list of destinations to search within
+
+        Returns:
+            tuple: (allowed_ids or None for the whole catalogue, {id: destination} for lists)
+        """
+        if hasattr(destinations, 'query'):
+            if destinations.query.has_filters():
+                return set(destinations.values_list('id', flat=True)), None
+            return None, None
+
+        destinations_by_id = {dest.id: dest for dest in destinations}
+        return set(destinations_by_id), destinations_by_id
+
+    def lexical_candidates(self, query, allowed_ids, limit):
+        """
+        Stage 1: BM25F candidates over all text fields.
+
+        Returns:
+            List of tuples: [(location_id, bm25_score), ...] sorted by score
+        """
+        from .bm25 import bm25_ranker
+        return bm25_ranker.search(query, limit, allowed_ids)
+
+    def tag_candidates(self, query, allowed_ids, limit):
+        """
+        Stage 1: destinations whose tags (subcategories, subtypes) match the query.
+
+        Returns:
+            List of tuples: [(location_id, bm25_score), ...] sorted by score
+        """
+        from .bm25 import bm25_ranker
+        return bm25_ranker.search(query, limit, allowed_ids, fields=TAG_FIELDS)
+
+    def semantic_candidates(self, query_vector, allowed_ids, limit):
+        """
+        Stage 1: nearest neighbours of the query in the embedding matrix.
+
+        Returns:
+            List of tuples: [(location_id, cosine_similarity), ...] sorted by similarity
+        """
+        from .location_embeddings import location_embeddings
+        return location_embeddings.search(query_vector, limit, allowed_ids)
+
+    def popular_candidates(self, destinations, allowed_ids, limit):
+        """
+        Stage 1 fallback when no other source produced candidates:
+        the most liked destinations within the search scope.
+
+        Returns:
+            list: Location ids
+        """
+        from .models import Location
+
+        if hasattr(destinations, 'query'):
+            queryset = destinations
+        else:
+            queryset = Location.objects.filter(id__in=allowed_ids)
+        return list(queryset.order_by('-likes_count', 'id').values_list('id', flat=True)[:limit])
+
+    def merge_candidates(self, ranked_lists):
+        """
+        Merge per-source candidate lists into one list cut to the candidate budget.
+        Candidates are ordered by reciprocal rank across sources, so every source
+        contributes its best candidates before any source's tail.
+
+        Parameters:
+            ranked_lists: Lists of [(location_id, score), ...] sorted by score
+
+        Returns:
+            list: Location ids
+        """
+        priorities = {}
+        for ranked in ranked_lists:
+            for rank, (location_id, _) in enumerate(ranked):
+                priorities[location_id] = priorities.get(location_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        merged = sorted(priorities, key=priorities.get, reverse=True)
+        return merged[:self.candidate_budget]
+
+    def semantic_scores(self, query, query_vector, candidate_ids, destinations_by_id):
+        """
+        Stage 2: score candidates against the query.
+        Rows of the precomputed embedding matrix are reused; candidates missing
+        from it are encoded together in one batch.
+
+        Parameters:
+            query: Search query text
+            query_vector: Normalized query embedding, or None without the embedding model
+            candidate_ids: Location ids to score
+            destinations_by_id: Loaded candidate destinations
+
+        Returns:
+            dict: {location_id: similarity}
+        """
+        from .location_embeddings import location_embeddings, build_location_text
+
+        if query_vector is None:
+            # Word overlap similarity without the embedding model
+            return {
+                location_id: self.processor.calculate_similarity_fallback(query, build_location_text(dest))
+                for location_id, dest in destinations_by_id.items()
+            }
+
+        scores = location_embeddings.score_ids(query_vector, candidate_ids) if location_embeddings.is_loaded() else {}
+
+        missing = [location_id for location_id in candidate_ids if location_id not in scores and location_id in destinations_by_id]
+        if missing:
+            vectors = self.processor.get_embeddings([build_location_text(destinations_by_id[location_id]) for location_id in missing])
+            for location_id, score in zip(missing, vectors @ query_vector):
+                scores[location_id] = float(score)
+
+        if len(query.split()) < 3:
+            # Short queries produce systematically lower cosine similarities
+            scores = {location_id: self.processor.amplify_short_query_similarity(score) for location_id, score in scores.items()}
+        return scores
+
+    def fuse(self, semantic, lexical):
+        """
+        Combine semantic and lexical scores.
+
+        Parameters:
+            semantic: {location_id: similarity}
+            lexical: {location_id: bm25_score}
+
+        Returns:
+            List of tuples: [(location_id, score), ...] sorted by score
+        """
+        if self.fusion == 'rrf':
+            fused = {}
+            for scores in (semantic, lexical):
+                ranked = sorted(scores, key=scores.get, reverse=True)
+                for rank, location_id in enumerate(ranked):
+                    fused[location_id] = fused.get(location_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            # Normalize so a destination ranked first by both sources scores 1.0
+            best = 2.0 / (self.rrf_k + 1)
+            fused = {location_id: score / best for location_id, score in fused.items() if location_id in semantic}
+        else:
+            max_lexical = max(lexical.values(), default=0.0)
+            fused = {}
+            for location_id, similarity in semantic.items():
+                lexical_score = lexical.get(location_id, 0.0)
+                if lexical_score and max_lexical:
+                    similarity *= 1 + self.lexical_weight * lexical_score / max_lexical
+                fused[location_id] = similarity
+
+        return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+    def run(self, query, destinations, top_n=10, use_embeddings=True):
+        """
+        Run both retrieval stages for a query.
+
+        Parameters:
+            query: Search query text
+            destinations: QuerySet or list of destinations to search within
+            top_n: Number of results requested (the caller truncates)
+            use_embeddings: Whether the embedding model may be used for re-ranking
+
+        Returns:
+            tuple: ([(destination, score), ...] sorted by score, {stage: milliseconds})
+        """
+        from .location_embeddings import location_embeddings
+
+        timings = {}
+        start_time = stage_start = time.time()
+
+        def lap(stage):
+            nonlocal stage_start
+            now = time.time()
+            timings[stage] = round((now - stage_start) * 1000, 2)
+            stage_start = now
+
+        allowed_ids, destinations_by_id = self.resolve_scope(destinations)
+        budget = max(self.candidate_budget, top_n)
+        lap('scope')
+
+        # Stage 1: candidate generation
+        lexical = self.lexical_candidates(query, allowed_ids, budget)
+        tags = self.tag_candidates(query, allowed_ids, budget)
+        lap('lexical')
+
+        query_vector = None
+        semantic = []
+        if use_embeddings:
+            query_vector = self.processor.get_embeddings([query])[0]
+            lap('encode')
+            try:
+                if location_embeddings.ensure_ready(self.processor.encode_texts):
+                    semantic = self.semantic_candidates(query_vector, allowed_ids, budget)
+            except Exception as e:
+                print(f"Embedding matrix unavailable, re-ranking lexical candidates only: {str(e)}")
+            lap('semantic')
+
+        candidate_ids = self.merge_candidates([semantic, lexical, tags])
+        if not candidate_ids:
+            candidate_ids = self.popular_candidates(destinations, allowed_ids, budget)
+
+        if destinations_by_id is None:
+            destinations_by_id = destinations.in_bulk(candidate_ids)
+        else:
+            destinations_by_id = {location_id: destinations_by_id[location_id] for location_id in candidate_ids if location_id in destinations_by_id}
+        lap('candidates')
+
+        # Stage 2: re-rank the candidates
+        semantic_scores = self.semantic_scores(query, query_vector, candidate_ids, destinations_by_id)
+        lap('rerank')
+
+        lexical_scores = dict(lexical)
+        ranked = self.fuse(semantic_scores, lexical_scores)
+        results = [(destinations_by_id[location_id], score) for location_id, score in ranked if location_id in destinations_by_id]
+        lap('fusion')
+
+        timings['total'] = round((time.time() - start_time) * 1000, 2)
+        print(f"Hybrid retrieval: {len(lexical)} lexical, {len(tags)} tag, {len(semantic)} semantic -> {len(candidate_ids)} candidates re-ranked")
+        return results, timings
@@ -0,0 +1,227 @@
+"""
+Background sentiment and keyword analysis of reviews.
+
+Reviews are saved with analysis_status='pending' and analyzed outside the
+request. The pending rows in the database are the queue: a worker thread in
+each server process picks them up in batches after a review is committed,
+and the process_review_queue management command drains the same queue
+(for example from cron, or after a restart).
+
+Several processes share the queue, so a batch is claimed with one
+conditional UPDATE (pending -> processing, tagged with a claim id) and each
+process only analyzes the rows it claimed. Claims of a process that died
+are released after NLP_REVIEW_CLAIM_TIMEOUT seconds.
+"""
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+# Review.analysis_status values
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def provisional_sentiment(rating):
+    """
+    Sentiment shown until the analysis has run, derived from the rating.
+
+    Parameters:
+        rating: Review rating (1-5)
+
+    Returns:
+        str: POSITIVE, NEGATIVE or NEUTRAL
+    """
+    if rating >= 4:
+        return 'POSITIVE'
+    elif rating <= 2:
+        return 'NEGATIVE'
+    return 'NEUTRAL'
+
+
+def analyze_review_rows(rows, n_process=None):
+    """
+    Analyze a batch of reviews given as plain values.
+    Has no database access, so it can run in a worker process.
+
+    Parameters:
+        rows: List of (review_id, content) tuples
+        n_process: Number of spaCy worker processes (default: NLP_SPACY_N_PROCESS)
+
+    Returns:
+        list: (review_id, sentiment, sentiment_score, keywords) tuples
+    """
+    from .review_utils import analyze_reviews
+
+    results = analyze_reviews([content for _, content in rows], n_process=n_process)
+    return [
+        (
+            review_id,
+            result.get('sentiment', 'NEUTRAL'),
+            result.get('sentiment_score', 0.5),
+            {
+                'positive_keywords': result.get('positive_keywords', []),
+                'negative_keywords': result.get('negative_keywords', [])
+            }
+        )
+        for (review_id, _), result in zip(rows, results)
+    ]
+
+
+def release_expired_claims():
+    """
+    Queue again reviews claimed by a worker that did not finish in time.
+
+    Returns:
+        int: Number of reviews released
+    """
+    from .models import Review
+
+    timeout = getattr(settings, 'NLP_REVIEW_CLAIM_TIMEOUT', 600)
+    return Review.objects.filter(
+        analysis_status=STATUS_PROCESSING,
+        analysis_claimed_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(analysis_status=STATUS_PENDING, analysis_claim=None, analysis_claimed_at=None)
+
+
+def claim_pending_reviews(size):
+    """
+    Claim a batch of pending reviews for this worker.
+    The UPDATE only matches rows that are still pending, so a review claimed
+    by another process in the meantime is not returned.
+
+    Parameters:
+        size: Maximum number of reviews
+
+    Returns:
+        list: Claimed reviews
+    """
+    from .models import Review
+
+    candidate_ids = list(
+        Review.objects.filter(analysis_status=STATUS_PENDING)
+        .order_by('id')
+        .values_list('id', flat=True)[:size]
+    )
+    if not candidate_ids:
+        return []
+
+    claim = uuid.uuid4().hex
+    claimed = Review.objects.filter(id__in=candidate_ids, analysis_status=STATUS_PENDING).update(
+        analysis_status=STATUS_PROCESSING, analysis_claim=claim, analysis_claimed_at=timezone.now()
+    )
+    if not claimed:
+        return []
+    return list(
+        Review.objects.filter(analysis_claim=claim, analysis_status=STATUS_PROCESSING)
+        .order_by('id')
+        .only('id', 'user_id', 'content', 'rating', 'updated_at', 'analysis_claim')
+    )
+
+
+def analyze_pending_reviews(batch_size=None, limit=None):
+    """
+    Analyze pending reviews in batches and write the results back in bulk.
+
+    Parameters:
+        batch_size: Number of reviews analyzed together (default: NLP_REVIEW_BATCH_SIZE)
+        limit: Optional maximum number of reviews to process
+
+    Returns:
+        int: Number of reviews processed
+    """
+    from .models import Review
+    from .user_features import rebuild_profiles
+
+    batch_size = batch_size or getattr(settings, 'NLP_REVIEW_BATCH_SIZE', 32)
+    processed = 0
+    release_expired_claims()
+
+    while limit is None or processed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - processed)
+        reviews = claim_pending_reviews(size)
+        if not reviews:
+            break
+
+        try:
+            results = analyze_review_rows([(review.id, review.content) for review in reviews])
+            for review, (_, sentiment, sentiment_score, keywords) in zip(reviews, results):
+                review.sentiment = sentiment
+                review.sentiment_score = sentiment_score
+                review.keywords = keywords
+                review.analysis_status = STATUS_DONE
+        except Exception as e:
+            print(f"Review analysis error: {str(e)}")
+            # Keep the rating-based sentiment so failed reviews are not retried forever
+            for review in reviews:
+                review.sentiment = provisional_sentiment(review.rating)
+                review.sentiment_score = 0.5
+                review.keywords = {'positive_keywords': [], 'negative_keywords': []}
+                review.analysis_status = STATUS_FAILED
+
+        # Skip reviews edited while they were being analyzed; they are pending again
+        updated_at = dict(Review.objects.filter(id__in=[review.id for review in reviews]).values_list('id', 'updated_at'))
+        reviews = [review for review in reviews if updated_at.get(review.id) == review.updated_at]
+        for review in reviews:
+            review.analysis_claim = None
+            review.analysis_claimed_at = None
+
+        Review.objects.bulk_update(reviews, ['sentiment', 'sentiment_score', 'keywords', 'analysis_status', 'analysis_claim', 'analysis_claimed_at'])
+        # bulk_update sends no signals, so recount the keyword features of the authors
+        rebuild_profiles(review.user_id for review in reviews)
+        processed += len(reviews)
+        print(f"Analyzed {len(reviews)} reviews")
+
+    return processed
+
+
+class ReviewAnalysisWorker:
+    """
+    Daemon thread that analyzes pending reviews shortly after they are saved.
+    Notifications are coalesced for a short wait so several reviews share one batch.
+    """
+    def __init__(self, batch_wait=0.5):
+        """
+        Initialize the worker (the thread starts on the first notification).
+
+        Parameters:
+            batch_wait: Seconds to wait for more reviews before analyzing a batch
+        """
+        self.batch_wait = batch_wait
+        self.wake_up = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def notify(self):
+        """
+        Signal that new reviews are pending.
+        """
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='review-analysis', daemon=True)
+                    self.thread.start()
+        self.wake_up.set()
+
+    def run(self):
+        while True:
+            self.wake_up.wait()
+            # Let more reviews arrive so they are analyzed together
+            time.sleep(self.batch_wait)
+            self.wake_up.clear()
+            try:
+                analyze_pending_reviews()
+            except Exception as e:
+                print(f"Error processing review analysis queue: {str(e)}")
+            finally:
+                close_old_connections()
+
+
+# Shared worker instance
+review_analysis_worker = ReviewAnalysisWorker()
@@ -1,6 +1,7 @@
 import re
 from collections import Counter
-from .nlp_utils import nlp_processor
+from django.conf import settings
+from .nlp_utils import nlp_processor, NLP_ADVANCED
 
 def analyze_review(review_text, rating=None):
     """
@@ -52,7 +53,50 @@ def analyze_review(review_text, rating=None):
         'meaning_units': meaning_units
     }
 
-def extract_contextual_keywords(text, sentiment, top_n=5):
+def analyze_reviews(review_texts, ratings=None, n_process=None):
+    """
+    Analyze many review texts at once.
+    Sentiment and spaCy meaning units are computed for all texts in batched
+    calls; the result for each text is the same as analyze_review.
+    
+    Parameters:
+        review_texts: List of review texts
+        ratings: Optional list of ratings aligned with review_texts
+        n_process: Number of spaCy worker processes (default: NLP_SPACY_N_PROCESS)
+        
+    Returns:
+        list: analyze_review result dictionaries aligned with review_texts
+    """
+    review_texts = list(review_texts)
+    if ratings is None:
+        ratings = [None] * len(review_texts)
+    
+    if n_process is None:
+        n_process = getattr(settings, 'NLP_SPACY_N_PROCESS', 1)
+    
+    sentiments = nlp_processor.analyze_sentiments(review_texts)
+    spacy_units_list = nlp_processor.extract_meaning_units_batch(review_texts, n_process=n_process)
+    
+    results = []
+    for review_text, rating, (sentiment, confidence), spacy_units in zip(review_texts, ratings, sentiments, spacy_units_list):
+        # Consider rating if provided (override sentiment analysis for clearer categorization)
+        if rating is not None:
+            if rating >= 4:
+                sentiment = "POSITIVE"
+            elif rating <= 2:
+                sentiment = "NEGATIVE"
+        
+        pos_keywords, neg_keywords, meaning_units = extract_contextual_keywords(review_text, sentiment, spacy_units=spacy_units)
+        results.append({
+            'sentiment': sentiment,
+            'sentiment_score': float(confidence),
+            'positive_keywords': pos_keywords,
+            'negative_keywords': neg_keywords,
+            'meaning_units': meaning_units
+        })
+    return results
+
+def extract_contextual_keywords(text, sentiment, top_n=5, spacy_units=None):
     """
     Extract important keywords from text, separating by positive/negative context.
     Now with spaCy integration for advanced meaning unit extraction.
@@ -61,6 +105,7 @@ def extract_contextual_keywords(text, sentiment, top_n=5):
         text: Text to extract keywords from
         sentiment: Sentiment classification to help separate keywords
         top_n: Number of keywords to return (default: 5)
+        spacy_units: Meaning units already extracted for text (extracted here if omitted)
         
     Returns:
         tuple: (positive_keywords, negative_keywords, meaning_units)
@@ -80,6 +125,7 @@ def extract_contextual_keywords(text, sentiment, top_n=5):
         # 1. Regular keyword extraction (keep existing functionality)
         # Preprocess text with improved tokenization
         tokens = nlp_processor.preprocess_text(text, filter_adverbs=True)
+        token_set = set(tokens)
         
         # Separate words by context
         negation_words = {'no', 'not', 'never', 'nothing', 'nowhere', 'none', 'neither', 'nor', 'barely', 'hardly', 'rarely', 'seldom', 'lack', 'missing', 'empty'}
@@ -94,7 +140,7 @@ def extract_contextual_keywords(text, sentiment, top_n=5):
                 negation_context = True
                 # Look ahead for content words (nouns, adjectives)
                 for j in range(i+1, min(i+4, len(words))):
-                    if j < len(words) and words[j] in tokens and words[j] not in negation_words:
+                    if j < len(words) and words[j] in token_set and words[j] not in negation_words:
                         negative_tokens.append(words[j])
         
         # Categorize remaining tokens
@@ -114,7 +160,8 @@ def extract_contextual_keywords(text, sentiment, top_n=5):
         meaning_units = {}
         
         # Use spaCy to extract advanced meaning units
-        spacy_units = nlp_processor.extract_meaning_units(text)
+        if spacy_units is None:
+            spacy_units = nlp_processor.extract_meaning_units(text)
         
         # Categorize meaning units based on sentiment
         positive_meaning_units = []
@@ -182,6 +229,7 @@ def find_similar_destinations(keywords, user_id, limit=10, exclude_location_ids=
         list: List of tuples containing (location, similarity_score) sorted by similarity
     """
     from .models import Location, Like, Review
+    from .bitmap_index import Bitmap
     
     # Return empty list if no keywords
     if not keywords and not avoid_keywords:
@@ -214,12 +262,16 @@ def find_similar_destinations(keywords, user_id, limit=10, exclude_location_ids=
     # Get all locations
     all_locations = Location.objects.all()
     
-    # Get list of location IDs the user has already liked
-    liked_location_ids = Like.objects.filter(user_id=user_id).values_list('location_id', flat=True)
+    # Exclude the locations the user has already liked and the given locations (one bitmap)
+    excluded_ids = Bitmap(Like.objects.filter(user_id=user_id).values_list('location_id', flat=True))
+    if exclude_location_ids:
+        excluded_ids |= Bitmap(exclude_location_ids)
     
-    # Initialize exclude_location_ids as empty list if None
-    if exclude_location_ids is None:
-        exclude_location_ids = []
+    # Encode the positive and avoid queries together in one batch;
+    # both searches below then find their query embedding in the cache
+    avoid_query = ' '.join(avoid_keywords) if avoid_keywords else ""
+    if NLP_ADVANCED and (query or avoid_query):
+        nlp_processor.get_embeddings([text for text in (query, avoid_query) if text])
     
     # Perform NLP search with positive keywords
     search_results = []
@@ -232,7 +284,6 @@ def find_similar_destinations(keywords, user_id, limit=10, exclude_location_ids=
     
     # Filter out destinations that match avoid_keywords
     if avoid_keywords and len(avoid_keywords) > 0:
-        avoid_query = ' '.join(avoid_keywords)
         print(f"Avoiding destinations similar to keywords: {avoid_query}")
         
         # Find destinations to avoid
@@ -246,13 +297,13 @@ def find_similar_destinations(keywords, user_id, limit=10, exclude_location_ids=
         avoid_location_ids = {loc.id for loc, _ in avoid_results if _ > 0.2}  # Only exclude with similarity > 0.2
         print(f"Excluding {len(avoid_location_ids)} destinations matching negative keywords")
         
-        # Add to exclude list
-        exclude_location_ids.extend(avoid_location_ids)
+        # Add to exclusions
+        excluded_ids |= Bitmap(avoid_location_ids)
     
     # Filter results
     filtered_results = []
     for loc, similarity in search_results:
-        if loc.id not in liked_location_ids and loc.id not in exclude_location_ids:
+        if loc.id not in excluded_ids:
             filtered_results.append((loc, similarity))
             
     return filtered_results[:limit] 
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Shared search result cache.
+
+Results of NLP destination searches are stored through Django's cache
+framework (the NLP_SEARCH_CACHE_ALIAS cache), so every worker process shares
+the same entries and, with a file or Redis backend, they survive restarts.
+Only Location ids and scores are cached; destinations are loaded from the
+database when a cached result is used.
+
+Keys include a catalogue version that is bumped whenever locations change,
+so stale results are never served after an import or edit.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+CATALOGUE_VERSION_KEY = 'nlp-search:catalogue-version'
+
+
+def get_cache():
+    """
+    Get the Django cache backend used for search results.
+
+    Returns:
+        BaseCache: Configured cache backend
+    """
+    return caches[getattr(settings, 'NLP_SEARCH_CACHE_ALIAS', 'default')]
+
+
+def normalize_query(query):
+    """
+    Normalize a query so trivially different spellings share a cache entry.
+
+    Parameters:
+        query: Search query text
+
+    Returns:
+        str: Lowercased query with collapsed whitespace
+    """
+    return re.sub(r"\s+", " ", query or "").strip().lower()
+
+
+def catalogue_version():
+    """
+    Get the current catalogue version (starts at 1).
+
+    Returns:
+        int: Catalogue version
+    """
+    cache = get_cache()
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOGUE_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalogue_version():
+    """
+    Invalidate all cached search results by moving to a new catalogue version.
+    """
+    cache = get_cache()
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        # Key missing (first change or evicted)
+        cache.set(CATALOGUE_VERSION_KEY, catalogue_version() + 1, timeout=None)
+
+
+def cache_key(query, limit, version=None):
+    """
+    Build the cache key for a search.
+
+    Parameters:
+        query: Search query text
+        limit: Number of results requested
+        version: Catalogue version (default: current version)
+
+    Returns:
+        str: Cache key
+    """
+    if version is None:
+        version = catalogue_version()
+    digest = hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()
+    return f"nlp-search:v{version}:{limit}:{digest}"
+
+
+def get_results(query, limit):
+    """
+    Look up cached search results.
+
+    Parameters:
+        query: Search query text
+        limit: Number of results requested
+
+    Returns:
+        List of tuples: [(location_id, score), ...] or None if not cached
+    """
+    try:
+        return get_cache().get(cache_key(query, limit))
+    except Exception as e:
+        print(f"Error reading search cache: {str(e)}")
+        return None
+
+
+def set_results(query, limit, results):
+    """
+    Store search results.
+
+    Parameters:
+        query: Search query text
+        limit: Number of results requested
+        results: List of tuples [(destination, score), ...]
+    """
+    entries = [(dest.id, float(score)) for dest, score in results]
+    try:
+        get_cache().set(cache_key(query, limit), entries, timeout=getattr(settings, 'NLP_SEARCH_CACHE_TTL', 3600))
+    except Exception as e:
+        print(f"Error writing search cache: {str(e)}")
+
+
+def invalidate(query, limit):
+    """
+    Remove the cached results of one search.
+
+    Parameters:
+        query: Search query text
+        limit: Number of results requested
+
+    Returns:
+        bool: True if an entry was removed
+    """
+    return bool(get_cache().delete(cache_key(query, limit)))
+
+
+def load_results(entries, destinations):
+    """
+    Turn cached (id, score) entries back into (destination, score) tuples.
+    Destinations that no longer exist are skipped.
+
+    Parameters:
+        entries: List of tuples [(location_id, score), ...]
+        destinations: QuerySet of destinations to load from
+
+    Returns:
+        List of tuples: [(destination, score), ...] in cached order
+    """
+    destinations_by_id = destinations.in_bulk([location_id for location_id, _ in entries])
+    return [(destinations_by_id[location_id], score) for location_id, score in entries if location_id in destinations_by_id]
@@ -0,0 +1,87 @@
+"""
+Buffered search query statistics.
+
+Searches only increment an in-memory counter. A daemon thread in each server
+process adds the buffered counts to the SearchQuery table every
+NLP_SEARCH_QUERY_FLUSH_INTERVAL seconds (and once more at exit), so the
+search path never writes to the database.
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .search_cache import normalize_query
+
+
+class SearchQueryBuffer:
+    """
+    In-memory search counts, flushed periodically to SearchQuery.
+    """
+    def __init__(self, flush_interval=None):
+        """
+        Initialize the buffer (the flush thread starts on the first search).
+
+        Parameters:
+            flush_interval: Seconds between flushes (default: NLP_SEARCH_QUERY_FLUSH_INTERVAL)
+        """
+        self.flush_interval = flush_interval or getattr(settings, 'NLP_SEARCH_QUERY_FLUSH_INTERVAL', 30)
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, query):
+        """
+        Count one search for a query.
+
+        Parameters:
+            query: Search query text
+        """
+        query = normalize_query(query)[:255]
+        if not query:
+            return
+        with self.lock:
+            self.counts[query] += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='search-query-stats', daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def flush(self):
+        """
+        Write the buffered counts to the database.
+
+        Returns:
+            int: Number of distinct queries written
+        """
+        from .models import SearchQuery
+
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+        if not counts:
+            return 0
+
+        try:
+            SearchQuery.record_counts(counts)
+        except Exception as e:
+            print(f"Error recording search queries: {str(e)}")
+            # Keep the counts for the next flush
+            with self.lock:
+                self.counts.update(counts)
+            return 0
+        return len(counts)
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+# Shared buffer instance
+search_query_buffer = SearchQueryBuffer()
@@ -13,7 +13,7 @@ class LocationSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Location
-        fields = '__all__'  # 🔹 Include all fields (including likes_count)
+        exclude = ['content_hash', 'primary_subcategory']  # 🔹 Include all fields (including likes_count) except import bookkeeping
 
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -83,8 +83,8 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = ['id', 'user', 'author_id', 'location', 'location_id', 'location_name', 
                  'username', 'author_profile_image', 'rating', 'content', 'sentiment', 
-                 'keywords', 'created_at', 'updated_at']
-        read_only_fields = ['user', 'location', 'sentiment', 'created_at', 'updated_at']
+                 'keywords', 'analysis_status', 'created_at', 'updated_at']
+        read_only_fields = ['user', 'location', 'sentiment', 'analysis_status', 'created_at', 'updated_at']
     
     def get_location_name(self, obj):
         """
@@ -217,7 +217,7 @@ class LocationDetailSerializer(LocationSerializer):
     
     class Meta:
         model = Location
-        fields = '__all__'
+        exclude = ['content_hash', 'primary_subcategory']
     
     def get_reviews_count(self, obj):
         """
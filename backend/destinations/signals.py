@@ -0,0 +1,116 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Location, Like, Review, UserFeatureProfile
+from . import catalogue, user_features
+
+# Saves that only touch these fields do not affect search indexes
+NON_INDEXED_FIELDS = {'likes_count'}
+
+# Signal handler to refresh search indexes when a location is created or edited
+@receiver(post_save, sender=Location)
+def location_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Marks the saved location as changed so derived search indexes are refreshed.
+
+    Args:
+        sender: The Location model class
+        instance: The saved Location instance
+        created: Boolean indicating if this is a new Location
+        update_fields: Fields passed to save(), if any
+    """
+    # Like counter updates happen on every like and do not change indexed content
+    if update_fields and set(update_fields) <= NON_INDEXED_FIELDS:
+        return
+
+    catalogue.locations_changed([instance.pk])
+
+# Signal handler to drop deleted locations from search indexes
+@receiver(post_delete, sender=Location)
+def location_deleted(sender, instance, **kwargs):
+    """
+    Removes the deleted location from derived search indexes.
+
+    Args:
+        sender: The Location model class
+        instance: The deleted Location instance
+    """
+    catalogue.locations_deleted([instance.pk])
+
+# Signal handlers keeping per-user recommendation features up to date
+@receiver(post_save, sender=Like)
+def like_saved(sender, instance, created, **kwargs):
+    """
+    Adds a new like to the user's feature profile.
+
+    Args:
+        sender: The Like model class
+        instance: The saved Like instance
+        created: Boolean indicating if this is a new Like
+    """
+    if created:
+        user_features.like_added(instance)
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    """
+    Removes a deleted like from the user's feature profile.
+
+    Args:
+        sender: The Like model class
+        instance: The deleted Like instance
+    """
+    try:
+        location = instance.location
+    except Location.DoesNotExist:
+        # The liked location is gone; recount from the remaining likes
+        user_features.rebuild_profiles([instance.user_id])
+        return
+    user_features.like_removed(instance, location)
+
+@receiver(pre_save, sender=Review)
+def review_saving(sender, instance, **kwargs):
+    """
+    Remembers the feature contribution of an edited review before it changes.
+
+    Args:
+        sender: The Review model class
+        instance: The Review instance about to be saved
+    """
+    instance._previous_features = None
+    if instance.pk is None or not UserFeatureProfile.objects.filter(user_id=instance.user_id).exists():
+        return
+    previous = Review.objects.select_related('location').filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._previous_features = user_features.review_features_of(previous)
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    """
+    Adds a new or edited review to the user's feature profile.
+
+    Args:
+        sender: The Review model class
+        instance: The saved Review instance
+        created: Boolean indicating if this is a new Review
+    """
+    previous_features = getattr(instance, '_previous_features', None)
+    if not created and previous_features is None:
+        # No profile existed before the edit, nothing to update incrementally
+        return
+    user_features.review_saved(instance, previous_features)
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """
+    Removes a deleted review from the user's feature profile.
+
+    Args:
+        sender: The Review model class
+        instance: The deleted Review instance
+    """
+    try:
+        features = user_features.review_features_of(instance)
+    except Location.DoesNotExist:
+        user_features.rebuild_profiles([instance.user_id])
+        return
+    user_features.review_deleted(instance, features)
@@ -0,0 +1,474 @@
+import heapq
+import threading
+import time
+
+# NumPy is required for the spatial index
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Mean Earth radius (km)
+EARTH_RADIUS_KM = 6371.0
+
+
+def unit_vectors(latitudes, longitudes):
+    """
+    Convert coordinates to points on the unit sphere.
+    Straight-line (chord) distance between these points grows monotonically
+    with great-circle distance, so a Euclidean tree can answer distance queries.
+
+    Parameters:
+        latitudes: Array of latitudes in degrees
+        longitudes: Array of longitudes in degrees
+
+    Returns:
+        ndarray: (n, 3) float64 array
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def km_to_chord(distance_km):
+    """
+    Convert a great-circle distance to the chord length on the unit sphere.
+    """
+    angle = min(max(distance_km, 0.0) / EARTH_RADIUS_KM, np.pi)
+    return 2.0 * np.sin(angle / 2.0)
+
+
+def haversine_km(lat, lon, latitudes, longitudes):
+    """
+    Vectorized haversine distance from one coordinate to many.
+
+    Parameters:
+        lat, lon: Origin coordinate in degrees
+        latitudes, longitudes: Arrays of coordinates in degrees
+
+    Returns:
+        ndarray: Distances in kilometers
+    """
+    lat1 = np.radians(lat)
+    lat2 = np.radians(latitudes)
+    dlat = lat2 - lat1
+    dlon = np.radians(longitudes) - np.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class SpatialTree:
+    """
+    Immutable k-d tree over location coordinates.
+
+    Coordinates are stored as 3-D unit vectors, which avoids special cases at
+    the antimeridian and the poles. Each tree node keeps the bounding box of
+    its points, so a radius query only visits the nodes that intersect the
+    search sphere: O(log n + k) for k results instead of a scan of the table.
+
+    Category and subcategory filters are pushed into the tree: every node
+    records which values occur below it, so subtrees without a matching
+    location are skipped entirely.
+
+    A tree is never modified after it is built; SpatialIndex replaces the
+    whole tree when locations change, so queries need no lock.
+    """
+    def __init__(self, rows, leaf_size=32):
+        """
+        Build the tree from (id, latitude, longitude[, category, subcategories]) rows.
+
+        Parameters:
+            rows: List of tuples
+            leaf_size: Maximum number of points in a leaf node
+        """
+        self.leaf_size = leaf_size
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        latitudes = np.array([row[1] for row in rows], dtype=np.float64)
+        longitudes = np.array([row[2] for row in rows], dtype=np.float64)
+        points = unit_vectors(latitudes, longitudes) if len(rows) else np.zeros((0, 3))
+        category_codes, point_categories = self.attribute_flags([[row[3]] if len(row) > 3 else [] for row in rows])
+        subcategory_codes, point_subcategories = self.attribute_flags([row[4] if len(row) > 4 else [] for row in rows])
+
+        order = np.arange(len(rows))
+        starts, ends, lefts, rights, mins, maxs = [], [], [], [], [], []
+
+        def add_node(start, end):
+            node_points = points[order[start:end]]
+            starts.append(start)
+            ends.append(end)
+            lefts.append(-1)
+            rights.append(-1)
+            mins.append(node_points.min(axis=0) if end > start else np.zeros(3))
+            maxs.append(node_points.max(axis=0) if end > start else np.zeros(3))
+            return len(starts) - 1
+
+        stack = [add_node(0, len(rows))]
+        while stack:
+            node = stack.pop()
+            start, end = starts[node], ends[node]
+            if end - start <= self.leaf_size:
+                continue
+
+            # Split at the median of the widest dimension
+            dimension = int(np.argmax(maxs[node] - mins[node]))
+            middle = (start + end) // 2
+            segment = order[start:end]
+            partition = np.argpartition(points[segment, dimension], middle - start)
+            order[start:end] = segment[partition]
+
+            lefts[node] = add_node(start, middle)
+            rights[node] = add_node(middle, end)
+            stack.extend((lefts[node], rights[node]))
+
+        self.ids = ids[order]
+        self.latitudes = latitudes[order]
+        self.longitudes = longitudes[order]
+        self.points = points[order]
+        self.node_start = np.array(starts, dtype=np.int64)
+        self.node_end = np.array(ends, dtype=np.int64)
+        self.node_left = np.array(lefts, dtype=np.int64)
+        self.node_right = np.array(rights, dtype=np.int64)
+        self.node_min = np.array(mins, dtype=np.float64).reshape(-1, 3)
+        self.node_max = np.array(maxs, dtype=np.float64).reshape(-1, 3)
+
+        self.category_codes = category_codes
+        self.subcategory_codes = subcategory_codes
+        self.point_categories = point_categories[order]
+        self.point_subcategories = point_subcategories[order]
+        self.node_categories = self.node_flags(self.point_categories)
+        self.node_subcategories = self.node_flags(self.point_subcategories)
+
+        # Shared between threads: make accidental writes fail loudly
+        for array in (self.ids, self.latitudes, self.longitudes, self.points, self.node_start, self.node_end,
+                      self.node_left, self.node_right, self.node_min, self.node_max, self.point_categories,
+                      self.point_subcategories, self.node_categories, self.node_subcategories):
+            array.flags.writeable = False
+
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def attribute_flags(values_per_row):
+        """
+        Encode per-row attribute values as a boolean matrix.
+
+        Parameters:
+            values_per_row: List of value lists (one per row)
+
+        Returns:
+            tuple: ({lowercased value: column}, (rows, values) bool array)
+        """
+        codes = {}
+        values_per_row = [[values] if isinstance(values, str) else values or [] for values in values_per_row]
+        for values in values_per_row:
+            for value in values:
+                if isinstance(value, str) and value:
+                    codes.setdefault(value.lower(), len(codes))
+
+        flags = np.zeros((len(values_per_row), len(codes)), dtype=bool)
+        for row, values in enumerate(values_per_row):
+            for value in values:
+                if isinstance(value, str) and value:
+                    flags[row, codes[value.lower()]] = True
+        return codes, flags
+
+    def node_flags(self, point_flags):
+        """
+        Summarize point flags per node (the values present anywhere in the subtree).
+        Children are always created after their parent, so nodes are combined bottom-up.
+        """
+        flags = np.zeros((len(self.node_start), point_flags.shape[1]), dtype=bool)
+        for node in range(len(self.node_start) - 1, -1, -1):
+            if self.node_left[node] < 0:
+                flags[node] = point_flags[self.node_start[node]:self.node_end[node]].any(axis=0)
+            else:
+                flags[node] = flags[self.node_left[node]] | flags[self.node_right[node]]
+        return flags
+
+    def filter_columns(self, category=None, subcategory=None):
+        """
+        Resolve filter values to flag matrix columns.
+
+        Parameters:
+            category: Optional category (case-insensitive)
+            subcategory: Optional subcategory (case-insensitive)
+
+        Returns:
+            tuple: (category column, subcategory column); None for no filter, -1 for an unknown value
+        """
+        category_column = None if not category else self.category_codes.get(category.lower(), -1)
+        subcategory_column = None if not subcategory else self.subcategory_codes.get(subcategory.lower(), -1)
+        return category_column, subcategory_column
+
+    def node_matches(self, node, category_column, subcategory_column):
+        if category_column is not None and not self.node_categories[node, category_column]:
+            return False
+        if subcategory_column is not None and not self.node_subcategories[node, subcategory_column]:
+            return False
+        return True
+
+    def leaf_points(self, node, category_column, subcategory_column):
+        """
+        Positions of a leaf's points that pass the filters.
+        """
+        positions = np.arange(self.node_start[node], self.node_end[node])
+        if category_column is not None:
+            positions = positions[self.point_categories[positions, category_column]]
+        if subcategory_column is not None:
+            positions = positions[self.point_subcategories[positions, subcategory_column]]
+        return positions
+
+    def box_distance(self, node, point):
+        """
+        Smallest chord distance from a point to a node's bounding box.
+        """
+        gap = np.maximum(0.0, np.maximum(self.node_min[node] - point, point - self.node_max[node]))
+        return float(np.sqrt(gap @ gap))
+
+    def within(self, latitude, longitude, radius_km, limit=None, category=None, subcategory=None):
+        """
+        Find locations within a radius, closest first.
+
+        Parameters:
+            latitude, longitude: Search center in degrees
+            radius_km: Search radius in kilometers
+            limit: Optional maximum number of results
+            category: Optional category filter (case-insensitive)
+            subcategory: Optional subcategory filter (case-insensitive)
+
+        Returns:
+            List of tuples: [(location_id, distance_km), ...] sorted by distance
+        """
+        category_column, subcategory_column = self.filter_columns(category, subcategory)
+        if not len(self) or category_column == -1 or subcategory_column == -1:
+            return []
+
+        point = unit_vectors([latitude], [longitude])[0]
+        # Small tolerance so points exactly on the radius are not pruned by rounding
+        chord = km_to_chord(radius_km) + 1e-12
+
+        # Collect the point ranges of leaves that intersect the search sphere
+        ranges = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if not self.node_matches(node, category_column, subcategory_column) or self.box_distance(node, point) > chord:
+                continue
+            if self.node_left[node] < 0:
+                ranges.append(self.leaf_points(node, category_column, subcategory_column))
+            else:
+                stack.extend((self.node_left[node], self.node_right[node]))
+        if not ranges:
+            return []
+
+        candidates = np.concatenate(ranges)
+        distances = haversine_km(latitude, longitude, self.latitudes[candidates], self.longitudes[candidates])
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+
+        # Top-k selection before sorting
+        if limit is not None and len(distances) > limit:
+            top = np.argpartition(distances, limit - 1)[:limit] if limit > 0 else np.array([], dtype=np.int64)
+            candidates, distances = candidates[top], distances[top]
+        order = np.argsort(distances, kind='stable')
+        return [(int(self.ids[i]), float(d)) for i, d in zip(candidates[order], distances[order])]
+
+    def nearest(self, latitude, longitude, k, max_distance_km=None, category=None, subcategory=None):
+        """
+        Find the k closest locations, optionally filtered, in distance order.
+        Nodes are visited best-first by their distance to the search point, so
+        the search stops as soon as k results are certain, without scanning
+        the remaining locations.
+
+        Parameters:
+            latitude, longitude: Search point in degrees
+            k: Number of locations to return
+            max_distance_km: Optional maximum distance
+            category: Optional category filter (case-insensitive)
+            subcategory: Optional subcategory filter (case-insensitive)
+
+        Returns:
+            List of tuples: [(location_id, distance_km), ...] sorted by distance
+        """
+        category_column, subcategory_column = self.filter_columns(category, subcategory)
+        if not len(self) or k <= 0 or category_column == -1 or subcategory_column == -1:
+            return []
+
+        point = unit_vectors([latitude], [longitude])[0]
+        max_chord = km_to_chord(max_distance_km) + 1e-12 if max_distance_km is not None else np.inf
+
+        # Heap of (chord distance, is_node, position or node); points are popped in distance order
+        heap = [(self.box_distance(0, point), 1, 0)]
+        found = []
+        while heap and len(found) < k:
+            distance, is_node, item = heapq.heappop(heap)
+            if distance > max_chord:
+                break
+            if not is_node:
+                found.append(item)
+                continue
+            if not self.node_matches(item, category_column, subcategory_column):
+                continue
+            if self.node_left[item] < 0:
+                positions = self.leaf_points(item, category_column, subcategory_column)
+                chords = np.linalg.norm(self.points[positions] - point, axis=1)
+                for position, chord in zip(positions.tolist(), chords.tolist()):
+                    heapq.heappush(heap, (chord, 0, position))
+            else:
+                for child in (self.node_left[item], self.node_right[item]):
+                    heapq.heappush(heap, (self.box_distance(child, point), 1, int(child)))
+
+        if not found:
+            return []
+        found = np.array(found, dtype=np.int64)
+        distances = haversine_km(latitude, longitude, self.latitudes[found], self.longitudes[found])
+        return [(int(location_id), float(distance)) for location_id, distance in zip(self.ids[found], distances)]
+
+
+class SpatialIndex:
+    """
+    Holds the current SpatialTree of all locations with coordinates.
+
+    Readers take the current tree once per query, so a query always sees one
+    consistent tree. After locations change, a new tree is built in a
+    background thread and swapped in with a single assignment; queries keep
+    using the previous tree meanwhile (the view skips deleted ids). Changes
+    made by other processes are detected through the shared catalogue version.
+    """
+    def __init__(self, leaf_size=32, version_check_interval=30):
+        """
+        Initialize an empty index (built on first query or during warm-up).
+
+        Parameters:
+            leaf_size: Maximum number of points in a leaf node
+            version_check_interval: Seconds between checks of the shared catalogue version
+        """
+        self.leaf_size = leaf_size
+        self.version_check_interval = version_check_interval
+        self.tree = None
+        self.dirty = False
+        self.version = None  # Catalogue version of the tree (None for trees built from given rows)
+        self.version_checked_at = 0
+        self.rebuild_thread = None
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        tree = self.tree
+        return 0 if tree is None else len(tree)
+
+    def build(self):
+        """
+        Build a new tree from all locations with coordinates and swap it in.
+        """
+        from .models import Location
+        from . import search_cache
+
+        start_time = time.time()
+        with self.lock:
+            # Changes reported while loading are picked up by the next rebuild
+            self.dirty = False
+        version = search_cache.catalogue_version()
+        rows = list(
+            Location.objects.filter(latitude__isnull=False, longitude__isnull=False)
+            .values_list('id', 'latitude', 'longitude', 'category', 'subcategories')
+            .iterator(chunk_size=5000)
+        )
+        tree = self.build_from_rows(rows)
+        self.version = version
+        self.version_checked_at = time.time()
+        print(f"Spatial index built: {len(tree)} locations, {len(tree.node_start)} nodes ({time.time() - start_time:.2f} seconds)")
+
+    def build_from_rows(self, rows):
+        """
+        Build a new tree from (id, latitude, longitude[, category, subcategories]) rows and swap it in.
+
+        Parameters:
+            rows: List of tuples
+
+        Returns:
+            SpatialTree: The new tree
+        """
+        tree = SpatialTree(rows, leaf_size=self.leaf_size)
+        self.tree = tree
+        return tree
+
+    def mark_dirty(self, location_ids):
+        self.dirty = True
+
+    def mark_deleted(self, location_ids):
+        self.dirty = True
+
+    def catalogue_changed(self):
+        """
+        Check the shared catalogue version, at most every version_check_interval seconds.
+
+        Returns:
+            bool: True if another process changed the catalogue since the tree was built
+        """
+        from . import search_cache
+
+        if self.version is None or time.time() - self.version_checked_at < self.version_check_interval:
+            return False
+        self.version_checked_at = time.time()
+        return search_cache.catalogue_version() != self.version
+
+    def background_rebuild(self):
+        """
+        Rebuild the tree in a background thread (see schedule_rebuild).
+        """
+        from django.db import connection
+
+        try:
+            self.build()
+        except Exception as e:
+            print(f"Error rebuilding spatial index: {str(e)}")
+        finally:
+            connection.close()
+
+    def schedule_rebuild(self):
+        """
+        Rebuild the tree in a background thread, unless one is already running.
+        """
+        with self.lock:
+            if self.rebuild_thread is not None and self.rebuild_thread.is_alive():
+                return
+            self.rebuild_thread = threading.Thread(target=self.background_rebuild, name='spatial-index-rebuild', daemon=True)
+            self.rebuild_thread.start()
+
+    def ensure_ready(self):
+        """
+        Return the current tree. The first tree is built in the calling thread
+        (normally during warm-up); later changes, including those of other
+        processes, are applied in the background.
+
+        Returns:
+            SpatialTree: Tree to query
+        """
+        tree = self.tree
+        if tree is None:
+            with self.lock:
+                if self.tree is None:
+                    self.build()
+                tree = self.tree
+        elif self.dirty or self.catalogue_changed():
+            self.schedule_rebuild()
+        return tree
+
+    def within(self, latitude, longitude, radius_km, limit=None, category=None, subcategory=None):
+        """
+        Find locations within a radius, closest first (see SpatialTree.within).
+        """
+        return self.ensure_ready().within(latitude, longitude, radius_km, limit=limit, category=category, subcategory=subcategory)
+
+    def nearest(self, latitude, longitude, k, max_distance_km=None, category=None, subcategory=None):
+        """
+        Find the k closest locations, optionally filtered (see SpatialTree.nearest).
+        """
+        return self.ensure_ready().nearest(latitude, longitude, k, max_distance_km=max_distance_km, category=category, subcategory=subcategory)
+
+
+# Shared index instance
+spatial_index = SpatialIndex()
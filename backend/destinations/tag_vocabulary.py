@@ -0,0 +1,176 @@
+import re
+import threading
+import time
+
+NON_WORD_PATTERN = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_tag(tag):
+    """
+    Normalize a tag for matching: lowercase, '&' spelled as 'and', punctuation collapsed.
+
+    Parameters:
+        tag: Tag text
+
+    Returns:
+        str: Normalized tag (e.g. 'Food & Drink' -> 'food and drink')
+    """
+    tag = (tag or '').lower().replace('&', ' and ')
+    return NON_WORD_PATTERN.sub(' ', tag).strip()
+
+
+def tag_trigrams(normalized):
+    """
+    Get the trigrams of a normalized tag, padded so short tags have trigrams too.
+
+    Parameters:
+        normalized: Normalized tag
+
+    Returns:
+        set: Trigrams
+    """
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TagVocabulary:
+    """
+    Cached set of browseable destination tags (primary subcategories).
+
+    The distinct tag list is loaded once and reused until the catalogue
+    changes: it is invalidated through the catalogue hooks in this process,
+    and by the shared catalogue version (bumped by imports in other
+    processes). Normalized forms are kept in a dict and a trigram index
+    resolves misspelled or partial tags without comparing against every tag.
+    """
+    def __init__(self, min_similarity=0.3, version_check_interval=30):
+        """
+        Initialize an empty vocabulary (loaded lazily).
+
+        Parameters:
+            min_similarity: Minimum trigram similarity for a fuzzy match
+            version_check_interval: Seconds between checks of the shared catalogue version
+        """
+        self.min_similarity = min_similarity
+        self.version_check_interval = version_check_interval
+
+        self.tag_list = None  # Sorted tags
+        self.tag_set = set()
+        self.normalized = {}  # normalized tag -> tag
+        self.trigram_index = {}  # trigram -> set of normalized tags
+
+        self.stale = False
+        self.version = None
+        self.version_checked_at = 0
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Load the distinct tags from the database and rebuild the lookup structures.
+        """
+        from .models import Location
+        from . import search_cache
+
+        version = search_cache.catalogue_version()
+        tags = Location.primary_subcategory_tags()
+
+        normalized = {}
+        trigram_index = {}
+        for tag in tags:
+            key = normalize_tag(tag)
+            # Keep the first spelling if two tags normalize the same way
+            if key in normalized:
+                continue
+            normalized[key] = tag
+            for trigram in tag_trigrams(key):
+                trigram_index.setdefault(trigram, set()).add(key)
+
+        self.tag_list = tags
+        self.tag_set = set(tags)
+        self.normalized = normalized
+        self.trigram_index = trigram_index
+        self.version = version
+        self.version_checked_at = time.time()
+        self.stale = False
+
+    def invalidate(self):
+        """
+        Mark the cached vocabulary as outdated (reloaded on next use).
+        """
+        self.stale = True
+
+    def ensure_loaded(self):
+        """
+        Load the vocabulary on first use, or when another process changed the catalogue.
+        """
+        from . import search_cache
+
+        with self.lock:
+            if self.tag_list is None or self.stale:
+                self.load()
+                return
+            if time.time() - self.version_checked_at >= self.version_check_interval:
+                self.version_checked_at = time.time()
+                if search_cache.catalogue_version() != self.version:
+                    self.load()
+
+    def tags(self):
+        """
+        Get the distinct tags.
+
+        Returns:
+            list: Sorted tag names
+        """
+        self.ensure_loaded()
+        return self.tag_list
+
+    def resolve(self, tag, fuzzy=True):
+        """
+        Resolve user input to a known tag.
+        Tries an exact match, then the normalized form (case, '&'/'and',
+        punctuation), then (if fuzzy) partial matches and trigram similarity.
+
+        Parameters:
+            tag: Tag text from the user
+            fuzzy: Allow partial and similar matches
+
+        Returns:
+            str: Known tag, or None if nothing matches
+        """
+        self.ensure_loaded()
+
+        if tag in self.tag_set:
+            return tag
+
+        key = normalize_tag(tag)
+        if key in self.normalized:
+            return self.normalized[key]
+        if not fuzzy or not key:
+            return None
+
+        # Candidates share at least one trigram with the input
+        query_trigrams = tag_trigrams(key)
+        shared = {}
+        for trigram in query_trigrams:
+            for candidate in self.trigram_index.get(trigram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        # A tag contained in the input (or the other way round) wins, first in tag order
+        partial = [candidate for candidate in shared if key in candidate or candidate in key]
+        if partial:
+            return min(self.normalized[candidate] for candidate in partial)
+
+        if not shared:
+            return None
+
+        # Otherwise the most similar tag (Jaccard similarity of trigram sets), ties in tag order
+        similarities = {
+            candidate: count / len(query_trigrams | tag_trigrams(candidate))
+            for candidate, count in shared.items()
+        }
+        best = min(similarities, key=lambda candidate: (-similarities[candidate], self.normalized[candidate]))
+        return self.normalized[best] if similarities[best] >= self.min_similarity else None
+
+
+# Shared vocabulary instance
+tag_vocabulary = TagVocabulary()
@@ -1,3 +1,982 @@
-from django.test import TestCase
+import hashlib
+import io
+import math
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from destinations.ann_index import ExactIndex, IVFIndex, HNSWIndex, HNSWLIB_AVAILABLE
+from destinations.bitmap_index import ARRAY_CONTAINER_MAX, Bitmap
+from destinations.bm25 import FIELDS, BM25FPostings, BM25FRanker, location_field_texts
+from destinations.item_neighbors import refresh_neighbors
+from destinations.keyword_index import KeywordIndex
+from destinations.location_import import import_file
+from destinations.location_embeddings import LocationEmbeddingMatrix, build_location_text
+from destinations.models import Like, Location, LocationNeighbors, PrecomputedRecommendation, Review, SearchQuery, UserFeatureProfile
+from destinations.nlp_utils import LRUCache
+from destinations import recommendation_store
+from destinations.review_analysis import analyze_pending_reviews, claim_pending_reviews, release_expired_claims
+from destinations.search_stats import SearchQueryBuffer
+from destinations.spatial_index import SpatialIndex, haversine_km
+from destinations.tag_vocabulary import TagVocabulary
+from destinations import user_features
+from destinations.user_features import get_profile
+from destinations.views import rank_candidates
+
+
+def fake_encode_texts(texts, dim=16):
+    """
+    Deterministic stand-in for the sentence embedding model: a normalized random vector per text.
+    """
+    vectors = []
+    for text in texts:
+        seed = int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16)
+        vectors.append(np.random.default_rng(seed).standard_normal(dim))
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def clustered_vectors(n, dim, clusters, seed=0):
+    """
+    Normalized vectors grouped around random centers, like real embeddings.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n)] + 0.3 * rng.standard_normal((n, dim))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class IVFIndexTests(SimpleTestCase):
+    """
+    Approximate search compared with exact search.
+    """
+    def setUp(self):
+        self.matrix = clustered_vectors(3000, 32, clusters=40)
+        self.ids = np.arange(1, 3001, dtype=np.int64)
+        self.queries = clustered_vectors(30, 32, clusters=40, seed=1)
+        self.index = IVFIndex(nprobe=16)
+        self.index.build(self.matrix, self.ids)
+
+    def test_recall_against_exact_search(self):
+        exact = ExactIndex()
+        found = 0
+        for query in self.queries:
+            expected = {location_id for location_id, _ in exact.search(self.matrix, self.ids, query, 10)}
+            found += len(expected & {location_id for location_id, _ in self.index.search(self.matrix, self.ids, query, 10)})
+        self.assertGreaterEqual(found / (10 * len(self.queries)), 0.9)
+
+    def test_probing_every_list_is_exact(self):
+        exact = ExactIndex()
+        for query in self.queries[:5]:
+            self.assertEqual(
+                [location_id for location_id, _ in self.index.search(self.matrix, self.ids, query, 10, probe=len(self.index.centroids))],
+                [location_id for location_id, _ in exact.search(self.matrix, self.ids, query, 10)],
+            )
+
+    def test_allowed_mask(self):
+        allowed_mask = self.ids % 2 == 0
+        results = self.index.search(self.matrix, self.ids, self.queries[0], 10, allowed_mask=allowed_mask)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(location_id % 2 == 0 for location_id, _ in results))
+
+
+@unittest.skipUnless(HNSWLIB_AVAILABLE, 'hnswlib is not installed')
+class HNSWIndexTests(SimpleTestCase):
+    """
+    Incremental updates of the HNSW graph.
+    """
+    def test_removed_ids_are_not_returned(self):
+        matrix = clustered_vectors(500, 16, clusters=10)
+        ids = np.arange(1, 501, dtype=np.int64)
+        index = HNSWIndex()
+        index.build(matrix, ids)
+
+        removed_ids = [int(location_id) for location_id, _ in index.search(matrix, ids, matrix[0], 5)]
+        keep = ~np.isin(ids, removed_ids)
+        index.update(matrix[keep], ids[keep], kept_rows=keep, removed_ids=removed_ids)
+        results = index.search(matrix[keep], ids[keep], matrix[0], 5)
+        self.assertFalse(set(removed_ids) & {location_id for location_id, _ in results})
+
+
+class LocationEmbeddingMatrixTests(TestCase):
+    """
+    Training of the nearest-neighbour index as the matrix grows.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.embeddings = LocationEmbeddingMatrix(directory=self.directory)
+        self.embeddings.ann_min_rows = 50
+        self.embeddings.ann_retrain_growth = 0.25
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def create_locations(self, count):
+        start = Location.objects.count()
+        return [Location.objects.create(name=f"Location {start + i}").id for i in range(count)]
+
+    def test_index_trained_when_matrix_grows_past_threshold(self):
+        self.create_locations(30)
+        self.embeddings.build(Location.objects.all(), fake_encode_texts)
+        self.assertFalse(self.embeddings.ann_ready)
+
+        self.embeddings.mark_dirty(self.create_locations(40))
+        self.embeddings.flush(fake_encode_texts)
+        self.assertEqual(len(self.embeddings), 70)
+        self.assertTrue(self.embeddings.ann_ready)
+        self.assertEqual(self.embeddings.ann_trained_rows, 70)
+
+    def test_index_retrained_after_growth(self):
+        self.create_locations(60)
+        self.embeddings.build(Location.objects.all(), fake_encode_texts)
+        self.assertTrue(self.embeddings.ann_ready)
+
+        # Below the growth fraction the index is updated in place
+        self.embeddings.mark_dirty(self.create_locations(10))
+        self.embeddings.flush(fake_encode_texts)
+        self.assertEqual(self.embeddings.ann_trained_rows, 60)
+        self.assertEqual(len(self.embeddings.ann_index.assignments), 70)
+
+        self.embeddings.mark_dirty(self.create_locations(10))
+        self.embeddings.flush(fake_encode_texts)
+        self.assertEqual(self.embeddings.ann_trained_rows, 80)
+        self.assertEqual(self.embeddings.ann_rows_added, 0)
+
+    def test_index_retrained_when_saved_index_does_not_match(self):
+        self.create_locations(60)
+        self.embeddings.build(Location.objects.all(), fake_encode_texts)
+        os.remove(os.path.join(self.directory, IVFIndex.ASSIGNMENTS_FILE))
+
+        reloaded = LocationEmbeddingMatrix(directory=self.directory)
+        reloaded.ann_min_rows = 50
+        self.assertTrue(reloaded.load())
+        self.assertFalse(reloaded.ann_ready)
+        reloaded.flush(fake_encode_texts)
+        self.assertTrue(reloaded.ann_ready)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, IVFIndex.ASSIGNMENTS_FILE)))
+
+
+    def test_corrupt_index_file_falls_back_to_retraining(self):
+        self.create_locations(60)
+        self.embeddings.build(Location.objects.all(), fake_encode_texts)
+        with open(os.path.join(self.directory, IVFIndex.CENTROIDS_FILE), 'wb') as index_file:
+            index_file.write(b'not an index')
+
+        reloaded = LocationEmbeddingMatrix(directory=self.directory)
+        reloaded.ann_min_rows = 50
+        self.assertTrue(reloaded.load())
+        self.assertFalse(reloaded.ann_ready)
+        self.assertTrue(reloaded.needs_ann_training())
+        reloaded.flush(fake_encode_texts)
+        self.assertTrue(reloaded.ann_ready)
+        self.assertEqual(reloaded.ann_trained_rows, 60)
+
+    def test_flush_copies_matrix_once(self):
+        location_ids = self.create_locations(60)
+        self.embeddings.build(Location.objects.all(), fake_encode_texts)
+        Location.objects.filter(id=location_ids[0]).update(name='Renamed location')
+        self.embeddings.mark_dirty([location_ids[0]] + self.create_locations(1500))
+        self.embeddings.mark_deleted(location_ids[1:3])
+
+        with mock.patch.object(self.embeddings, 'apply_changes', wraps=self.embeddings.apply_changes) as apply_changes:
+            self.embeddings.flush(fake_encode_texts)
+        apply_changes.assert_called_once()
+        self.assertEqual(len(self.embeddings), 1558)
+        self.assertNotIn(location_ids[1], self.embeddings.id_to_row)
+        row = self.embeddings.id_to_row[location_ids[0]]
+        np.testing.assert_allclose(self.embeddings.matrix[row], fake_encode_texts([build_location_text(Location.objects.get(id=location_ids[0]))])[0], rtol=1e-6)
+        self.assertEqual(len(self.embeddings.ann_index.assignments), 1558)
+
+    def test_flush_publishes_new_snapshot(self):
+        self.create_locations(60)
+        self.embeddings.build(Location.objects.all(), fake_encode_texts)
+        snapshot = self.embeddings.snapshot
+        assignments = snapshot.ann_index.assignments.copy()
+
+        # A search that started before the flush keeps reading unchanged arrays
+        self.embeddings.mark_dirty(self.create_locations(5))
+        self.embeddings.flush(fake_encode_texts)
+        self.assertEqual(len(snapshot.ids), 60)
+        self.assertEqual(len(snapshot.matrix), 60)
+        np.testing.assert_array_equal(snapshot.ann_index.assignments, assignments)
+
+        self.assertIsNot(self.embeddings.snapshot, snapshot)
+        self.assertEqual(len(self.embeddings.snapshot.ann_index.assignments), 65)
+        query = self.embeddings.matrix[-1]
+        self.assertEqual(self.embeddings.search(query, 1)[0][0], int(self.embeddings.ids[-1]))
+
+
+class EnsureReadyTests(TestCase):
+    """
+    The search path only loads the precomputed matrix; encoding happens elsewhere.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for i in range(5):
+            Location.objects.create(name=f"Location {i}")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_missing_matrix_is_not_built(self):
+        embeddings = LocationEmbeddingMatrix(directory=self.directory)
+        encode_texts = mock.Mock(side_effect=fake_encode_texts)
+        self.assertFalse(embeddings.ensure_ready(encode_texts))
+        self.assertFalse(embeddings.is_loaded())
+        encode_texts.assert_not_called()
+
+    def test_pending_changes_are_flushed_in_background(self):
+        LocationEmbeddingMatrix(directory=self.directory).build(Location.objects.all(), fake_encode_texts)
+        embeddings = LocationEmbeddingMatrix(directory=self.directory)
+        embeddings.mark_dirty([Location.objects.create(name='New location').id])
+
+        with mock.patch.object(embeddings, 'schedule_flush') as schedule_flush:
+            self.assertTrue(embeddings.ensure_ready(fake_encode_texts))
+        schedule_flush.assert_called_once()
+        self.assertEqual(len(embeddings), 5)
+
+        embeddings.flush(fake_encode_texts)
+        self.assertEqual(len(embeddings), 6)
+
+    def test_catalogue_check_is_rate_limited(self):
+        LocationEmbeddingMatrix(directory=self.directory).build(Location.objects.all(), fake_encode_texts)
+        embeddings = LocationEmbeddingMatrix(directory=self.directory)
+        self.assertTrue(embeddings.ensure_ready(fake_encode_texts))
+        with self.assertNumQueries(0):
+            self.assertTrue(embeddings.ensure_ready(fake_encode_texts))
+
+
+class SpatialIndexTests(SimpleTestCase):
+    """
+    Tree queries compared with a brute-force haversine scan.
+    """
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        categories = ['Museum', 'Park', 'Beach']
+        self.rows = [
+            (i + 1, float(lat), float(lon), categories[i % 3], ['Family'] if i % 4 == 0 else [])
+            for i, (lat, lon) in enumerate(zip(rng.uniform(-60, 60, 2000), rng.uniform(-180, 180, 2000)))
+        ]
+        self.latitudes = np.array([row[1] for row in self.rows])
+        self.longitudes = np.array([row[2] for row in self.rows])
+        self.index = SpatialIndex(leaf_size=16)
+        self.index.build_from_rows(self.rows)
+        # Includes points next to the antimeridian
+        self.origins = [(10.0, 20.0), (-35.5, 179.9), (48.8, -2.3), (0.0, -179.8)]
+
+    def brute_force(self, lat, lon, keep=None):
+        distances = haversine_km(lat, lon, self.latitudes, self.longitudes)
+        order = np.argsort(distances, kind='stable')
+        return [(self.rows[i][0], float(distances[i])) for i in order if keep is None or keep(self.rows[i])]
+
+    def assertSameResults(self, results, expected):
+        self.assertEqual([location_id for location_id, _ in results], [location_id for location_id, _ in expected])
+        for (_, distance), (_, expected_distance) in zip(results, expected):
+            self.assertAlmostEqual(distance, expected_distance, places=6)
+
+    def test_within_matches_brute_force(self):
+        for lat, lon in self.origins:
+            expected = [match for match in self.brute_force(lat, lon) if match[1] <= 800]
+            self.assertSameResults(self.index.within(lat, lon, 800), expected)
+            self.assertSameResults(self.index.within(lat, lon, 800, limit=5), expected[:5])
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lon in self.origins:
+            self.assertSameResults(self.index.nearest(lat, lon, 10), self.brute_force(lat, lon)[:10])
+            expected = [match for match in self.brute_force(lat, lon) if match[1] <= 300][:10]
+            self.assertSameResults(self.index.nearest(lat, lon, 10, max_distance_km=300), expected)
+
+    def test_filters_match_brute_force(self):
+        keep = lambda row: row[3] == 'Park' and 'Family' in row[4]
+        for lat, lon in self.origins:
+            expected = self.brute_force(lat, lon, keep)
+            self.assertSameResults(self.index.nearest(lat, lon, 10, category='park', subcategory='FAMILY'), expected[:10])
+            self.assertSameResults(
+                self.index.within(lat, lon, 1500, category='Park', subcategory='family'),
+                [match for match in expected if match[1] <= 1500],
+            )
+        self.assertEqual(self.index.nearest(0, 0, 10, category='Volcano'), [])
+
+    def test_changes_rebuild_in_background(self):
+        tree = self.index.tree
+        self.index.mark_dirty([1])
+        with mock.patch.object(self.index, 'schedule_rebuild') as schedule_rebuild:
+            self.index.nearest(0, 0, 5)
+        schedule_rebuild.assert_called_once()
+        self.assertIs(self.index.tree, tree)
+
+        self.index.build_from_rows(self.rows[:10])
+        self.assertEqual(len(self.index), 10)
+        self.assertEqual(len(tree), 2000)
+
+
+class SpatialIndexVersionTests(TestCase):
+    """
+    Trees follow catalogue changes made by other processes.
+    """
+    def test_changes_in_another_process_trigger_rebuild(self):
+        Location.objects.create(name='Old Quarter', latitude=21.03, longitude=105.85)
+        index = SpatialIndex(version_check_interval=0)
+        self.assertEqual(len(index.nearest(21.0, 105.8, 5)), 1)
+
+        # Saved without notifying this index, as from another worker or an import
+        Location.objects.create(name='West Lake', latitude=21.06, longitude=105.82)
+        with mock.patch.object(index, 'schedule_rebuild') as schedule_rebuild:
+            index.nearest(21.0, 105.8, 5)
+        schedule_rebuild.assert_called_once()
+        index.build()
+        self.assertEqual(len(index.nearest(21.0, 105.8, 5)), 2)
+
+
+class StaleProfileTests(TestCase):
+    """
+    Location edits flag user profiles instead of rebuilding them.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='traveller', email='traveller@example.com', password='secret')
+        self.location = Location.objects.create(name='Old Town', category='Museum', country='Italy')
+        Like.objects.create(user=self.user, location=self.location)
+        self.profile = get_profile(self.user)
+
+    def test_edit_flags_profile_and_rebuilds_on_read(self):
+        self.location.category = 'Park'
+        self.location.save()
+        stored = UserFeatureProfile.objects.get(user=self.user)
+        self.assertTrue(stored.stale)
+        self.assertEqual(stored.category_counts, {'Museum': 1})
+
+        profile = get_profile(self.user)
+        self.assertFalse(profile.stale)
+        self.assertEqual(profile.category_counts, {'Park': 1})
+
+    def test_edit_during_rebuild_keeps_profile_stale(self):
+        self.location.category = 'Park'
+        self.location.save()
+        compute_profile = user_features.compute_profile
+
+        def compute_while_edited(user_id):
+            profile = compute_profile(user_id)
+            # Another process edits the location after it was read
+            self.location.category = 'Beach'
+            self.location.save()
+            return profile
+
+        with mock.patch('destinations.user_features.compute_profile', side_effect=compute_while_edited):
+            self.assertEqual(get_profile(self.user).category_counts, {'Park': 1})
+        self.assertTrue(UserFeatureProfile.objects.get(user=self.user).stale)
+        self.assertEqual(get_profile(self.user).category_counts, {'Beach': 1})
+
+    def test_edit_without_feature_change_keeps_updated_at(self):
+        self.location.description = 'A new description'
+        self.location.save()
+        self.assertTrue(UserFeatureProfile.objects.get(user=self.user).stale)
+
+        profile = get_profile(self.user)
+        self.assertFalse(UserFeatureProfile.objects.get(user=self.user).stale)
+        self.assertEqual(profile.updated_at, self.profile.updated_at)
+
+
+class KeywordIndexTests(TestCase):
+    """
+    Index lookups compared with the linear scan keyword_search used before the index.
+    """
+    WORDS = ['beach', 'bea', 'temple', 'kyoto', 'park', 'ar', 'old', 'museum', 'japan', 'nothing']
+
+    def setUp(self):
+        self.locations = [
+            Location.objects.create(name='Old Temple', description='Quiet temple near the park', category='Temple', city='Kyoto', country='Japan'),
+            Location.objects.create(name='Sunset Beach', description='Sandy beach bar', category='Beach', city='Nha Trang', country='Vietnam', subcategories=['Beaches', 'Bars']),
+            Location.objects.create(name='Art Museum', description=None, category='Museum', city='Paris', country='France', subcategories='Art Galleries'),
+            Location.objects.create(name='Ueno Park', description='Park with a museum and a zoo', category='Park', city='Tokyo', country='Japan'),
+        ]
+        self.index = KeywordIndex()
+
+    def linear_scan(self, word):
+        """
+        Exact and partial matches as computed by the original per-destination loop.
+        """
+        exact, partial = set(), set()
+        for location in Location.objects.all():
+            text = f"{location.name} {location.description or ''} {location.category or ''} {location.city or ''} {location.country or ''}"
+            if isinstance(location.subcategories, list):
+                text += " " + " ".join(location.subcategories)
+            elif isinstance(location.subcategories, str):
+                text += " " + location.subcategories
+            text = text.lower()
+            if word in text.split():
+                exact.add(location.id)
+            if any(word in token for token in text.split()):
+                partial.add(location.id)
+        return exact, partial
+
+    def assertMatchesLinearScan(self, postings):
+        for word in self.WORDS:
+            exact, partial = self.linear_scan(word)
+            self.assertEqual(set(postings.exact_matches(word)), exact, word)
+            self.assertEqual(set(postings.partial_matches(word)), partial, word)
+
+    def test_matches_linear_scan(self):
+        self.assertMatchesLinearScan(self.index.ensure_ready())
+
+    def test_updates_do_not_change_published_version(self):
+        before = self.index.ensure_ready()
+        beach_ids = set(before.partial_matches('beach'))
+
+        deleted_id = self.locations[3].id
+        self.locations[0].description = 'Temple by the beach'
+        self.locations[0].save()
+        self.locations[3].delete()
+        self.index.mark_dirty([self.locations[0].id])
+        self.index.mark_deleted([deleted_id])
+
+        after = self.index.ensure_ready()
+        self.assertIsNot(after, before)
+        self.assertMatchesLinearScan(after)
+        self.assertEqual(set(before.partial_matches('beach')), beach_ids)
+        self.assertIn(deleted_id, before.exact_matches('park'))
+
+    def test_changes_in_another_process_trigger_rebuild(self):
+        index = KeywordIndex(version_check_interval=0)
+        index.ensure_ready()
+        # Saved without notifying this index, as from another worker or an import
+        location = Location.objects.create(name='Night Market', city='Taipei')
+        with mock.patch.object(index, 'schedule_build') as schedule_build:
+            self.assertNotIn(location.id, index.ensure_ready().exact_matches('market'))
+        schedule_build.assert_called_once()
+        index.build()
+        self.assertIn(location.id, index.ensure_ready().exact_matches('market'))
+
+
+class BM25FRankerTests(SimpleTestCase):
+    """
+    BM25F scores checked against a hand-computed example.
+    """
+    def setUp(self):
+        ranker = BM25FRanker()
+        self.data = BM25FPostings(ranker.field_weights, ranker.field_b)
+        documents = {
+            1: ('Kyoto Temple', 'Old temple garden'),
+            2: ('Beach Bar', 'Beach'),
+            3: ('Temple Beach', ''),
+        }
+        for location_id, (name, description) in documents.items():
+            self.data.add_document(location_id, location_field_texts(name, description, None, None, None, None))
+        self.data.refresh_statistics()
+
+    def test_scores_match_hand_computed_values(self):
+        # 3 documents, "temple" occurs in 2: idf = ln(1 + (3 - 2 + 0.5) / (2 + 0.5)) = ln(1.6)
+        idf = math.log(1.6)
+        # Average lengths: name 2 tokens, description 4/3 tokens
+        # Document 1: name tf 1, weight 3, b 0.5, length 2 -> 3 / (0.5 + 0.5 * 2 / 2) = 3
+        #             description tf 1, weight 1, b 0.75, length 3 -> 1 / (0.25 + 0.75 * 3 / (4 / 3)) = 1 / 1.9375
+        tf1 = 3 + 1 / 1.9375
+        # Document 3: name only
+        tf3 = 3.0
+        scores = self.data.score('the temple', 1.2)
+        self.assertEqual(set(scores), {1, 3})
+        self.assertAlmostEqual(scores[1], idf * tf1 / (1.2 + tf1))
+        self.assertAlmostEqual(scores[3], idf * tf3 / (1.2 + tf3))
+
+    def test_field_restriction(self):
+        idf = math.log(1.6)
+        tf1 = 1 / 1.9375
+        self.assertEqual(self.data.score('temple', 1.2, positions=[FIELDS.index('description')]), {1: idf * tf1 / (1.2 + tf1)})
+
+    def test_statistics_follow_removals(self):
+        self.data.remove_document(2)
+        # 2 documents left, "beach" occurs in 1: ln(1 + (2 - 1 + 0.5) / (1 + 0.5)) = ln(2)
+        self.assertAlmostEqual(self.data.idf('beach'), math.log(2))
+        self.assertEqual(self.data.idf('bar'), 0.0)
+        # Average description length moved from 4/3 to 3/2: factors are recomputed
+        self.assertTrue(self.data.refresh_statistics(tolerance=0.05))
+        self.assertFalse(self.data.refresh_statistics(tolerance=0.05))
+
+
+class BM25FRankerRefreshTests(TestCase):
+    """
+    Index versions are built off the search path and swapped in.
+    """
+    def setUp(self):
+        self.locations = [
+            Location.objects.create(name='Kyoto Temple', description='Old temple garden'),
+            Location.objects.create(name='Sunset Beach', description='Sandy beach'),
+        ]
+        self.ranker = BM25FRanker(version_check_interval=0)
+
+    def test_first_search_does_not_build(self):
+        with mock.patch.object(self.ranker, 'schedule_refresh') as schedule_refresh:
+            self.assertEqual(self.ranker.score('temple'), {})
+        schedule_refresh.assert_called_once()
+        self.assertFalse(self.ranker.built)
+
+    def test_updates_do_not_change_published_version(self):
+        self.ranker.sync()
+        before = self.ranker.data
+        self.locations[1].description = 'Beach below the temple'
+        self.locations[1].save()
+        self.ranker.mark_dirty([self.locations[1].id])
+        self.ranker.refresh()
+
+        self.assertIsNot(self.ranker.data, before)
+        self.assertEqual(set(before.score('temple', 1.2)), {self.locations[0].id})
+        self.assertEqual(set(self.ranker.score('temple')), {location.id for location in self.locations})
+
+    def test_changes_in_another_process_trigger_rebuild(self):
+        self.ranker.sync()
+        # Saved without notifying this ranker, as from another worker or an import
+        location = Location.objects.create(name='Temple Hill')
+        with mock.patch.object(self.ranker, 'schedule_refresh') as schedule_refresh:
+            self.ranker.ensure_ready()
+        schedule_refresh.assert_called_once()
+        self.ranker.sync()
+        self.assertIn(location.id, self.ranker.score('temple'))
+
+
+class LRUCacheTests(SimpleTestCase):
+    """
+    Eviction order, expiry and memory accounting of the LRU cache.
+    """
+    def test_least_recently_used_item_is_evicted(self):
+        cache = LRUCache(capacity=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_items_expire_after_ttl(self):
+        cache = LRUCache(capacity=10, ttl=60)
+        with mock.patch('destinations.nlp_utils.time.monotonic', return_value=1000.0):
+            cache.put('a', 1)
+        with mock.patch('destinations.nlp_utils.time.monotonic', return_value=1059.0):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('destinations.nlp_utils.time.monotonic', return_value=1061.0):
+            self.assertEqual(cache.get('a', 'expired'), 'expired')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_byte_accounting(self):
+        vector = np.zeros(100, dtype=np.float32)  # 400 bytes
+        cache = LRUCache(capacity=100, max_bytes=1000)
+        cache.put('a', vector)
+        cache.put('b', vector)
+        self.assertEqual(cache.current_bytes, 800)
+
+        # Replacing a key does not count it twice
+        cache.put('b', vector)
+        self.assertEqual(cache.current_bytes, 800)
+
+        cache.put('c', vector)
+        self.assertEqual(cache.current_bytes, 800)
+        self.assertIsNone(cache.get('a'))
+
+        cache.invalidate('b')
+        self.assertEqual(cache.current_bytes, 400)
+
+        # Values larger than the whole cache are not stored
+        cache.put('large', np.zeros(1000, dtype=np.float32))
+        self.assertIsNone(cache.get('large'))
+        self.assertEqual(cache.current_bytes, 400)
+
+        cache.clear()
+        self.assertEqual(cache.current_bytes, 0)
+
+
+class LocationImportTests(TestCase):
+    """
+    Streaming CSV import: chunked upserts keyed by the TripAdvisor id.
+    """
+    HEADER = 'id,name,description,addressObj/country,latitude,subcategories/0,subcategories/1,subtype/0\n'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_csv(self, lines):
+        path = os.path.join(self.directory, 'locations.csv')
+        with open(path, 'w', encoding='utf-8') as csv_file:
+            csv_file.write(self.HEADER + ''.join(line + '\n' for line in lines))
+        return path
+
+    def test_rows_are_upserted_in_chunks(self):
+        path = self.write_csv([
+            '101,Old Quarter,Narrow streets,Vietnam,21.03,Neighborhoods,Markets,Walking',
+            '102,West Lake,,Vietnam,,Lakes,,',
+            ',No id,,,,,,',
+            '103,,Missing name,,,,,',
+            '102,West Lake,Largest lake,Vietnam,21.06,Lakes,,',
+        ])
+        stats = import_file(path, chunk_size=2)
+        # 102 is created by the first chunk and updated by the last one
+        self.assertEqual((stats['created_ids'], stats['updated_ids']), ([101, 102], [102]))
+        self.assertEqual(stats['skipped'], 2)
+
+        old_quarter = Location.objects.get(id=101)
+        self.assertEqual(old_quarter.subcategories, ['Neighborhoods', 'Markets'])
+        self.assertEqual(old_quarter.subtypes, ['Walking'])
+        self.assertAlmostEqual(old_quarter.latitude, 21.03)
+        west_lake = Location.objects.get(id=102)
+        self.assertEqual(west_lake.description, 'Largest lake')
+        self.assertEqual(west_lake.subtypes, [])
+
+        Location.objects.filter(id=101).update(likes_count=7)
+        stats = import_file(self.write_csv(['101,Old Quarter,Renovated streets,Vietnam,21.03,Markets,,']))
+        self.assertEqual((stats['created_ids'], stats['updated_ids']), ([], [101]))
+        old_quarter = Location.objects.get(id=101)
+        self.assertEqual((old_quarter.description, old_quarter.subcategories, old_quarter.likes_count), ('Renovated streets', ['Markets'], 7))
+        self.assertEqual(Location.objects.count(), 2)
+
+    def test_unchanged_rows_are_not_written(self):
+        lines = ['101,Old Quarter,Narrow streets,Vietnam,21.03,Markets,,', '102,West Lake,,Vietnam,21.06,Lakes,,']
+        import_file(self.write_csv(lines))
+
+        with self.assertNumQueries(1):
+            stats = import_file(self.write_csv(lines))
+        self.assertEqual((stats['created_ids'], stats['updated_ids'], stats['unchanged']), ([], [], 2))
+
+        lines[1] = '102,West Lake,,Vietnam,21.06,Lakes,Parks,'
+        stats = import_file(self.write_csv(lines))
+        self.assertEqual((stats['updated_ids'], stats['unchanged']), ([102], 1))
+        # The importer hashes rows the same way Location.save does
+        west_lake = Location.objects.get(id=102)
+        stored_hash = west_lake.content_hash
+        west_lake.save()
+        self.assertEqual(west_lake.content_hash, stored_hash)
+
+        stats = import_file(self.write_csv(lines), dry_run=True)
+        self.assertEqual(stats['unchanged'], 2)
+
+
+class PrimarySubcategoryTests(TestCase):
+    """
+    The indexed primary_subcategory column follows subcategories[0].
+    """
+    def test_kept_in_sync_on_save(self):
+        location = Location.objects.create(name='Old Quarter', subcategories=['Markets', 'Neighborhoods'])
+        self.assertEqual(Location.objects.get(id=location.id).primary_subcategory, 'Markets')
+
+        location.subcategories = ['Neighborhoods']
+        location.save(update_fields=['subcategories'])
+        self.assertEqual(Location.objects.get(id=location.id).primary_subcategory, 'Neighborhoods')
+
+        location.subcategories = []
+        location.save()
+        self.assertIsNone(Location.objects.get(id=location.id).primary_subcategory)
+
+    def test_set_by_import(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'locations.csv')
+        with open(path, 'w', encoding='utf-8') as csv_file:
+            csv_file.write('id,name,subcategories/0,subcategories/1\n101,Old Quarter,Markets,Parks\n102,West Lake,,\n')
+        import_file(path)
+        self.assertEqual(dict(Location.objects.values_list('id', 'primary_subcategory')), {101: 'Markets', 102: None})
+
+        with open(path, 'w', encoding='utf-8') as csv_file:
+            csv_file.write('id,name,subcategories/0,subcategories/1\n101,Old Quarter,Parks,\n102,West Lake,Lakes,\n')
+        import_file(path)
+        self.assertEqual(dict(Location.objects.values_list('id', 'primary_subcategory')), {101: 'Parks', 102: 'Lakes'})
+        self.assertEqual(Location.primary_subcategory_tags(), ['Lakes', 'Parks'])
+
+
+class TagVocabularyTests(TestCase):
+    """
+    Tag resolution from exact matches to trigram similarity, cached between calls.
+    """
+    def setUp(self):
+        for subcategory in ['Food & Drink', 'Museums', 'Nature & Parks', 'Shopping']:
+            Location.objects.create(name=subcategory, subcategories=[subcategory])
+        self.vocabulary = TagVocabulary(version_check_interval=3600)
+
+    def test_resolve(self):
+        self.assertEqual(self.vocabulary.resolve('Museums'), 'Museums')
+        self.assertEqual(self.vocabulary.resolve('food and drink'), 'Food & Drink')
+        self.assertEqual(self.vocabulary.resolve('parks'), 'Nature & Parks')
+        self.assertEqual(self.vocabulary.resolve('Musems'), 'Museums')
+        self.assertIsNone(self.vocabulary.resolve('Musems', fuzzy=False))
+        self.assertIsNone(self.vocabulary.resolve('Volcanoes'))
+
+    def test_cached_until_invalidated(self):
+        self.assertEqual(self.vocabulary.tags(), ['Food & Drink', 'Museums', 'Nature & Parks', 'Shopping'])
+        Location.objects.create(name='Beach', subcategories=['Beaches'])
+        with self.assertNumQueries(0):
+            self.assertNotIn('Beaches', self.vocabulary.tags())
+        self.vocabulary.invalidate()
+        self.assertIn('Beaches', self.vocabulary.tags())
+
+
+class PrecomputedRecommendationTests(TestCase):
+    """
+    Lists stored by precompute_recommendations are served until the user's activity changes.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='traveller', email='traveller@example.com', password='secret')
+        self.locations = [Location.objects.create(name=f"Location {i}", country='Vietnam') for i in range(15)]
+        Like.objects.create(user=self.user, location=self.locations[0])
+
+    def fake_build_recommendations(self, user, recently_viewed=None, limit=10, profile=None):
+        return {
+            'results': [recommendation_store.location_to_dict(location, 0.9 - i * 0.01) for i, location in enumerate(self.locations[1:limit + 1])],
+            'tag_group_recommendations': {},
+            'activity_weight': 0.5,
+            'tag_weight': 0.5,
+        }
+
+    def precompute(self):
+        with mock.patch('destinations.views.build_recommendations', side_effect=self.fake_build_recommendations):
+            call_command('precompute_recommendations', user=[self.user.id], size=10, stdout=io.StringIO())
+
+    def test_stored_lists_are_served_until_profile_changes(self):
+        self.precompute()
+        entry = PrecomputedRecommendation.objects.get(user=self.user)
+        self.assertEqual(entry.size, 10)
+        stored_ids = [location_id for location_id, _ in entry.lists['results']]
+        self.assertEqual(stored_ids, [location.id for location in self.locations[1:11]])
+
+        profile = get_profile(self.user)
+        with self.assertNumQueries(2):
+            data = recommendation_store.serve(self.user, profile, 5)
+        self.assertEqual(len(data['results']), 5)
+        self.assertTrue({item['id'] for item in data['results']} <= set(stored_ids))
+        self.assertEqual(data['activity_weight'], 0.5)
+        # Larger requests than the stored pool are computed online
+        self.assertIsNone(recommendation_store.serve(self.user, get_profile(self.user), 20))
+
+        Like.objects.create(user=self.user, location=self.locations[12])
+        self.assertIsNone(recommendation_store.serve(self.user, get_profile(self.user), 5))
+
+    def test_endpoint_uses_stored_lists(self):
+        self.precompute()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch('destinations.views.build_recommendations') as build_recommendations:
+            response = client.post(f"{reverse('recommend_destinations')}?limit=5", {}, format='json')
+        build_recommendations.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['recently_viewed_recommendations'], [])
+
+
+class SearchQueryBufferTests(TestCase):
+    """
+    Search counts are buffered in memory and written in one flush.
+    """
+    def setUp(self):
+        self.buffer = SearchQueryBuffer(flush_interval=3600)
+
+    def tearDown(self):
+        # Nothing left for the exit flush
+        self.buffer.counts.clear()
+
+    def test_searches_are_counted_without_queries(self):
+        with self.assertNumQueries(0):
+            self.buffer.add('Beaches in  Da Nang')
+            self.buffer.add('beaches in da nang')
+            self.buffer.add('museums')
+            self.buffer.add('   ')
+        self.assertEqual(self.buffer.counts, {'beaches in da nang': 2, 'museums': 1})
+
+    def test_flush_adds_counts_to_existing_rows(self):
+        SearchQuery.record('museums')
+        self.buffer.add('Museums')
+        self.buffer.add('beaches')
+        self.buffer.add('beaches')
+        self.assertEqual(self.buffer.flush(), 2)
+
+        self.assertEqual(dict(SearchQuery.objects.values_list('query', 'search_count')), {'museums': 2, 'beaches': 2})
+        self.assertEqual(self.buffer.counts, {})
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_failed_flush_keeps_counts(self):
+        self.buffer.add('museums')
+        with mock.patch.object(SearchQuery, 'record_counts', side_effect=RuntimeError('database is locked')):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.buffer.add('museums')
+        self.buffer.flush()
+        self.assertEqual(SearchQuery.objects.get(query='museums').search_count, 2)
+
+
+class BitmapTests(SimpleTestCase):
+    """
+    Bitmap set operations compared with Python sets, across both container types.
+    """
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Chunk 0 dense in both, chunk 1 sparse in both, chunk 2 dense in one only, chunk 3 in one only
+        self.a = set(rng.choice(65536, 20000, replace=False).tolist())
+        self.a |= set((65536 + rng.choice(65536, 300, replace=False)).tolist())
+        self.a |= set((2 * 65536 + rng.choice(65536, 10000, replace=False)).tolist())
+        self.b = set(rng.choice(65536, 30000, replace=False).tolist())
+        self.b |= set((65536 + rng.choice(65536, 500, replace=False)).tolist())
+        self.b |= set((2 * 65536 + rng.choice(65536, 100, replace=False)).tolist())
+        self.b |= set((3 * 65536 + rng.choice(65536, 50, replace=False)).tolist())
+
+    def test_and_or_andnot_match_sets(self):
+        a, b = Bitmap(self.a), Bitmap(self.b)
+        self.assertIsInstance(a.containers[0], int)
+        self.assertIsInstance(a.containers[1], frozenset)
+        self.assertEqual(list(a & b), sorted(self.a & self.b))
+        self.assertEqual(list(a | b), sorted(self.a | self.b))
+        self.assertEqual(list(a - b), sorted(self.a - self.b))
+        self.assertEqual(list(b - a), sorted(self.b - self.a))
+        self.assertEqual(len(a & b), len(self.a & self.b))
+
+    def test_results_use_the_container_type_of_their_size(self):
+        sparse = Bitmap(range(0, 65536, 2)) & Bitmap(range(0, 65536, 3))
+        self.assertEqual(len(sparse), len(range(0, 65536, 6)))
+        self.assertIsInstance(sparse.containers[0], int)
+        small = Bitmap(range(ARRAY_CONTAINER_MAX + 10)) - Bitmap(range(20, ARRAY_CONTAINER_MAX + 10))
+        self.assertIsInstance(small.containers[0], frozenset)
+        self.assertEqual(list(small), list(range(20)))
+        self.assertFalse(Bitmap([1, 2]) & Bitmap([65537]))
+
+    def test_add_discard_and_copy(self):
+        bitmap = Bitmap(range(ARRAY_CONTAINER_MAX))
+        copy = bitmap.copy()
+        bitmap.add(ARRAY_CONTAINER_MAX)
+        self.assertIsInstance(bitmap.containers[0], int)
+        bitmap.discard(0)
+        bitmap.discard(1)
+        self.assertIsInstance(bitmap.containers[0], frozenset)
+        self.assertEqual(list(bitmap), list(range(2, ARRAY_CONTAINER_MAX + 1)))
+        self.assertEqual(len(copy), ARRAY_CONTAINER_MAX)
+        self.assertIn(0, copy)
+        self.assertNotIn(-1, copy)
+        self.assertEqual(Bitmap([70000, 5, 65536]).first(2), [5, 65536])
+
+    def test_sample_returns_distinct_members(self):
+        a = Bitmap(self.a)
+        sample = a.sample(500, random.Random(0))
+        self.assertEqual(len(sample), 500)
+        self.assertEqual(len(set(sample)), 500)
+        self.assertTrue(set(sample) <= self.a)
+        # Positions are drawn across every container, not only the first ones
+        self.assertTrue(any(value >= 2 * 65536 for value in sample))
+        self.assertEqual(sorted(Bitmap([3, 70000, 1]).sample(10)), [1, 3, 70000])
+        self.assertEqual(Bitmap().sample(5), [])
+
+
+class RankCandidatesTests(SimpleTestCase):
+    """
+    Neighbour-ranked candidates first, then a random sample of the rest.
+    """
+    def test_neighbours_first_then_sampled_remainder(self):
+        candidates = Bitmap(range(1, 10001))
+        ranked = rank_candidates(candidates, [20000, 42, 7, 42000, 9], 10)
+        self.assertEqual(ranked[:3], [42, 7, 9])
+        self.assertEqual(len(ranked), 10)
+        self.assertEqual(len(set(ranked)), 10)
+        self.assertTrue(set(ranked) <= set(range(1, 10001)))
+
+    def test_stops_at_limit(self):
+        candidates = Bitmap(range(1, 100))
+        with mock.patch.object(Bitmap, 'sample') as sample:
+            self.assertEqual(rank_candidates(candidates, [5, 6, 7, 8], 2), [5, 6])
+        sample.assert_not_called()
+        self.assertEqual(sorted(rank_candidates(Bitmap([1, 2]), [2], 5)), [1, 2])
+        self.assertEqual(rank_candidates(Bitmap([1, 2]), [2], 5)[0], 2)
+
+
+@mock.patch('destinations.item_neighbors.embedding_source', return_value=(None, {}))
+class ItemNeighborsTests(TestCase):
+    """
+    Incremental refreshes of the similarity graph compared with a full rebuild.
+    """
+    TAGS = ['Beaches', 'Museums', 'Parks', 'Temples', 'Markets', 'Nightlife']
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        for i in range(80):
+            self.create_location(f"Location {i}")
+
+    def create_location(self, name):
+        return Location.objects.create(name=name, **self.random_attributes())
+
+    def random_attributes(self):
+        return {
+            'latitude': float(self.rng.uniform(10, 12)),
+            'longitude': float(self.rng.uniform(105, 107)),
+            'subcategories': sorted(self.rng.choice(self.TAGS, 2, replace=False).tolist()),
+        }
+
+    def stored_lists(self):
+        return dict(LocationNeighbors.objects.values_list('location_id', 'neighbors'))
+
+    def test_incremental_refresh_matches_full_rebuild(self, embedding_source):
+        refresh_neighbors(k=5, block_size=16, log=lambda message: None)
+
+        # Edit, delete and add locations
+        locations = list(Location.objects.order_by('id'))
+        for location in locations[:5]:
+            for field, value in self.random_attributes().items():
+                setattr(location, field, value)
+            location.save()
+        for location in locations[5:8]:
+            location.delete()
+        for i in range(4):
+            self.create_location(f"New location {i}")
+
+        stats = refresh_neighbors(k=5, block_size=16, log=lambda message: None)
+        self.assertEqual((stats['changed'], stats['deleted']), (9, 3))
+        self.assertLess(stats['recomputed'], len(locations))
+        incremental = self.stored_lists()
+
+        refresh_neighbors(full=True, k=5, block_size=16, log=lambda message: None)
+        self.assertEqual(incremental, self.stored_lists())
+
+    def test_refresh_without_changes_does_nothing(self, embedding_source):
+        refresh_neighbors(k=5, block_size=16, log=lambda message: None)
+        stats = refresh_neighbors(k=5, block_size=16, log=lambda message: None)
+        self.assertEqual((stats['changed'], stats['recomputed'], stats['merged']), (0, 0, 0))
+
+
+class ReviewQueueTests(TestCase):
+    """
+    Workers of several processes claim disjoint batches of pending reviews.
+    """
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='reviewer', email='reviewer@example.com', password='secret')
+        self.reviews = [
+            Review.objects.create(user=user, location=Location.objects.create(name=f"Location {i}"), content=f"Review {i}", rating=4)
+            for i in range(5)
+        ]
+
+    def test_claims_do_not_overlap(self):
+        first = claim_pending_reviews(3)
+        second = claim_pending_reviews(3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({review.id for review in first} & {review.id for review in second})
+        self.assertEqual(claim_pending_reviews(3), [])
+        self.assertEqual(Review.objects.filter(analysis_status='processing').count(), 5)
+
+    def test_expired_claims_are_released(self):
+        claimed = claim_pending_reviews(2)
+        self.assertEqual(release_expired_claims(), 0)
+        Review.objects.filter(id=claimed[0].id).update(analysis_claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(release_expired_claims(), 1)
+        self.assertEqual(Review.objects.get(id=claimed[0].id).analysis_status, 'pending')
+
+    def test_analyzed_reviews_are_written_back(self):
+        results = lambda rows: [(review_id, 'NEGATIVE', 0.9, {'positive_keywords': [], 'negative_keywords': ['noisy']}) for review_id, _ in rows]
+        with mock.patch('destinations.review_analysis.analyze_review_rows', side_effect=results):
+            self.assertEqual(analyze_pending_reviews(batch_size=2), 5)
+        for review in Review.objects.all():
+            self.assertEqual((review.analysis_status, review.sentiment, review.analysis_claim), ('done', 'NEGATIVE', None))
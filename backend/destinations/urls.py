@@ -11,8 +11,10 @@ urlpatterns = [
     # Basic location endpoints
     path('', views.get_locations, name='get_locations'), # ✅ Added API path for get locations
     path('<int:pk>/', views.get_location_detail, name='get_location_detail'), # ✅ Added API path for get location detail
+    path('<int:pk>/similar/', views.get_similar_locations, name='get_similar_locations'), # Destinations similar to a destination (item similarity graph)
     path('tag/<str:tag>/', views.get_locations_by_tag, name='get_locations_by_tag'), # ✅ Added API path for get locations by tag
     path('search/nlp/', views.search_destinations_nlp, name='search_destinations_nlp'), # ✅ Added API path for search destinations by NLP
+    path('health/nlp/', views.nlp_health, name='nlp_health'), # Readiness of NLP models and search indexes
     
     # Likes and reviews endpoints
     path('', include(router.urls)), # ✅ Added API path for likes and reviews
@@ -0,0 +1,403 @@
+"""
+Per-user recommendation features.
+
+Recommendation requests read the aggregated history of a user (tag, country
+and keyword counts derived from likes and reviews) from a single
+UserFeatureProfile row instead of re-deriving it from every like and review.
+
+Profiles are built from scratch the first time they are needed and are then
+kept up to date incrementally: Like and Review signals add or subtract the
+contribution of the changed row. Bulk writes that bypass signals (the
+background review analysis and the reanalyze_reviews command) rebuild the
+profiles of the affected users. Edits of liked or reviewed locations only
+flag the affected profiles as stale, so a catalogue import does not rebuild
+thousands of profiles; a stale profile is rebuilt the next time it is read
+(or by rebuild_user_features --stale).
+"""
+from collections import Counter
+
+from django.db import transaction
+
+# Profile fields holding {key: count} dictionaries
+LIKE_FEATURE_FIELDS = ('category_counts', 'subcategory_counts', 'subtype_counts', 'country_counts', 'city_counts')
+REVIEW_FEATURE_FIELDS = ('review_country_counts', 'positive_keyword_counts', 'negative_keyword_counts',
+                         'high_rated_locations', 'low_rated_locations')
+# Every field derived from likes and reviews (saved without touching the stale flag)
+PROFILE_FIELDS = ('likes_count', 'reviews_count', 'liked_locations') + LIKE_FEATURE_FIELDS + REVIEW_FEATURE_FIELDS
+
+
+def extract_countries_from_keywords(keywords):
+    """
+    Extract countries from keyword list.
+    """
+    # List of common country names (stored in lowercase)
+    common_countries = {
+        'vietnam', 'thailand', 'japan', 'korea', 'china', 'malaysia', 'indonesia',
+        'singapore', 'philippines', 'australia', 'new zealand', 'usa', 'america',
+        'canada', 'mexico', 'brazil', 'peru', 'argentina', 'chile', 'uk', 'england',
+        'france', 'italy', 'spain', 'germany', 'netherlands', 'turkey', 'russia',
+        'india', 'egypt', 'morocco', 'south africa', 'greece', 'switzerland'
+    }
+
+    # Process country name variations
+    country_aliases = {
+        'american': 'usa',
+        'british': 'uk',
+        'english': 'uk',
+        'french': 'france',
+        'italian': 'italy',
+        'spanish': 'spain',
+        'german': 'germany',
+        'dutch': 'netherlands',
+        'turkish': 'turkey',
+        'russian': 'russia',
+        'indian': 'india',
+        'egyptian': 'egypt',
+        'thai': 'thailand',
+        'vietnamese': 'vietnam',
+        'japanese': 'japan',
+        'south_korean': 'south_korea',
+        'chinese': 'china',
+        'malaysian': 'malaysia',
+        'indonesian': 'indonesia'
+    }
+
+    found_countries = []
+
+    for keyword in keywords:
+        keyword_lower = keyword.lower()
+
+        # Direct match
+        if keyword_lower in common_countries:
+            found_countries.append(keyword_lower)
+
+        # Alias match
+        elif keyword_lower in country_aliases:
+            found_countries.append(country_aliases[keyword_lower])
+
+    return found_countries
+
+
+def extract_countries_from_text(text):
+    """
+    Extract countries from text.
+    """
+    # Include country name variations
+    countries_with_variants = {
+        'vietnam': ['vietnam', 'vietnamese', 'hanoi', 'ho chi minh'],
+        'thailand': ['thailand', 'thai', 'bangkok', 'phuket'],
+        'japan': ['japan', 'japanese', 'tokyo', 'kyoto', 'osaka'],
+        'south_korea': ['south_korea', 'south_korean', 'seoul', 'busan'],
+        'china': ['china', 'chinese', 'beijing', 'shanghai'],
+        'malaysia': ['malaysia', 'malaysian', 'kuala lumpur', 'penang'],
+        'indonesia': ['indonesia', 'indonesian', 'bali', 'jakarta'],
+        'singapore': ['singapore', 'singaporean'],
+        'philippines': ['philippines', 'filipino', 'manila', 'cebu'],
+        'australia': ['australia', 'australian', 'sydney', 'melbourne'],
+        'usa': ['usa', 'america', 'american', 'united states', 'new york', 'los angeles'],
+        'uk': ['uk', 'britain', 'british', 'england', 'london'],
+        'france': ['france', 'french', 'paris', 'nice'],
+        'italy': ['italy', 'italian', 'rome', 'venice', 'milan'],
+        'spain': ['spain', 'spanish', 'madrid', 'barcelona'],
+        'germany': ['germany', 'german', 'berlin', 'munich']
+    }
+
+    found_countries = []
+    text_lower = text.lower()
+
+    for country, variants in countries_with_variants.items():
+        for variant in variants:
+            if variant in text_lower:
+                found_countries.append(country)
+                break  # Add only once if a country variant is found
+
+    return found_countries
+
+
+def like_features(location):
+    """
+    Contribution of one liked location to a profile.
+
+    Parameters:
+        location: Liked Location
+
+    Returns:
+        dict: {profile field: Counter}
+    """
+    features = {field: Counter() for field in LIKE_FEATURE_FIELDS}
+    if location.category:
+        features['category_counts'][location.category] += 1
+    for field, values in (('subcategory_counts', location.subcategories), ('subtype_counts', location.subtypes)):
+        if isinstance(values, list):
+            for value in values:
+                features[field][value] += 1
+        elif isinstance(values, str) and values:
+            features[field][values] += 1
+    if location.country:
+        features['country_counts'][location.country] += 1
+    if location.city:
+        features['city_counts'][location.city] += 1
+    return features
+
+
+def review_features(rating, keywords, content, location_id, location_country):
+    """
+    Contribution of one review to a profile.
+
+    Parameters:
+        rating: Review rating (1-5)
+        keywords: Review keywords (dict with positive/negative keyword lists, or a legacy list)
+        content: Review text
+        location_id: Reviewed Location id
+        location_country: Country of the reviewed location
+
+    Returns:
+        dict: {profile field: Counter}
+    """
+    features = {field: Counter() for field in REVIEW_FEATURE_FIELDS}
+
+    # Legacy support for old reviews without separate positive/negative keywords
+    if isinstance(keywords, list):
+        if rating >= 4:
+            features['positive_keyword_counts'].update(keywords)
+        elif rating <= 2:
+            features['negative_keyword_counts'].update(keywords)
+    # Support for newer structure
+    elif isinstance(keywords, dict):
+        pos_keywords = keywords.get('positive_keywords', [])
+        neg_keywords = keywords.get('negative_keywords', [])
+        features['positive_keyword_counts'].update(pos_keywords)
+        features['negative_keyword_counts'].update(neg_keywords)
+
+        # Country names in keywords
+        for country in extract_countries_from_keywords(pos_keywords + neg_keywords):
+            features['review_country_counts'][country] += 1
+
+    # Country names mentioned in the review text (higher weight)
+    if content:
+        for country in extract_countries_from_text(content):
+            features['review_country_counts'][country] += 2
+
+    # Country of the reviewed location (highest weight)
+    if location_country:
+        features['review_country_counts'][location_country] += 3
+
+    # Classify by rating
+    if rating >= 4:
+        features['high_rated_locations'][str(location_id)] += 1
+    elif rating <= 2:
+        features['low_rated_locations'][str(location_id)] += 1
+    return features
+
+
+def review_features_of(review):
+    return review_features(review.rating, review.keywords, review.content, review.location_id, review.location.country)
+
+
+def apply_features(profile, features, sign):
+    """
+    Add (sign=1) or subtract (sign=-1) a contribution; keys that drop to zero are removed.
+    """
+    for field, counts in features.items():
+        values = dict(getattr(profile, field) or {})
+        for key, count in counts.items():
+            total = values.get(key, 0) + sign * count
+            if total > 0:
+                values[key] = total
+            else:
+                values.pop(key, None)
+        setattr(profile, field, values)
+
+
+def compute_profile(user_id):
+    """
+    Compute a user's profile from all of the user's likes and reviews, without saving it.
+
+    Parameters:
+        user_id: User id
+
+    Returns:
+        UserFeatureProfile: Unsaved profile
+    """
+    from .models import Like, Review, UserFeatureProfile
+
+    profile = UserFeatureProfile(user_id=user_id)
+    for field in LIKE_FEATURE_FIELDS + REVIEW_FEATURE_FIELDS:
+        setattr(profile, field, {})
+
+    likes = list(Like.objects.filter(user_id=user_id).select_related('location').order_by('-created_at'))
+    for like in likes:
+        apply_features(profile, like_features(like.location), 1)
+    profile.liked_locations = [like.location_id for like in likes]
+    profile.likes_count = len(likes)
+
+    reviews = list(Review.objects.filter(user_id=user_id).select_related('location'))
+    for review in reviews:
+        apply_features(profile, review_features_of(review), 1)
+    profile.reviews_count = len(reviews)
+    return profile
+
+
+def build_profile(user_id):
+    """
+    Build (or rebuild) a user's profile from all of the user's likes and reviews.
+
+    Parameters:
+        user_id: User id
+
+    Returns:
+        UserFeatureProfile: Saved profile
+    """
+    from .models import UserFeatureProfile
+
+    profile = compute_profile(user_id)
+    with transaction.atomic():
+        UserFeatureProfile.objects.filter(user_id=user_id).delete()
+        profile.save()
+    return profile
+
+
+def refresh_stale_profile(profile):
+    """
+    Rebuild a profile flagged as stale.
+    The flag is cleared before the locations are read, so an edit that lands
+    while the profile is recomputed flags it again instead of being lost.
+    If the counts did not change, the row is not written, so updated_at (and
+    the precomputed recommendations keyed on it) stays valid.
+
+    Parameters:
+        profile: Stale UserFeatureProfile
+
+    Returns:
+        UserFeatureProfile: Current profile
+    """
+    from .models import UserFeatureProfile
+
+    UserFeatureProfile.objects.filter(pk=profile.pk).update(stale=False)
+    profile.stale = False
+
+    rebuilt = compute_profile(profile.user_id)
+    if any(getattr(rebuilt, field) != getattr(profile, field) for field in PROFILE_FIELDS):
+        for field in PROFILE_FIELDS:
+            setattr(profile, field, getattr(rebuilt, field))
+        profile.save(update_fields=PROFILE_FIELDS + ('updated_at',))
+    return profile
+
+
+def get_profile(user):
+    """
+    Get a user's profile, building it on first use and rebuilding it when stale.
+
+    Parameters:
+        user: User
+
+    Returns:
+        UserFeatureProfile: Profile
+    """
+    from .models import UserFeatureProfile
+
+    profile = UserFeatureProfile.objects.filter(user_id=user.id).first()
+    if profile is None:
+        return build_profile(user.id)
+    return refresh_stale_profile(profile) if profile.stale else profile
+
+
+def update_profile(user_id, update):
+    """
+    Apply an incremental update to an existing profile.
+    Users without a profile are skipped; their profile is built from scratch when first needed.
+
+    Parameters:
+        user_id: User id
+        update: Function that changes the profile in place
+    """
+    from .models import UserFeatureProfile
+
+    with transaction.atomic():
+        profile = UserFeatureProfile.objects.select_for_update().filter(user_id=user_id).first()
+        if profile is None:
+            return
+        update(profile)
+        profile.save(update_fields=PROFILE_FIELDS + ('updated_at',))
+
+
+def like_added(like):
+    def update(profile):
+        apply_features(profile, like_features(like.location), 1)
+        profile.liked_locations = [like.location_id] + [i for i in profile.liked_locations if i != like.location_id]
+        profile.likes_count += 1
+    update_profile(like.user_id, update)
+
+
+def like_removed(like, location):
+    def update(profile):
+        apply_features(profile, like_features(location), -1)
+        profile.liked_locations = [i for i in profile.liked_locations if i != like.location_id]
+        profile.likes_count = max(0, profile.likes_count - 1)
+    update_profile(like.user_id, update)
+
+
+def review_saved(review, previous_features=None):
+    """
+    Update a profile after a review was created or edited.
+
+    Parameters:
+        review: Saved Review
+        previous_features: Contribution of the review before the edit (None for new reviews)
+    """
+    def update(profile):
+        if previous_features is not None:
+            apply_features(profile, previous_features, -1)
+        else:
+            profile.reviews_count += 1
+        apply_features(profile, review_features_of(review), 1)
+    update_profile(review.user_id, update)
+
+
+def review_deleted(review, features):
+    def update(profile):
+        apply_features(profile, features, -1)
+        profile.reviews_count = max(0, profile.reviews_count - 1)
+    update_profile(review.user_id, update)
+
+
+def rebuild_profiles(user_ids):
+    """
+    Rebuild the existing profiles of several users (after bulk review updates).
+
+    Parameters:
+        user_ids: Iterable of user ids
+    """
+    from .models import UserFeatureProfile
+
+    existing = UserFeatureProfile.objects.filter(user_id__in=set(user_ids)).values_list('user_id', flat=True)
+    for user_id in list(existing):
+        build_profile(user_id)
+
+
+def locations_changed(location_ids):
+    """
+    Flag the existing profiles of users who liked or reviewed edited locations
+    as stale, since their counts were derived from the previous location attributes.
+    The profiles are rebuilt when next read (see get_profile).
+
+    Parameters:
+        location_ids: Iterable of edited Location ids
+
+    Returns:
+        int: Number of profiles flagged
+    """
+    from django.db.models import Q
+    from .models import Like, Review, UserFeatureProfile
+
+    location_ids = sorted(set(location_ids))
+    flagged = 0
+    for i in range(0, len(location_ids), 1000):
+        chunk = location_ids[i:i + 1000]
+        # update() leaves updated_at untouched: precomputed lists stay valid until the profile really changes
+        flagged += UserFeatureProfile.objects.filter(
+            Q(user_id__in=Like.objects.filter(location_id__in=chunk).values('user_id'))
+            | Q(user_id__in=Review.objects.filter(location_id__in=chunk).values('user_id')),
+            stale=False,
+        ).update(stale=True)
+    return flagged
@@ -13,8 +13,17 @@ from rest_framework.permissions import AllowAny
 from rest_framework import status
 import urllib.parse
 from django.db import connection
+from django.conf import settings
 from .nlp_utils import nlp_processor
 from .review_utils import find_similar_destinations
+from .spatial_index import spatial_index, NUMPY_AVAILABLE as SPATIAL_INDEX_AVAILABLE
+from .tag_vocabulary import tag_vocabulary
+from .bitmap_index import attribute_index, Bitmap
+from .item_neighbors import similar_to
+from .user_features import get_profile
+from . import recommendation_store
+from .search_stats import search_query_buffer
+from .recommendation_store import location_to_dict
 from collections import Counter
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
@@ -100,6 +109,49 @@ def get_location_detail(request, pk):
     except Location.DoesNotExist:
         return Response({"error": "Location not found"}, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_similar_locations(request, pk):
+    """
+    API endpoint to retrieve destinations similar to a specific destination.
+    Reads the precomputed item-to-item similarity graph (build_item_neighbors);
+    destinations not in the graph yet get destinations with the same primary
+    subcategory in the same country.
+    
+    Parameters:
+        request: HTTP request with optional 'limit' query parameter (default: 10)
+        pk: Primary key of the destination
+        
+    Returns:
+        Response with the similar destinations, most similar first, or error message
+    """
+    try:
+        location = Location.objects.get(pk=pk)
+    except Location.DoesNotExist:
+        return Response({"error": "Location not found"}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), getattr(settings, 'ITEM_NEIGHBORS_K', 50)))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    scored_ids = similar_to([location.id])
+    if not scored_ids:
+        # Not in the similarity graph yet
+        fallback_ids = attribute_index.lookup('primary_subcategory', location.primary_subcategory) & attribute_index.lookup('country', location.country)
+        fallback_ids.discard(location.id)
+        scored_ids = [(location_id, 0.5) for location_id in fallback_ids.first(limit)]
+    
+    # Neighbours deleted since the graph was computed are skipped
+    locations = Location.objects.in_bulk([location_id for location_id, _ in scored_ids[:limit * 2]])
+    results = [
+        location_to_dict(locations[location_id], similarity, "similar")
+        for location_id, similarity in scored_ids
+        if location_id in locations
+    ][:limit]
+    
+    return Response({"location_id": location.id, "results": results})
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_locations_by_tag(request, tag):
@@ -119,82 +171,29 @@ def get_locations_by_tag(request, tag):
         decoded_tag = urllib.parse.unquote(tag)
         print(f"Tag search: {decoded_tag}")
         
-        # Search for destinations based on exact subcategory0
-        with connection.cursor() as cursor:
-            # Get list of valid subcategory0
-            cursor.execute("""
-                SELECT DISTINCT json_extract(subcategories, '$[0]') AS first_subcategory
-                FROM destinations_location
-                WHERE json_extract(subcategories, '$[0]') IS NOT NULL
-                ORDER BY first_subcategory;
-            """)
-            valid_tags = [row[0] for row in cursor.fetchall() if row[0]]
-            
-            # Debug: print all valid tags
-            print("List of valid tags:")
-            for i, vtag in enumerate(valid_tags):
-                print(f"{i+1}. {vtag}")
-            
-            # Normalize tag name (handle special characters)
-            normalized_tag = None
-            
-            # Find exact matching tag
-            if decoded_tag in valid_tags:
-                normalized_tag = decoded_tag
-            else:
-                # Compare ignoring case
-                for valid_tag in valid_tags:
-                    if valid_tag.lower() == decoded_tag.lower():
-                        normalized_tag = valid_tag
-                        break
-                
-                # Compare handling special characters
-                if not normalized_tag:
-                    for valid_tag in valid_tags:
-                        # Convert '&' and 'and' for comparison
-                        if valid_tag.replace('&', 'and').lower() == decoded_tag.lower() or \
-                           decoded_tag.replace('and', '&').lower() == valid_tag.lower():
-                            normalized_tag = valid_tag
-                            break
-            
-            if not normalized_tag:
-                print(f"Invalid tag: {decoded_tag}")
-                
-                # Find most similar tag (partial match)
-                similar_tags = []
-                for valid_tag in valid_tags:
-                    if decoded_tag.lower() in valid_tag.lower() or valid_tag.lower() in decoded_tag.lower():
-                        similar_tags.append(valid_tag)
-                
-                if similar_tags:
-                    print(f"Similar tags: {similar_tags}")
-                    normalized_tag = similar_tags[0]  # Use first similar tag
-                else:
-                    return Response({"error": f"Invalid tag: {decoded_tag}"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            print(f"Normalized tag: {normalized_tag}")
-            
-            # Find locations where first subcategory matches the tag
-            cursor.execute("""
-                SELECT id, name
-                FROM destinations_location
-                WHERE json_extract(subcategories, '$[0]') = %s
-                LIMIT 20
-            """, [normalized_tag])
-            
-            matching_rows = cursor.fetchall()
-            matching_ids = [row[0] for row in matching_rows]
-            
-            print(f"Found {len(matching_ids)} destinations with first subcategory '{normalized_tag}'")
-            for row in matching_rows[:5]:  # Print first 5 only
-                print(f"Matching destination - ID: {row[0]}, Name: {row[1]}")
+        # Resolve the tag against the cached vocabulary of valid subcategory0
+        # (exact, case-insensitive, '&'/'and', then partial and similar spellings)
+        normalized_tag = tag_vocabulary.resolve(decoded_tag)
+        if not normalized_tag:
+            print(f"Invalid tag: {decoded_tag}")
+            return Response({"error": f"Invalid tag: {decoded_tag}"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        print(f"Normalized tag: {normalized_tag}")
+        
+        # Find locations where first subcategory matches the tag (attribute bitmap index)
+        matching_ids = attribute_index.lookup('primary_subcategory', normalized_tag).first(20)
+        
+        print(f"Found {len(matching_ids)} destinations with first subcategory '{normalized_tag}'")
         
         if not matching_ids:
             print(f"No destinations found for tag '{normalized_tag}'")
             return Response({"tag": decoded_tag, "destinations": []}, status=status.HTTP_200_OK)
         
         # Get matching destinations
-        locations = Location.objects.filter(id__in=matching_ids)
+        locations = locations_in_order(matching_ids)
+        for location in locations[:5]:  # Print first 5 only
+            print(f"Matching destination - ID: {location.id}, Name: {location.name}")
+        
         serializer = LocationSerializer(locations, many=True)
         
         return Response({
@@ -218,6 +217,7 @@ def search_destinations_nlp(request):
             - query: search term
             - limit: number of results to return (default: 20, max: 200)
             - retry: retry flag (if True, ignore cache and search again)
+            - mode: 'semantic' (default) or 'lexical' (BM25F ranking only)
         
     Returns:
         Response with search results matching the query or error details
@@ -238,24 +238,31 @@ def search_destinations_nlp(request):
         # Check retry flag
         retry = request.query_params.get('retry', 'false').lower() == 'true'
         
-        print(f"NLP search query: {query}, result limit: {limit}, retry: {retry}")
+        # Search mode
+        mode = request.query_params.get('mode', 'semantic').lower()
+        if mode not in ('semantic', 'lexical'):
+            mode = 'semantic'
+        
+        print(f"NLP search query: {query}, result limit: {limit}, retry: {retry}, mode: {mode}")
         
         # Get all destinations
         all_locations = Location.objects.all()
         
         # Perform NLP search (ignore cache if retry)
         if retry:
-            # Create cache key
-            cache_key = f"{query}:{limit}"
-            # Remove key from cache
-            from .nlp_utils import search_cache
-            if search_cache.get(cache_key):
-                search_cache.cache.pop(cache_key, None)
-                search_cache.timestamps.pop(cache_key, None)
-                print(f"Cache item removed: {cache_key}")
+            # Remove cached results for this query
+            from . import search_cache
+            if search_cache.invalidate(query, limit):
+                print(f"Cache item removed: {query}:{limit}")
+        
+        # Count the query so popular searches can be pre-computed at warm-up (written in the background)
+        search_query_buffer.add(query)
         
         # Perform NLP search
-        search_results = nlp_processor.search_destinations(query, all_locations, top_n=limit)
+        if mode == 'lexical':
+            search_results = nlp_processor.lexical_search(query, all_locations, top_n=limit)
+        else:
+            search_results = nlp_processor.search_destinations(query, all_locations, top_n=limit)
         
         # Format results
         formatted_results = []
@@ -276,6 +283,7 @@ def search_destinations_nlp(request):
         return Response({
             "query": query,
             "limit": limit,
+            "mode": mode,
             "results_count": len(formatted_results),
             "results": formatted_results
         }, status=status.HTTP_200_OK)
@@ -287,6 +295,32 @@ def search_destinations_nlp(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def nlp_health(request):
+    """
+    Readiness check for load balancers.
+    Returns 503 while this worker is still loading NLP models and search indexes.
+    
+    Parameters:
+        request: HTTP request
+        
+    Returns:
+        Response with warm-up status (200 when ready, 503 otherwise)
+    """
+    from .warmup import warmup_state, is_ready
+    from .nlp_utils import NLP_ADVANCED
+    
+    ready = is_ready()
+    return Response({
+        "ready": ready,
+        "status": warmup_state['status'],
+        "advanced_nlp": NLP_ADVANCED,
+        "models_loaded": nlp_processor.models_loaded,
+        "steps": warmup_state['steps'],
+        "error": warmup_state['error'],
+    }, status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
 # Like API
 class LikeViewSet(viewsets.ModelViewSet):
     """
@@ -420,47 +454,13 @@ class ReviewViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_409_CONFLICT
                 )
             
-            # Analyze review text with improved analysis
-            from .review_utils import analyze_review
-            try:
-                analysis_result = analyze_review(content, rating=float(rating))
-            except Exception as e:
-                print(f"Analysis error occurred: {str(e)}")
-                # Use default values if analysis fails
-                analysis_result = {
-                    'sentiment': 'POSITIVE' if rating >= 4 else ('NEGATIVE' if rating <= 2 else 'NEUTRAL'),
-                    'sentiment_score': 0.5,
-                    'positive_keywords': [],
-                    'negative_keywords': [],
-                    'meaning_units': {
-                        'phrases': [],
-                        'adj_noun_pairs': [],
-                        'negation_concepts': [],
-                        'positive_units': [],
-                        'negative_units': []
-                    }
-                }
-            
-            # Prepare keyword data in a new way
-            # 1. Use only basic data that can be JSON serialized
-            # 2. Do not store dictionary strings, let the model serialize
-            keywords_data = {
-                'positive': analysis_result.get('positive_keywords', []),
-                'negative': analysis_result.get('negative_keywords', []),
-                # Meaning units are simplified
-                'phrases': analysis_result.get('meaning_units', {}).get('phrases', []),
-                'adj_noun_pairs': analysis_result.get('meaning_units', {}).get('adj_noun_pairs', []),
-                'sentiment': analysis_result.get('sentiment', 'NEUTRAL')
-            }
-            
-            # Instead of directly creating the model, use the serializer
+            # Sentiment and keywords are analyzed in the background after saving
+            # (Review.save marks the review as pending)
             review_data = {
                 'user': request.user.id,
                 'location_id': location.id,
                 'content': content,
-                'rating': rating,
-                'sentiment': analysis_result.get('sentiment', 'NEUTRAL'),
-                'keywords': keywords_data  # simple structure
+                'rating': rating
             }
             
             serializer = self.get_serializer(data=review_data)
@@ -479,20 +479,145 @@ class ReviewViewSet(viewsets.ModelViewSet):
             )
 
 # Destination recommendation API
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def recommend_destinations(request):
+def locations_in_order(location_ids):
     """
-    Personalized destination recommendation API.
+    Fetch locations by id, keeping the order of the ids (missing ids are skipped).
+    
+    Parameters:
+        location_ids: List of location ids
+        
+    Returns:
+        list: Location objects
+    """
+    locations = Location.objects.in_bulk(location_ids)
+    return [locations[location_id] for location_id in location_ids if location_id in locations]
+
+def rank_candidates(candidate_ids, neighbor_ranking, limit):
+    """
+    Pick candidate destinations: those most similar to the user's liked destinations
+    (similarity graph neighbours) first, then a random sample of the other candidates.
+    Only the returned ids are materialized, not the whole candidate bitmap.
+    
+    Parameters:
+        candidate_ids: Bitmap of candidate location ids
+        neighbor_ranking: Location ids ranked by similarity to the liked destinations
+        limit: Maximum number of ids to return
+        
+    Returns:
+        list: Up to limit candidate location ids
+    """
+    ranked_ids = []
+    for location_id in neighbor_ranking:
+        if len(ranked_ids) >= limit:
+            return ranked_ids
+        if location_id in candidate_ids:
+            ranked_ids.append(location_id)
+    return ranked_ids + (candidate_ids - Bitmap(ranked_ids)).sample(limit - len(ranked_ids))
+
+def recommend_from_recently_viewed(recently_viewed, liked_bitmap, limit):
+    """
+    Recommend destinations similar to recently viewed ones: their neighbours in the item
+    similarity graph first, then destinations with the same country, subcategories or subtypes.
+    
+    Parameters:
+        recently_viewed: List of recently viewed destination dictionaries (id, country, subcategories, subtypes)
+        liked_bitmap: Bitmap of liked location ids (excluded)
+        limit: Maximum number of recommendations
+        
+    Returns:
+        list: (location, similarity) tuples, most similar first
+    """
+    # Collect countries, subcategories, subtypes from recently viewed destinations
+    rv_countries = []
+    rv_subcategories = []
+    rv_subtypes = []
+    
+    for item in recently_viewed:
+        if item.get('country'):
+            rv_countries.append(item.get('country'))
+        
+        if item.get('subcategories'):
+            subcats = item.get('subcategories')
+            if isinstance(subcats, list):
+                rv_subcategories.extend(subcats)
+            else:
+                rv_subcategories.append(subcats)
+        
+        if item.get('subtypes'):
+            subtypes = item.get('subtypes')
+            if isinstance(subtypes, list):
+                rv_subtypes.extend(subtypes)
+            else:
+                rv_subtypes.append(subtypes)
+    
+    # Remove duplicates
+    rv_countries = list(set(rv_countries))
+    rv_subcategories = list(set(rv_subcategories))
+    rv_subtypes = list(set(rv_subtypes))
+    
+    print(f"Recently viewed countries: {rv_countries}")
+    print(f"Recently viewed subcategories: {rv_subcategories}")
+    print(f"Recently viewed subtypes: {rv_subtypes}")
+    
+    # Candidate sets: same country, and subcategories/subtypes containing a recently viewed one
+    country_ids = attribute_index.any_of('country', rv_countries)
+    rv_subcategory_ids = attribute_index.containing('subcategory', rv_subcategories)
+    rv_subtype_ids = attribute_index.containing('subtype', rv_subtypes)
+    
+    # Exclude already liked destinations and recently viewed destinations
+    viewed_ids = [rv.get('id') for rv in recently_viewed if isinstance(rv.get('id'), int) and rv.get('id') >= 0]
+    excluded_ids = liked_bitmap | Bitmap(viewed_ids)
+    
+    # Most similar destinations from the precomputed similarity graph
+    scored_ids = similar_to(viewed_ids, excluded_ids)[:limit]
+    excluded_ids = excluded_ids | Bitmap(location_id for location_id, _ in scored_ids)
+    print(f"Similarity graph neighbours of recently viewed destinations: {len(scored_ids)}")
+    
+    country_ids -= excluded_ids
+    rv_subcategory_ids -= excluded_ids
+    rv_subtype_ids -= excluded_ids
+    
+    # Similarity score: country match 0.3, subcategory match 0.2, subtype match 0.2, limited to 0.7.
+    # Each score level is a bitmap expression; levels fill the remaining slots from the highest score down
+    both_tags = rv_subcategory_ids & rv_subtype_ids
+    any_tag = rv_subcategory_ids | rv_subtype_ids
+    score_levels = [
+        (0.7, country_ids & both_tags),
+        (0.5, (country_ids & any_tag) - both_tags),
+        (0.4, both_tags - country_ids),
+        (0.3, country_ids - any_tag),
+        (0.2, any_tag - both_tags - country_ids),
+    ]
+    for match_score, level_ids in score_levels:
+        if len(scored_ids) >= limit:
+            break
+        scored_ids.extend((location_id, match_score) for location_id in level_ids.first(limit - len(scored_ids)))
+    
+    recently_viewed_locations = Location.objects.in_bulk([location_id for location_id, _ in scored_ids])
+    recently_viewed_recommendations = [
+        (recently_viewed_locations[location_id], match_score)
+        for location_id, match_score in scored_ids
+        if location_id in recently_viewed_locations
+    ]
+    
+    print(f"Number of recently viewed-based recommendations: {len(recently_viewed_recommendations)}")
+    
+    return recently_viewed_recommendations
+
+def build_recommendations(user, recently_viewed=None, limit=10, profile=None):
+    """
+    Compute personalized destination recommendations.
     Recommends destinations based on user's likes, reviews, selected tags, and recently viewed destinations.
     Uses sophisticated recommendation algorithm with multiple ranking factors.
     
     Parameters:
-        request: HTTP POST request with optional recently_viewed list and query parameters:
-            - limit: Maximum number of recommendations to return (default: 10)
+        user: User to recommend for
+        recently_viewed: List of recently viewed destination dictionaries
+        limit: Maximum number of recommendations per list (default: 10)
+        profile: The user's UserFeatureProfile (loaded if not given)
     
     Returns:
-        Response with various categories of recommendations:
+        dict: Various categories of recommendations:
             - results: Main recommendation list
             - keyword_recommendations: Based on review keywords
             - subcategory_recommendations: Based on preferred subcategories
@@ -501,33 +626,32 @@ def recommend_destinations(request):
             - recently_viewed_recommendations: Based on recently viewed items
             - tag_group_recommendations: Grouped by user's selected tags
     """
-    user = request.user
-    limit = int(request.query_params.get('limit', 10))
-    
     # Set random seed based on current time
     random.seed(time.time())
     
     print(f"Starting personalized recommendations for user {user.username} - timestamp: {time.time()}")
     
     # 1. Collect user activity data
-    likes = Like.objects.filter(user=user)
-    reviews = Review.objects.filter(user=user)
+    # Likes and reviews are aggregated in one feature row (kept up to date by signals)
+    if profile is None:
+        profile = get_profile(user)
     
-    likes_count = likes.count()
-    reviews_count = reviews.count()
+    likes_count = profile.likes_count
+    reviews_count = profile.reviews_count
     total_activities = likes_count + reviews_count
     
     print(f"User activity: {likes_count} likes, {reviews_count} reviews")
     
     # Get recently viewed destinations
-    recently_viewed = request.data.get('recently_viewed', [])
+    recently_viewed = recently_viewed or []
     has_recently_viewed = len(recently_viewed) > 0
     
     if has_recently_viewed:
         print(f"Number of recently viewed destinations: {len(recently_viewed)}")
     
     # Print liked destination IDs (debugging)
-    liked_location_ids = [like.location.id for like in likes]
+    liked_location_ids = list(profile.liked_locations)
+    liked_bitmap = Bitmap(liked_location_ids)
     print(f"Liked destination IDs: {liked_location_ids}")
     
     # 2. Determine recommendation ratios based on activity data (less tag dependency with more activity)
@@ -555,46 +679,23 @@ def recommend_destinations(request):
             tag_groups = {}  # Group destinations by tag
             
             for tag in selected_tags:
-                # Get all destinations
-                all_locations = Location.objects.all()
-                tag_locations = []
-                
-                for loc in all_locations:
-                    if loc.subcategories:
-                        # If it's a string, convert to list
-                        subcats = loc.subcategories
-                        if isinstance(subcats, str):
-                            try:
-                                import json
-                                subcats = json.loads(subcats)
-                            except:
-                                subcats = [subcats]
-                        
-                        # If it's not a list, convert to list
-                        if not isinstance(subcats, list):
-                            subcats = [subcats]
-                        
-                        # Check if subcategories[0] exactly matches the tag
-                        if subcats and len(subcats) > 0 and subcats[0] == tag:
-                            tag_locations.append(loc)
-                
-                # Remove duplicates
-                tag_locations = list({loc.id: loc for loc in tag_locations}.values())
+                # Match the selected tag to its spelling in the catalogue (cached tag vocabulary)
+                resolved_tag = tag_vocabulary.resolve(tag, fuzzy=False) or tag
                 
-                # Exclude already liked destinations
-                liked_ids = [like.location.id for like in likes]
-                tag_locations = [loc for loc in tag_locations if loc.id not in liked_ids]
+                # Destinations whose subcategories[0] matches the tag, excluding already liked destinations
+                tag_ids = attribute_index.lookup('primary_subcategory', resolved_tag) - liked_bitmap
+                tag_locations = locations_in_order(tag_ids.first(5))
                 
                 # Add tag group only if there are results
                 if tag_locations:
                     # Assign similarity score to each destination (fixed at 0.7)
-                    tag_group_results = [(loc, 0.7) for loc in tag_locations[:5]]
+                    tag_group_results = [(loc, 0.7) for loc in tag_locations]
                     tag_groups[tag] = tag_group_results
                     
                     # Add to overall results list
                     tag_based_results.extend(tag_group_results)
                     
-                    print(f"Found {len(tag_locations)} destinations related to tag '{tag}'")
+                    print(f"Found {len(tag_ids)} destinations related to tag '{tag}'")
                 else:
                     print(f"No destinations found matching tag '{tag}'")
             
@@ -622,111 +723,36 @@ def recommend_destinations(request):
     
     # 4. Activity-based recommendations (from likes and reviews analysis)
     if total_activities > 0:
-        # 3.1 Analyze liked destinations
-        liked_locations = [like.location for like in likes]
-        liked_categories = Counter()
-        liked_subcategories = Counter()
-        liked_subtypes = Counter()
-        liked_countries = Counter()
-        liked_cities = Counter()
-        
-        for loc in liked_locations:
-            if loc.category:
-                liked_categories[loc.category] += 1
-            
-            # Analyze subcategories
-            if loc.subcategories:
-                if isinstance(loc.subcategories, list):
-                    for subcat in loc.subcategories:
-                        liked_subcategories[subcat] += 1
-                elif isinstance(loc.subcategories, str):
-                    liked_subcategories[loc.subcategories] += 1
-            
-            # Analyze subtypes
-            if loc.subtypes:
-                if isinstance(loc.subtypes, list):
-                    for subtype in loc.subtypes:
-                        liked_subtypes[subtype] += 1
-                elif isinstance(loc.subtypes, str):
-                    liked_subtypes[loc.subtypes] += 1
-            
-            if loc.country:
-                liked_countries[loc.country] += 1
-            if loc.city:
-                liked_cities[loc.city] += 1
-        
-        # 3.2 Analyze reviews with improved keyword handling
-        review_keywords_positive = []
-        review_keywords_negative = []
-        positive_reviews = []
-        negative_reviews = []
-        
-        # List of destination IDs with high/low ratings 
-        high_rated_location_ids = []  # IDs of destinations rated 4-5
-        low_rated_location_ids = []   # IDs of destinations rated 1-2
-        
-        # Improved country extraction: Track countries mentioned in reviews
-        review_countries = Counter()
-        
-        for review in reviews:
-            # Extract keywords with context
-            if hasattr(review, 'keywords'):
-                # Legacy support for old reviews without separate positive/negative keywords
-                if isinstance(review.keywords, list):
-                    if review.rating >= 4:
-                        review_keywords_positive.extend(review.keywords)
-                    elif review.rating <= 2:
-                        review_keywords_negative.extend(review.keywords)
-                # Support for newer structure
-                elif isinstance(review.keywords, dict):
-                    pos_keywords = review.keywords.get('positive_keywords', [])
-                    neg_keywords = review.keywords.get('negative_keywords', [])
-                    if pos_keywords:
-                        review_keywords_positive.extend(pos_keywords)
-                    if neg_keywords:
-                        review_keywords_negative.extend(neg_keywords)
-                    
-                    # Improved country extraction: Find country names in keywords
-                    all_keywords = pos_keywords + neg_keywords
-                    countries = extract_countries_from_keywords(all_keywords)
-                    for country in countries:
-                        review_countries[country] += 1
-            
-            # Improved country extraction: Extract country names directly from review content
-            if hasattr(review, 'content') and review.content:
-                content_countries = extract_countries_from_text(review.content)
-                for country in content_countries:
-                    review_countries[country] += 2  # Higher weight for explicitly mentioned countries
-            
-            # Improved country extraction: Add the country of the reviewed location
-            if review.location.country:
-                review_countries[review.location.country] += 3  # Highest weight for the country of the reviewed location
-            
-            # Classify by rating
-            if review.rating >= 4:
-                high_rated_location_ids.append(review.location.id)
-                positive_reviews.append(review)
-            elif review.rating <= 2:
-                low_rated_location_ids.append(review.location.id)
-                negative_reviews.append(review)
-            # For rating 3, classify based on sentiment analysis
-            elif hasattr(review, 'sentiment') and review.sentiment == 'POSITIVE':
-                positive_reviews.append(review)
+        # 3.1 Features of liked destinations
+        liked_categories = Counter(profile.category_counts)
+        liked_subcategories = Counter(profile.subcategory_counts)
+        liked_subtypes = Counter(profile.subtype_counts)
+        liked_countries = Counter(profile.country_counts)
+        liked_cities = Counter(profile.city_counts)
+        
+        # 3.2 Features of reviews: keywords, mentioned/reviewed countries and high/low rated destinations
+        review_countries = Counter(profile.review_country_counts)
+        high_rated_location_ids = [int(location_id) for location_id in profile.high_rated_locations]  # IDs of destinations rated 4-5
+        low_rated_location_ids = [int(location_id) for location_id in profile.low_rated_locations]    # IDs of destinations rated 1-2
         
         print(f"High-rated (4-5 stars) destination IDs: {high_rated_location_ids}")
         print(f"Low-rated (1-2 stars) destination IDs: {low_rated_location_ids}")
-        print(f"Positive keywords from reviews: {review_keywords_positive}")
-        print(f"Negative keywords from reviews: {review_keywords_negative}")
+        print(f"Positive keywords from reviews: {profile.positive_keyword_counts}")
+        print(f"Negative keywords from reviews: {profile.negative_keyword_counts}")
         
         # 3.3 Calculate keyword frequency
-        pos_keyword_counts = Counter(review_keywords_positive)
-        neg_keyword_counts = Counter(review_keywords_negative)
+        pos_keyword_counts = Counter(profile.positive_keyword_counts)
+        neg_keyword_counts = Counter(profile.negative_keyword_counts)
         top_pos_keywords = [word for word, count in pos_keyword_counts.most_common(10)]
         top_neg_keywords = [word for word, count in neg_keyword_counts.most_common(10)]
         
         print(f"Top positive keywords: {top_pos_keywords}")
         print(f"Top negative keywords: {top_neg_keywords}")
         
+        # Destinations most similar to the 20 most recently liked ones (precomputed similarity graph)
+        liked_neighbor_ids = [location_id for location_id, _ in similar_to(liked_location_ids[:20], liked_bitmap)]
+        print(f"Similarity graph neighbours of liked destinations: {len(liked_neighbor_ids)}")
+        
         # 3.4 Find activity-based recommendation destinations
         # Search for similar destinations based on liked destination characteristics and positive review keywords
         # while avoiding destinations similar to negative review keywords
@@ -775,48 +801,18 @@ def recommend_destinations(request):
             top_subcategories = [subcat for subcat, _ in liked_subcategories.most_common(5)]
             print(f"Top subcategories: {top_subcategories}")
             
-            # Build query for JSON field search
-            subcategory_locations = []
-            
-            # Get all destinations and filter in Python due to database compatibility issues
-            all_locations = Location.objects.all()
-            
-            for loc in all_locations:
-                if loc.subcategories:
-                    # Convert string to list if necessary
-                    loc_subcats = loc.subcategories
-                    if isinstance(loc_subcats, str):
-                        try:
-                            import json
-                            loc_subcats = json.loads(loc_subcats)
-                        except:
-                            loc_subcats = [loc_subcats]
-                    
-                    # Convert to list if not a list
-                    if not isinstance(loc_subcats, list):
-                        loc_subcats = [loc_subcats]
-                    
-                    # Check for subcategory match
-                    for subcat in top_subcategories:
-                        if subcat in loc_subcats:
-                            subcategory_locations.append(loc)
-                            break
+            # Destinations with any of the subcategories, excluding already liked destinations
+            subcategory_ids = attribute_index.any_of('subcategory', top_subcategories) - liked_bitmap
             
-            # Remove duplicates
-            subcategory_locations = list({loc.id: loc for loc in subcategory_locations}.values())
+            print(f"Number of subcategory-based recommendation destinations: {len(subcategory_ids)}")
             
-            # Exclude already liked destinations
-            liked_ids = [loc.id for loc in liked_locations]
-            subcategory_locations = [loc for loc in subcategory_locations if loc.id not in liked_ids]
-            
-            print(f"Number of subcategory-based recommendation destinations: {len(subcategory_locations)}")
-            
-            # Shuffle randomly to provide varied recommendations
-            random.shuffle(subcategory_locations)
+            # Most similar to liked destinations first, the rest shuffled to provide varied recommendations
+            subcategory_ids = rank_candidates(subcategory_ids, liked_neighbor_ids, limit)
+            subcategory_locations = locations_in_order(subcategory_ids)
             
             # Select top results (varied similarity scores)
             subcategory_results = []
-            for i, loc in enumerate(subcategory_locations[:limit]):
+            for i, loc in enumerate(subcategory_locations):
                 # Similarity score - without randomness
                 base_similarity = 0.75 + (i % 4) * 0.05
                 similarity = base_similarity
@@ -831,50 +827,22 @@ def recommend_destinations(request):
             top_subtypes = [subtype for subtype, _ in liked_subtypes.most_common(5)]
             print(f"Top subtypes: {top_subtypes}")
             
-            # Build query for JSON field search
-            subtype_locations = []
-            
-            # Get all destinations and filter in Python due to database compatibility issues
-            all_locations = Location.objects.all()
-            
-            for loc in all_locations:
-                if loc.subtypes:
-                    # Convert string to list if necessary
-                    loc_subtypes = loc.subtypes
-                    if isinstance(loc_subtypes, str):
-                        try:
-                            import json
-                            loc_subtypes = json.loads(loc_subtypes)
-                        except:
-                            loc_subtypes = [loc_subtypes]
-                    
-                    # Convert to list if not a list
-                    if not isinstance(loc_subtypes, list):
-                        loc_subtypes = [loc_subtypes]
-                    
-                    # Check for subtype match
-                    for subtype in top_subtypes:
-                        # Check for exact match or partial match (inclusion)
-                        if subtype in loc_subtypes or any(subtype.lower() in st.lower() for st in loc_subtypes):
-                            subtype_locations.append(loc)
-                            break
-            
-            # Remove duplicates
-            subtype_locations = list({loc.id: loc for loc in subtype_locations}.values())
+            # Destinations with a subtype containing any of the subtypes (exact or partial match)
+            subtype_ids = attribute_index.containing('subtype', top_subtypes)
             
             # Exclude already liked destinations and destinations included in subcategory results
-            liked_ids = [loc.id for loc in liked_locations]
-            subcategory_ids = [loc[0].id for loc in subcategory_results]
-            subtype_locations = [loc for loc in subtype_locations if loc.id not in liked_ids and loc.id not in subcategory_ids]
+            subcategory_result_ids = Bitmap(loc.id for loc, _ in subcategory_results) if 'subcategory_results' in locals() else Bitmap()
+            subtype_ids = subtype_ids - liked_bitmap - subcategory_result_ids
             
-            print(f"Number of subtype-based recommendation destinations: {len(subtype_locations)}")
+            print(f"Number of subtype-based recommendation destinations: {len(subtype_ids)}")
             
-            # Shuffle randomly to provide varied recommendations
-            random.shuffle(subtype_locations)
+            # Most similar to liked destinations first, the rest shuffled to provide varied recommendations
+            subtype_ids = rank_candidates(subtype_ids, liked_neighbor_ids, limit)
+            subtype_locations = locations_in_order(subtype_ids)
             
             # Select top results (varied similarity scores)
             subtype_results = []
-            for i, loc in enumerate(subtype_locations[:limit]):
+            for i, loc in enumerate(subtype_locations):
                 # Similarity score - without randomness
                 base_similarity = 0.7 + (i % 4) * 0.05
                 similarity = base_similarity
@@ -910,37 +878,27 @@ def recommend_destinations(request):
             top_countries = [country for country, _ in combined_countries.most_common(5)]
             print(f"Top countries: {top_countries}")
             
-            country_locations = Location.objects.filter(country__in=top_countries)
-            
             # Exclude already liked destinations and destinations included in subcategory/subtype results
-            liked_ids = [loc.id for loc in liked_locations]
-            
-            # Create list of IDs to exclude from previous results (use empty list if variable not defined)
-            previous_results_ids = []
+            excluded_ids = liked_bitmap
             if 'subcategory_results' in locals() and subcategory_results:
-                previous_results_ids.extend([loc[0].id for loc in subcategory_results])
+                excluded_ids = excluded_ids | Bitmap(loc[0].id for loc in subcategory_results)
             if 'subtype_results' in locals() and subtype_results:
-                previous_results_ids.extend([loc[0].id for loc in subtype_results])
-                
-            country_locations = country_locations.exclude(id__in=liked_ids + previous_results_ids)
+                excluded_ids = excluded_ids | Bitmap(loc[0].id for loc in subtype_results)
             
             # improve weight system: separate country results
             country_results_by_country = {}
             
             for country in top_countries:
-                # filter locations for specific country
-                country_specific_locations = country_locations.filter(country=country)
-                country_specific_list = list(country_specific_locations)
+                # locations of the specific country
+                # most similar to liked destinations first, the rest shuffled to ensure diversity
+                country_specific_ids = rank_candidates(attribute_index.lookup('country', country) - excluded_ids, liked_neighbor_ids, 5)
                 
                 # process only if there are results
-                if country_specific_list:
-                    # shuffle to ensure diversity
-                    random.shuffle(country_specific_list)
-                    
+                if country_specific_ids:
                     # save country results (max 5 locations)
                     country_results_by_country[country] = []
                     
-                    for i, loc in enumerate(country_specific_list[:5]):
+                    for i, loc in enumerate(locations_in_order(country_specific_ids)):
                         # calculate weight: adjust base score based on mention frequency in reviews/likes
                         base_weight = 0.65
                         mention_bonus = min(0.3, combined_countries[country] * 0.05)  # bonus based on mention frequency
@@ -980,38 +938,17 @@ def recommend_destinations(request):
             tag_based_results = []
             
             for tag in selected_tags:
-                # bring all destinations
-                all_locations = Location.objects.all()
-                tag_locations = []
+                # Match the selected tag to its spelling in the catalogue (cached tag vocabulary)
+                resolved_tag = tag_vocabulary.resolve(tag, fuzzy=False) or tag
                 
-                for loc in all_locations:
-                    if loc.subcategories:
-                        # If it's a string, convert to list
-                        subcats = loc.subcategories
-                        if isinstance(subcats, str):
-                            try:
-                                import json
-                                subcats = json.loads(subcats)
-                            except:
-                                subcats = [subcats]
-                        
-                        # If it's not a list, convert to list
-                        if not isinstance(subcats, list):
-                            subcats = [subcats]
-                        
-                        # Check if subcategories[0] exactly matches the tag
-                        if subcats and len(subcats) > 0 and subcats[0] == tag:
-                            tag_locations.append(loc)
-                
-                # Exclude already liked destinations
-                liked_ids = [like.location.id for like in likes]
-                tag_locations = [loc for loc in tag_locations if loc.id not in liked_ids]
+                # Destinations whose subcategories[0] matches the tag, excluding already liked destinations
+                tag_ids = attribute_index.lookup('primary_subcategory', resolved_tag) - liked_bitmap
                 
                 # Add results (top 5 only)
-                for loc in tag_locations[:5]:
+                for loc in locations_in_order(tag_ids.first(5)):
                     tag_based_results.append((loc, 0.6))  # Lower similarity score for tag-based
                 
-                print(f"Found {len(tag_locations)} destinations related to tag '{tag}'")
+                print(f"Found {len(tag_ids)} destinations related to tag '{tag}'")
             
             # Remove duplicates
             seen_ids = set(item.get("id") if isinstance(item, dict) else item[0].id for item in results)
@@ -1037,11 +974,11 @@ def recommend_destinations(request):
         ).order_by('-total_likes')
         
         # Exclude already recommended destinations
-        seen_ids = set(item["id"] for item in results)
+        seen_ids = set(location.id for location, _ in results)
         popular_locations = popular_locations.exclude(id__in=seen_ids)
         
         # Exclude already liked destinations
-        liked_ids = [like.location.id for like in likes]
+        liked_ids = liked_location_ids
         popular_locations = popular_locations.exclude(id__in=liked_ids)
         
         # Add popular destinations
@@ -1068,125 +1005,10 @@ def recommend_destinations(request):
             subcategory_recommendations.append((location, similarity))
             
     # 10. Recently viewed-based recommendation results
-    recently_viewed_recommendations = []
-    
-    if has_recently_viewed:
-        # Collect countries, subcategories, subtypes from recently viewed destinations
-        rv_countries = []
-        rv_subcategories = []
-        rv_subtypes = []
-        
-        for item in recently_viewed:
-            if item.get('country'):
-                rv_countries.append(item.get('country'))
-            
-            if item.get('subcategories'):
-                subcats = item.get('subcategories')
-                if isinstance(subcats, list):
-                    rv_subcategories.extend(subcats)
-                else:
-                    rv_subcategories.append(subcats)
-            
-            if item.get('subtypes'):
-                subtypes = item.get('subtypes')
-                if isinstance(subtypes, list):
-                    rv_subtypes.extend(subtypes)
-                else:
-                    rv_subtypes.append(subtypes)
-        
-        # Remove duplicates
-        rv_countries = list(set(rv_countries))
-        rv_subcategories = list(set(rv_subcategories))
-        rv_subtypes = list(set(rv_subtypes))
-        
-        print(f"Recently viewed countries: {rv_countries}")
-        print(f"Recently viewed subcategories: {rv_subcategories}")
-        print(f"Recently viewed subtypes: {rv_subtypes}")
-        
-        # Find destinations similar to recently viewed
-        recently_viewed_locations = []
-        
-        # Get all destinations and filter in Python due to database compatibility issues
-        all_locations = Location.objects.all()
-        
-        for loc in all_locations:
-            # Exclude already liked destinations and recently viewed destinations
-            if loc.id in liked_location_ids or any(rv['id'] == loc.id for rv in recently_viewed):
-                continue
-                
-            match_score = 0  # Similarity score
-            
-            # 1. Check country match
-            if loc.country and loc.country in rv_countries:
-                match_score += 0.3
-            
-            # 2. Check subcategory match
-            if loc.subcategories:
-                loc_subcats = loc.subcategories
-                if isinstance(loc_subcats, str):
-                    try:
-                        import json
-                        loc_subcats = json.loads(loc_subcats)
-                    except:
-                        loc_subcats = [loc_subcats]
-                
-                if not isinstance(loc_subcats, list):
-                    loc_subcats = [loc_subcats]
-                
-                for subcat in rv_subcategories:
-                    if any(subcat.lower() in sc.lower() for sc in loc_subcats):
-                        match_score += 0.2
-                        break
-            
-            # 3. Check subtype match
-            if loc.subtypes:
-                loc_subtypes = loc.subtypes
-                if isinstance(loc_subtypes, str):
-                    try:
-                        import json
-                        loc_subtypes = json.loads(loc_subtypes)
-                    except:
-                        loc_subtypes = [loc_subtypes]
-                
-                if not isinstance(loc_subtypes, list):
-                    loc_subtypes = [loc_subtypes]
-                
-                for subtype in rv_subtypes:
-                    if any(subtype.lower() in st.lower() for st in loc_subtypes):
-                        match_score += 0.2
-                        break
-            
-            # Add only locations with similarity score >= 0.2 (at least one match)
-            if match_score >= 0.2:
-                # Limit similarity score to 0.7 (keep it moderate)
-                match_score = min(match_score, 0.7)
-                recently_viewed_locations.append((loc, match_score))
-        
-        # Sort by similarity score
-        recently_viewed_locations.sort(key=lambda x: x[1], reverse=True)
-        
-        # Select top results
-        recently_viewed_recommendations = recently_viewed_locations[:limit]
-        
-        print(f"Number of recently viewed-based recommendations: {len(recently_viewed_recommendations)}")
+    recently_viewed_recommendations = recommend_from_recently_viewed(recently_viewed, liked_bitmap, limit) if has_recently_viewed else []
     
     print(f"Final recommendation results: {len(results)} destinations")
     
-    # Function to convert Location object to serializable dictionary
-    def location_to_dict(location, similarity, recommendation_type="general"):
-        return {
-                "id": location.id,
-                "name": location.name,
-                "description": location.description,
-                "subcategories": location.subcategories,
-                "subtypes": location.subtypes,
-                "image": location.image,
-                "city": location.city,
-                "country": location.country,
-                "similarity_score": float(similarity),
-            "recommendation_type": recommendation_type
-        }
-    
     # Convert results to JSON-serializable format
     serialized_results = []
     for location, similarity in results:
@@ -1228,7 +1050,7 @@ def recommend_destinations(request):
     for location, similarity in recently_viewed_recommendations:
         serialized_recently_viewed_recommendations.append(location_to_dict(location, similarity, "recently_viewed"))
     
-    return Response({
+    return {
         "activity_weight": activity_weight,
         "tag_weight": tag_weight,
         "results": serialized_results,
@@ -1238,7 +1060,42 @@ def recommend_destinations(request):
         "country_recommendations": serialized_country_recommendations,
         "recently_viewed_recommendations": serialized_recently_viewed_recommendations,
         "tag_group_recommendations": serialized_tag_groups
-    }, status=status.HTTP_200_OK)
+    }
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def recommend_destinations(request):
+    """
+    Personalized destination recommendation API.
+    Serves the lists precomputed by the precompute_recommendations command while
+    the user's likes, reviews and selected tags are unchanged (lightly reshuffled);
+    new or recently active users get recommendations computed online.
+    
+    Parameters:
+        request: HTTP POST request with optional recently_viewed list and query parameters:
+            - limit: Maximum number of recommendations to return (default: 10)
+    
+    Returns:
+        Response with various categories of recommendations (see build_recommendations)
+    """
+    user = request.user
+    limit = int(request.query_params.get('limit', 10))
+    recently_viewed = request.data.get('recently_viewed', [])
+    profile = get_profile(user)
+    
+    data = recommendation_store.serve(user, profile, limit)
+    if data is not None:
+        print(f"Serving precomputed recommendations for user {user.username}")
+        # Recently viewed destinations are only known per request
+        if recently_viewed:
+            data["recently_viewed_recommendations"] = [
+                location_to_dict(location, similarity, "recently_viewed")
+                for location, similarity in recommend_from_recently_viewed(recently_viewed, Bitmap(profile.liked_locations), limit)
+            ]
+        return Response(data, status=status.HTTP_200_OK)
+    
+    data = build_recommendations(user, recently_viewed, limit, profile)
+    return Response(data, status=status.HTTP_200_OK)
 
 # Retrieve user's likes list
 @api_view(['GET'])
@@ -1427,14 +1284,18 @@ def most_loved_locations(request):
 def nearby_locations(request):
     """
     API endpoint to find destinations near a specified geographic location.
-    Uses Haversine formula to calculate distances between coordinates.
+    Uses the in-memory spatial index when NumPy is available, otherwise a
+    bounding-box query with the Haversine formula.
     
     Parameters:
         request: HTTP POST request with:
             - latitude: User's latitude coordinate
             - longitude: User's longitude coordinate
-            - radius: Search radius in kilometers (default: 50.0)
+            - mode: 'radius' (all destinations within radius) or 'knn' (the limit closest destinations) (default: 'radius')
+            - radius: Search radius in kilometers (default: 50.0; optional maximum distance in knn mode)
             - limit: Maximum number of results to return (default: 20)
+            - category: Optional category filter (case-insensitive)
+            - subcategory: Optional subcategory filter (case-insensitive)
     
     Returns:
         Response with list of nearby destinations sorted by distance
@@ -1442,8 +1303,20 @@ def nearby_locations(request):
     # User location information
     user_lat = request.data.get('latitude')
     user_lon = request.data.get('longitude')
-    radius = float(request.data.get('radius', 50.0))  # Default radius 50km
+    mode = request.data.get('mode', 'radius')
     limit = int(request.data.get('limit', 20))  # Limit results (default 20)
+    category = request.data.get('category') or None
+    subcategory = request.data.get('subcategory') or None
+    
+    if mode not in ('radius', 'knn'):
+        return Response({"error": "Mode must be 'radius' or 'knn'."}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Default radius 50km; in knn mode the radius is only an optional cap
+    radius = request.data.get('radius')
+    if radius is not None:
+        radius = float(radius)
+    elif mode == 'radius':
+        radius = 50.0
     
     # If latitude/longitude not provided
     if user_lat is None or user_lon is None:
@@ -1455,6 +1328,30 @@ def nearby_locations(request):
     except ValueError:
         return Response({"error": "Latitude and longitude must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
     
+    matches = None
+    if SPATIAL_INDEX_AVAILABLE:
+        # Spatial index: only tree nodes that can contain results are visited,
+        # and only the closest `limit` locations are loaded and serialized
+        try:
+            if mode == 'knn':
+                matches = spatial_index.nearest(user_lat, user_lon, limit, max_distance_km=radius, category=category, subcategory=subcategory)
+            else:
+                matches = spatial_index.within(user_lat, user_lon, radius, limit=limit, category=category, subcategory=subcategory)
+        except Exception as e:
+            print(f"Spatial index unavailable, scanning locations: {str(e)}")
+    
+    if matches is not None:
+        locations_by_id = Location.objects.in_bulk([location_id for location_id, _ in matches])
+        nearby_locations = []
+        for location_id, distance in matches:
+            location = locations_by_id.get(location_id)
+            if location is None:
+                continue
+            location_data = LocationSerializer(location).data
+            location_data['distance'] = round(distance, 2)  # Round to 2 decimal places
+            nearby_locations.append(location_data)
+        return Response(nearby_locations)
+    
     # Haversine formula for distance calculation
     def haversine_distance(lat1, lon1, lat2, lon2):
         """
@@ -1487,33 +1384,43 @@ def nearby_locations(request):
         
         return distance
     
-    # Approximate distance per degree
-    lat_km = 111.0
-    lng_km = 111.0 * math.cos(math.radians(user_lat))
-    
-    # Convert radius to latitude/longitude difference (approximate filtering range)
-    lat_delta = radius / lat_km
-    lng_delta = radius / lng_km
-    
-    # Filter by approximate location (for performance optimization)
-    locations = Location.objects.filter(
-        latitude__isnull=False,
-        longitude__isnull=False,
-        latitude__gte=user_lat - lat_delta,
-        latitude__lte=user_lat + lat_delta,
-        longitude__gte=user_lon - lng_delta,
-        longitude__lte=user_lon + lng_delta
-    )
+    locations = Location.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    if category:
+        locations = locations.filter(category__iexact=category)
+    
+    if radius is not None:
+        # Approximate distance per degree
+        lat_km = 111.0
+        lng_km = 111.0 * math.cos(math.radians(user_lat))
+        
+        # Convert radius to latitude/longitude difference (approximate filtering range)
+        lat_delta = radius / lat_km
+        lng_delta = radius / lng_km
+        
+        # Filter by approximate location (for performance optimization)
+        locations = locations.filter(
+            latitude__gte=user_lat - lat_delta,
+            latitude__lte=user_lat + lat_delta,
+            longitude__gte=user_lon - lng_delta,
+            longitude__lte=user_lon + lng_delta
+        )
     
     # Calculate exact distance and sort
     nearby_locations = []
     for location in locations:
+        if subcategory:
+            subcategories = location.subcategories or []
+            if isinstance(subcategories, str):
+                subcategories = [subcategories]
+            if subcategory.lower() not in [str(value).lower() for value in subcategories]:
+                continue
+        
         distance = haversine_distance(
             user_lat, user_lon, 
             location.latitude, location.longitude
         )
         
-        if distance <= radius:
+        if radius is None or distance <= radius:
             location_data = LocationSerializer(location).data
             location_data['distance'] = round(distance, 2)  # Round to 2 decimal places
             nearby_locations.append(location_data)
@@ -1525,90 +1432,3 @@ def nearby_locations(request):
     nearby_locations = nearby_locations[:limit]
     
     return Response(nearby_locations)
-
-# add new utility function for extracting countries from keywords
-def extract_countries_from_keywords(keywords):
-    """
-    Extract countries from keyword list.
-    """
-    # List of common country names (stored in lowercase)
-    common_countries = {
-        'vietnam', 'thailand', 'japan', 'korea', 'china', 'malaysia', 'indonesia', 
-        'singapore', 'philippines', 'australia', 'new zealand', 'usa', 'america', 
-        'canada', 'mexico', 'brazil', 'peru', 'argentina', 'chile', 'uk', 'england', 
-        'france', 'italy', 'spain', 'germany', 'netherlands', 'turkey', 'russia', 
-        'india', 'egypt', 'morocco', 'south africa', 'greece', 'switzerland'
-    }
-    
-    # Process country name variations
-    country_aliases = {
-        'american': 'usa',
-        'british': 'uk',
-        'english': 'uk',
-        'french': 'france',
-        'italian': 'italy',
-        'spanish': 'spain',
-        'german': 'germany',
-        'dutch': 'netherlands',
-        'turkish': 'turkey',
-        'russian': 'russia',
-        'indian': 'india',
-        'egyptian': 'egypt',
-        'thai': 'thailand',
-        'vietnamese': 'vietnam',
-        'japanese': 'japan',
-        'south_korean': 'south_korea',
-        'chinese': 'china',
-        'malaysian': 'malaysia',
-        'indonesian': 'indonesia'
-    }
-    
-    found_countries = []
-    
-    for keyword in keywords:
-        keyword_lower = keyword.lower()
-        
-        # Direct match
-        if keyword_lower in common_countries:
-            found_countries.append(keyword_lower)
-        
-        # Alias match
-        elif keyword_lower in country_aliases:
-            found_countries.append(country_aliases[keyword_lower])
-    
-    return found_countries
-
-def extract_countries_from_text(text):
-    """
-    Extract countries from text.
-    """
-    # Include country name variations
-    countries_with_variants = {
-        'vietnam': ['vietnam', 'vietnamese', 'hanoi', 'ho chi minh'],
-        'thailand': ['thailand', 'thai', 'bangkok', 'phuket'],
-        'japan': ['japan', 'japanese', 'tokyo', 'kyoto', 'osaka'],
-        'south_korea': ['south_korea', 'south_korean', 'seoul', 'busan'],
-        'china': ['china', 'chinese', 'beijing', 'shanghai'],
-        'malaysia': ['malaysia', 'malaysian', 'kuala lumpur', 'penang'],
-        'indonesia': ['indonesia', 'indonesian', 'bali', 'jakarta'],
-        'singapore': ['singapore', 'singaporean'],
-        'philippines': ['philippines', 'filipino', 'manila', 'cebu'],
-        'australia': ['australia', 'australian', 'sydney', 'melbourne'],
-        'usa': ['usa', 'america', 'american', 'united states', 'new york', 'los angeles'],
-        'uk': ['uk', 'britain', 'british', 'england', 'london'],
-        'france': ['france', 'french', 'paris', 'nice'],
-        'italy': ['italy', 'italian', 'rome', 'venice', 'milan'],
-        'spain': ['spain', 'spanish', 'madrid', 'barcelona'],
-        'germany': ['germany', 'german', 'berlin', 'munich']
-    }
-    
-    found_countries = []
-    text_lower = text.lower()
-    
-    for country, variants in countries_with_variants.items():
-        for variant in variants:
-            if variant in text_lower:
-                found_countries.append(country)
-                break  # Add only once if a country variant is found
-    
-    return found_countries
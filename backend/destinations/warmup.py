@@ -0,0 +1,129 @@
+"""
+Warm-up of NLP models, search indexes and the shared search cache.
+
+Run by the warm_nlp management command, and optionally in the background
+when a worker starts (NLP_WARMUP_ON_STARTUP). The readiness of the current
+process is reported by the NLP health endpoint.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+# Sample texts encoded once so the first real request does not pay for lazy initialization
+WARMUP_TEXTS = [
+    "quiet beach with good food",
+    "historic museum in the old town",
+    "family friendly park",
+    "The staff were friendly and the view was amazing.",
+]
+
+# Warm-up state of this process
+warmup_state = {
+    'status': 'pending' if getattr(settings, 'NLP_WARMUP_ON_STARTUP', False) else 'disabled',
+    'started_at': None,
+    'finished_at': None,
+    'steps': {},
+    'error': None,
+}
+warmup_lock = threading.Lock()
+
+
+def warm_up(top_queries=None, limit=20, log=print):
+    """
+    Load models, run a warm-up batch, prepare search indexes and pre-compute
+    results of the most popular historical queries.
+
+    Parameters:
+        top_queries: Number of historical queries to pre-compute (default: NLP_WARMUP_TOP_QUERIES)
+        limit: Result limit used for pre-computed queries (the search API default)
+        log: Function used to report progress
+
+    Returns:
+        dict: Warm-up state with per-step durations in seconds
+    """
+    from .models import Location, SearchQuery
+    from .nlp_utils import nlp_processor, NLP_ADVANCED
+    from .location_embeddings import location_embeddings
+    from .keyword_index import keyword_index
+    from .bm25 import bm25_ranker
+    from .spatial_index import spatial_index, NUMPY_AVAILABLE
+    from .bitmap_index import attribute_index
+
+    if top_queries is None:
+        top_queries = getattr(settings, 'NLP_WARMUP_TOP_QUERIES', 50)
+
+    if not warmup_lock.acquire(blocking=False):
+        log("Warm-up already running")
+        return warmup_state
+
+    steps = {}
+    step_start = time.time()
+
+    def finish_step(name):
+        nonlocal step_start
+        steps[name] = round(time.time() - step_start, 2)
+        log(f"Warm-up step '{name}' done ({steps[name]:.2f} seconds)")
+        step_start = time.time()
+
+    try:
+        warmup_state.update(status='warming', started_at=time.time(), finished_at=None, steps=steps, error=None)
+
+        # Models
+        nlp_processor.load_models()
+        finish_step('load_models')
+
+        # One batch through each model
+        if NLP_ADVANCED:
+            nlp_processor.get_embeddings(WARMUP_TEXTS, use_cache=False)
+        for text in WARMUP_TEXTS:
+            nlp_processor.analyze_sentiment(text)
+        finish_step('warmup_batch')
+
+        # Search indexes
+        if NLP_ADVANCED:
+            location_embeddings.sync(nlp_processor.encode_texts)
+        bm25_ranker.sync()
+        keyword_index.ensure_ready()
+        if NUMPY_AVAILABLE:
+            spatial_index.ensure_ready()
+        attribute_index.ensure_ready()
+        finish_step('indexes')
+
+        # Shared search cache for the most popular queries
+        all_locations = Location.objects.all()
+        queries = list(SearchQuery.objects.order_by('-search_count').values_list('query', flat=True)[:top_queries])
+        for query in queries:
+            nlp_processor.search_destinations(query, all_locations, top_n=limit)
+        finish_step('top_queries')
+        log(f"Pre-computed results for {len(queries)} popular queries")
+
+        warmup_state.update(status='ready', finished_at=time.time())
+    except Exception as e:
+        print(f"Error during NLP warm-up: {str(e)}")
+        warmup_state.update(status='failed', finished_at=time.time(), error=str(e))
+    finally:
+        warmup_lock.release()
+
+    return warmup_state
+
+
+def start_background_warm_up():
+    """
+    Start the warm-up in a daemon thread so server startup is not blocked.
+    """
+    warmup_state['status'] = 'pending'
+    thread = threading.Thread(target=warm_up, name='nlp-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    """
+    Check whether this process may receive search traffic.
+    Workers without startup warm-up are always considered ready.
+
+    Returns:
+        bool: False while a warm-up is pending or running
+    """
+    return warmup_state['status'] not in ('pending', 'warming')